@@ -0,0 +1,226 @@
+# benchmarks/bench.py
+"""
+Benchmarks por etapa del pipeline (tiempo y pico de memoria), sin red.
+
+Cada etapa se mide sobre datos sintéticos (benchmarks/synth.py); las tarifas se descargan de
+un Lambda local (benchmarks/lambda_stub.py). Tiempo: mínimo de --repeat corridas. Memoria:
+pico de tracemalloc en una corrida aparte (tracemalloc frena el código, por eso no se mezcla
+con el tiempo).
+
+Uso (desde la raíz del repo):
+  python -m benchmarks.bench --scale small
+  python -m benchmarks.bench --scale medium --save            # guarda benchmarks/baselines/medium.json
+  python -m benchmarks.bench --scale medium --compare         # compara contra esa línea base
+  python -m benchmarks.bench --frontiers 50000 --months 36 --stages analysis_vector summary
+
+Escalas: small (1k fronteras, 12 meses), medium (20k, 24), large (200k, 48).
+"""
+import argparse
+import gc
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+import tracemalloc
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import run_opps_sql
+import run_summary
+import run_tariff_analysis as rta
+from src.audit import NullSink
+from src.srcload import fetch_tariffs, load_opportunities, OPPORTUNITY_PIPELINE_COLUMNS, TARIFF_RESOURCE_ID
+from src.tariff_index import TariffIndex
+
+from benchmarks.lambda_stub import LocalTariffLambda
+from benchmarks.synth import generate_dataset
+
+SCALES = {
+    'small': (1_000, 12),
+    'medium': (20_000, 24),
+    'large': (200_000, 48),
+}
+DATA_DIR = os.path.join('benchmarks', 'data')
+BASELINE_DIR = os.path.join('benchmarks', 'baselines')
+FROM_MONTH = '2023-01'
+
+Stage = Tuple[str, Callable[[Dict[str, Any]], Any], Optional[str]]
+
+
+def _to_month(n_months: int) -> str:
+    y, m = divmod(2023 * 12 + n_months - 1, 12)
+    return f'{y}-{m + 1:02d}'
+
+
+def _analizar(engine: str):
+    def run(ctx):
+        salida, _ = rta.analizar(ctx['opps'], ctx['df_tar'], ctx['city_map'], ctx['prov_map'],
+                                 engine=engine, audit=NullSink())
+        return salida
+    return run
+
+
+def _index_dicts(ctx):
+    df = ctx['df_tar']
+    return (rta.build_index_comp(df), rta.build_index_simple(df),
+            rta.build_bucket(df, 'nivel_comp'), rta.build_bucket(df, 'nivel_simp'))
+
+
+def _export(ctx):
+    rta.write_outputs(ctx['salida'], None, os.path.join(ctx['tmp'], 'analisis.json'))
+
+
+# (nombre, función(ctx), llave de ctx donde queda el resultado para las etapas siguientes)
+STAGES: List[Stage] = [
+    ('opps_csv', lambda ctx: load_opportunities(ctx['opps_csv'], usecols=OPPORTUNITY_PIPELINE_COLUMNS), 'df_opp'),
+    ('opps_nested_loop', lambda ctx: run_opps_sql.build_nested(ctx['df_opp']), 'opps'),
+    ('opps_nested_columnar', lambda ctx: run_opps_sql.build_nested_columnar(ctx['df_opp']), None),
+    ('tariff_fetch', lambda ctx: fetch_tariffs(ctx['lambda_url'], TARIFF_RESOURCE_ID), 'df_tariffs'),
+    ('tariff_prep', lambda ctx: rta.prepare_tariffs(ctx['df_tariffs'], ctx['prov_map'],
+                                                    ctx['from_month'], ctx['to_month']), 'df_tar'),
+    ('tariff_index_dicts', _index_dicts, None),
+    ('tariff_index_dense', lambda ctx: TariffIndex.from_frame(ctx['df_tar']), None),
+    ('analysis_loop', _analizar('loop'), 'salida'),
+    ('analysis_vector', _analizar('vector'), None),
+    ('summary', lambda ctx: run_summary.build_summary(ctx['opps'], ctx['salida']), 'resumen'),
+    ('financials', lambda ctx: run_summary.add_financials(ctx['resumen']), None),
+    ('export_json', _export, None),
+]
+STAGE_NAMES = [s[0] for s in STAGES]
+
+
+def measure(fn: Callable[[Dict[str, Any]], Any], ctx: Dict[str, Any], repeat: int) -> Tuple[Any, float, float]:
+    """(resultado, segundos mínimos, pico de memoria en MB)."""
+    best = float('inf')
+    result = None
+    for _ in range(max(1, repeat)):
+        gc.collect()
+        t0 = time.perf_counter()
+        result = fn(ctx)
+        best = min(best, time.perf_counter() - t0)
+    gc.collect()
+    tracemalloc.start()
+    fn(ctx)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return result, best, peak / 1e6
+
+
+def run_benchmarks(n_frontiers: int, n_months: int, seed: int = 1, repeat: int = 3,
+                   stages: Optional[List[str]] = None, data_dir: str = DATA_DIR) -> Dict[str, Any]:
+    """Genera (o reutiliza) los datos, levanta el Lambda local y mide las etapas pedidas."""
+    dataset_dir = os.path.join(data_dir, f'f{n_frontiers}_m{n_months}_s{seed}')
+    meta_path = os.path.join(dataset_dir, 'dataset.json')
+    if os.path.exists(meta_path):
+        with open(meta_path, 'r', encoding='utf-8') as f:
+            dataset = json.load(f)
+    else:
+        dataset = generate_dataset(dataset_dir, n_frontiers, n_months, seed)
+        with open(meta_path, 'w', encoding='utf-8') as f:
+            json.dump(dataset, f, ensure_ascii=False, indent=2)
+
+    wanted = set(stages or STAGE_NAMES)
+    results: Dict[str, Dict[str, float]] = {}
+    with LocalTariffLambda(dataset['tariffs_csv']) as stub, tempfile.TemporaryDirectory() as tmp:
+        ctx: Dict[str, Any] = {
+            'opps_csv': dataset['opportunities_csv'],
+            'lambda_url': stub.url,
+            'city_map': rta.load_mapping_json(None, 'cities_mapping.json'),
+            'prov_map': rta.load_mapping_json(None, 'providers_mapping.json'),
+            'from_month': FROM_MONTH,
+            'to_month': _to_month(n_months),
+            'tmp': tmp,
+        }
+        for name, fn, provides in STAGES:
+            needed_later = provides and any(s in wanted for s in STAGE_NAMES[STAGE_NAMES.index(name) + 1:])
+            if name not in wanted:
+                if needed_later:
+                    ctx[provides] = fn(ctx)  # insumo de una etapa pedida, sin medir
+                continue
+            result, seconds, peak_mb = measure(fn, ctx, repeat)
+            if provides:
+                ctx[provides] = result
+            results[name] = {'seconds': round(seconds, 4), 'peak_mb': round(peak_mb, 2)}
+            print(f"  {name:<22} {seconds:>9.3f} s {peak_mb:>10.1f} MB")
+
+    return {
+        'config': {'frontiers': n_frontiers, 'months': n_months, 'seed': seed, 'repeat': repeat,
+                   'opportunities': dataset['opportunities'], 'tariff_rows': dataset['tariff_rows']},
+        'machine': {'python': platform.python_version(), 'platform': platform.platform(),
+                    'processor': platform.processor() or platform.machine(), 'cpus': os.cpu_count()},
+        'created_at': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'results': results,
+    }
+
+
+def compare(current: Dict[str, Any], baseline: Dict[str, Any], tolerance: float) -> bool:
+    """Imprime la comparación; devuelve False si alguna etapa es más lenta que la base + tolerancia."""
+    ok = True
+    print(f"\n  {'etapa':<22} {'base s':>9} {'actual s':>9} {'ratio':>7}   {'base MB':>9} {'actual MB':>9}")
+    for name, cur in current['results'].items():
+        base = baseline['results'].get(name)
+        if base is None:
+            print(f"  {name:<22} {'—':>9} {cur['seconds']:>9.3f}")
+            continue
+        ratio = cur['seconds'] / base['seconds'] if base['seconds'] else float('inf')
+        mark = '🔴' if ratio > 1 + tolerance else ('🟢' if ratio < 1 - tolerance else '  ')
+        ok = ok and ratio <= 1 + tolerance
+        print(f"  {name:<22} {base['seconds']:>9.3f} {cur['seconds']:>9.3f} {ratio:>6.2f}x {mark}"
+              f"{base['peak_mb']:>9.1f} {cur['peak_mb']:>9.1f}")
+    if baseline.get('machine') != current.get('machine'):
+        print("🟡 La línea base se tomó en otra máquina/versión de Python: compara con cautela.")
+    return ok
+
+
+def parse_args():
+    p = argparse.ArgumentParser(description='Benchmarks por etapa del pipeline (sin red).')
+    p.add_argument('--scale', choices=SCALES, default='small', help='Tamaño predefinido (fronteras, meses)')
+    p.add_argument('--frontiers', type=int, default=None, help='Fronteras (reemplaza --scale)')
+    p.add_argument('--months', type=int, default=None, help='Meses de tarifas (reemplaza --scale)')
+    p.add_argument('--seed', type=int, default=1)
+    p.add_argument('--repeat', type=int, default=3, help='Corridas por etapa (se reporta la más rápida)')
+    p.add_argument('--stages', nargs='+', choices=STAGE_NAMES, default=None, help='Solo estas etapas')
+    p.add_argument('--save', nargs='?', const='', default=None,
+                   help='Guardar como línea base (nombre; por defecto el de la escala)')
+    p.add_argument('--compare', nargs='?', const='', default=None,
+                   help='Comparar contra una línea base (nombre; por defecto el de la escala)')
+    p.add_argument('--tolerance', type=float, default=0.25, help='Margen antes de marcar una etapa como más lenta')
+    return p.parse_args()
+
+
+def main():
+    args = parse_args()
+    n_frontiers, n_months = SCALES[args.scale]
+    custom = args.frontiers is not None or args.months is not None
+    n_frontiers = args.frontiers or n_frontiers
+    n_months = args.months or n_months
+    default_name = f'f{n_frontiers}_m{n_months}' if custom else args.scale
+
+    print(f"🟢 Benchmarks: {n_frontiers} fronteras, {n_months} meses (seed {args.seed}, repeat {args.repeat})")
+    current = run_benchmarks(n_frontiers, n_months, args.seed, args.repeat, args.stages)
+
+    if args.save is not None:
+        path = os.path.join(BASELINE_DIR, f'{args.save or default_name}.json')
+        os.makedirs(BASELINE_DIR, exist_ok=True)
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(current, f, ensure_ascii=False, indent=2)
+        print(f"✅ Línea base guardada: {path}")
+
+    if args.compare is not None:
+        path = os.path.join(BASELINE_DIR, f'{args.compare or default_name}.json')
+        if not os.path.exists(path):
+            print(f"🔴 No existe la línea base {path} (usa --save)")
+            sys.exit(2)
+        with open(path, 'r', encoding='utf-8') as f:
+            baseline = json.load(f)
+        if baseline['config']['frontiers'] != n_frontiers or baseline['config']['months'] != n_months:
+            print("🟡 La línea base es de otro tamaño de datos.")
+        if not compare(current, baseline, args.tolerance):
+            print("🔴 Hay etapas más lentas que la línea base.")
+            sys.exit(1)
+        print("✅ Sin regresiones.")
+
+
+if __name__ == '__main__':
+    main()
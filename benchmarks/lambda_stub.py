@@ -0,0 +1,93 @@
+# benchmarks/lambda_stub.py
+"""
+Sustituto local del Lambda de tarifas para correr sin red.
+
+POST /            -> {"csv_url": "http://127.0.0.1:<puerto>/tarifas.csv"} (mismo contrato que el Lambda)
+GET  /tarifas.csv -> el CSV indicado, con ETag (responde 304 a If-None-Match)
+
+Uso:
+  with LocalTariffLambda('benchmarks/data/tarifas.csv') as stub:
+      df = fetch_tariffs(stub.url, TARIFF_RESOURCE_ID)
+
+  python -m benchmarks.lambda_stub benchmarks/data/tarifas.csv --port 8765
+"""
+import argparse
+import hashlib
+import http.server
+import json
+import threading
+
+
+def _handler(csv_path: str):
+    class Handler(http.server.BaseHTTPRequestHandler):
+        def log_message(self, *args):
+            pass
+
+        def do_POST(self):
+            n = int(self.headers.get('Content-Length') or 0)
+            self.rfile.read(n)
+            host, port = self.server.server_address[:2]
+            body = json.dumps({'csv_url': f'http://{host}:{port}/tarifas.csv'}).encode('utf-8')
+            self.send_response(200)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_GET(self):
+            with open(csv_path, 'rb') as f:
+                data = f.read()
+            etag = '"' + hashlib.md5(data).hexdigest() + '"'
+            if self.headers.get('If-None-Match') == etag:
+                self.send_response(304)
+                self.send_header('ETag', etag)
+                self.end_headers()
+                return
+            self.send_response(200)
+            self.send_header('Content-Type', 'text/csv')
+            self.send_header('ETag', etag)
+            self.send_header('Content-Length', str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+    return Handler
+
+
+class LocalTariffLambda:
+    """Servidor HTTP en un hilo de fondo; `url` va donde normalmente va LAMBDA_URL."""
+
+    def __init__(self, csv_path: str, port: int = 0):
+        self.server = http.server.ThreadingHTTPServer(('127.0.0.1', port), _handler(csv_path))
+        self.url = f'http://127.0.0.1:{self.server.server_address[1]}/'
+        self._thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+
+    def start(self) -> 'LocalTariffLambda':
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self.server.shutdown()
+        self.server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+
+def main():
+    p = argparse.ArgumentParser(description='Lambda de tarifas local (para pruebas sin red).')
+    p.add_argument('csv', help='CSV de tarifas a servir')
+    p.add_argument('--port', type=int, default=8765)
+    args = p.parse_args()
+    stub = LocalTariffLambda(args.csv, args.port)
+    print(f'🟢 Lambda local en {stub.url} (Ctrl+C para salir)')
+    try:
+        stub.server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
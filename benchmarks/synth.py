@@ -0,0 +1,158 @@
+# benchmarks/synth.py
+"""
+Generador de datos sintéticos para los benchmarks.
+
+- Oportunidades: CSV con el mismo esquema que lee load_opportunities (OPPORTUNITY_PIPELINE_COLUMNS
+  + una columna extra que el pipeline no usa), números con separador de miles, la identidad
+  solo en la primera fila de cada oportunidad (como el export real) y celdas vacías.
+- Tarifas: CSV mes/provider/city/nivel_de_tension/tarifa con niveles compuestos y simples
+  escritos de varias formas, algunas tarifas no numéricas y huecos.
+- Nombres de provider con ruido (sufijos S.A. E.S.P., mayúsculas, tildes, espacios, typos)
+  para que una parte de las fronteras pase por el emparejamiento difuso.
+
+Uso:
+  python -m benchmarks.synth --frontiers 20000 --months 24 --out benchmarks/data
+"""
+import argparse
+import csv
+import json
+import os
+import random
+from typing import Dict, List, Tuple
+
+from src.srcload import OPPORTUNITY_PIPELINE_COLUMNS
+
+MAPPINGS_DIR = 'mappings'
+EXTRA_COLUMN = 'Etapa'  # columna presente en el export pero que el pipeline no lee
+
+TARIFF_LEVELS = [
+    'Nivel 1 Usuario', 'NIVEL_1_OPERADOR', 'Nivel 1 compartido', 'nivel 2 operador', 'NIVEL 2 USUARIO',
+    'Nivel 2', 'Nivel 3', 'Nivel 3 Operador', 'nivel_3_usuario', 'NIVEL 1',
+]
+OPP_LEVELS = ['Nivel 1', 'Nivel 2', 'nivel 3', 'NIVEL II', 'N/A', '']
+OPP_PROPIEDAD = ['Usuario', 'Operador', 'Compartido', 'Compartida', '', 'Otro']
+PROVIDER_SUFFIXES = ['', ' S.A. E.S.P.', ' SA ESP', ' S.A.S.', ' E.S.P']
+
+
+def _load_mapping(name: str) -> Dict[str, str]:
+    with open(os.path.join(MAPPINGS_DIR, name), 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def _noisy(name: str, rng: random.Random) -> str:
+    """Variante 'sucia' de un nombre: sufijos societarios, mayúsculas, espacios o un typo."""
+    out = name + rng.choice(PROVIDER_SUFFIXES)
+    r = rng.random()
+    if r < 0.25:
+        out = out.lower()
+    elif r < 0.45:
+        out = out.title()
+    if rng.random() < 0.2:
+        out = '  ' + out.replace(' ', '  ') + ' '
+    if rng.random() < 0.1 and len(out) > 4:
+        i = rng.randrange(1, len(out) - 1)
+        out = out[:i] + out[i + 1:]
+    return out
+
+
+def _months(n_months: int, start: Tuple[int, int] = (2023, 1)) -> List[str]:
+    y, m = start
+    out = []
+    for _ in range(n_months):
+        out.append(f'{y}-{m:02d}-01')
+        m += 1
+        if m > 12:
+            y, m = y + 1, 1
+    return out
+
+
+def generate_tariffs(path: str, n_months: int = 12, density: float = 0.6, seed: int = 1) -> int:
+    """Tabla de tarifas: mes × city × provider × nivel (cada combinación con prob. `density`)."""
+    rng = random.Random(seed)
+    cities = sorted(set(_load_mapping('cities_mapping.json').values()))
+    providers = sorted(set(_load_mapping('providers_mapping.json').values())) + ['BIA ENERGY']
+    # Algunos providers aparecen en tarifas con otro nombre (el cruce debe ir por tokens)
+    spelled = {p: (_noisy(p, rng) if rng.random() < 0.3 else p) for p in providers}
+    spelled['BIA ENERGY'] = 'BIA ENERGY'
+    rows = 0
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    with open(path, 'w', newline='', encoding='utf-8') as f:
+        w = csv.writer(f)
+        w.writerow(['mes', 'provider', 'city', 'nivel_de_tension', 'tarifa'])
+        for mes in _months(n_months):
+            for city in cities:
+                for prov in providers:
+                    for nivel in TARIFF_LEVELS:
+                        if rng.random() >= density:
+                            continue
+                        tarifa = round(rng.uniform(450, 950), 4) if rng.random() > 0.01 else 'n/a'
+                        w.writerow([mes, spelled[prov], city, nivel, tarifa])
+                        rows += 1
+    return rows
+
+
+def generate_opportunities(path: str, n_frontiers: int = 1000, max_per_opp: int = 8, seed: int = 1) -> int:
+    """CSV de oportunidades con `n_frontiers` filas (fronteras). Devuelve el número de oportunidades."""
+    rng = random.Random(seed)
+    regions = sorted(_load_mapping('cities_mapping.json')) + ['Región sin mapeo']
+    calc_providers = sorted(_load_mapping('providers_mapping.json'))
+    ciudades = ['MEDELLÍN', 'BOGOTÁ', 'CALI', 'TOCANCIPÁ', 'PEREIRA', '']
+    cols = OPPORTUNITY_PIPELINE_COLUMNS + [EXTRA_COLUMN]
+    i = opp_n = 0
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    with open(path, 'w', newline='', encoding='utf-8') as f:
+        w = csv.DictWriter(f, fieldnames=cols)
+        w.writeheader()
+        while i < n_frontiers:
+            opp_n += 1
+            for j in range(min(rng.randint(1, max_per_opp), n_frontiers - i)):
+                first = j == 0
+                prov = rng.choice(calc_providers)
+                prov = _noisy(prov, rng) if rng.random() < 0.25 else prov
+                kwh = rng.randint(300, 120000)
+                w.writerow({
+                    'Oportunidad': f'OPP {opp_n:06d} S.A.S.' if first else '',
+                    'Cliente': f'Cliente {opp_n}' if first else '',
+                    'Calculadora Payback/kWh Promedio / Mes': f'{kwh:,}' if rng.random() > 0.02 else '',
+                    'Calculadora Payback/Region': rng.choice(regions),
+                    'Costo Total Opex Oportunity': f'{rng.uniform(0, 3e6):,.2f}' if first else '',
+                    'Costo Total Capex Oportunity': f'{rng.uniform(0, 1e5):.5f}' if first else '',
+                    'Tarifa B': str(rng.choice([8, 10, 12])) if first else '',
+                    'Calculadora Payback/Modem & Medidor': f'{rng.choice([0, 27740, 13870.5]):,}',
+                    'Calculadora Payback/Ciiu': str(rng.choice([1040, 4711, 2511])) if first else '',
+                    'Calculadora Payback/Número de Cuenta': str(1_000_000 + i),
+                    'Calculadora Payback/Ciudad': rng.choice(ciudades),
+                    'Calculadora Payback/Nivel Tension': rng.choice(OPP_LEVELS),
+                    'Calculadora Payback/Propiedad de Equipos': rng.choice(OPP_PROPIEDAD),
+                    'Calculadora Payback/Operador de Red': rng.choice(calc_providers),
+                    'Calculadora Payback/Comercializador Actual': prov if rng.random() > 0.03 else '',
+                    EXTRA_COLUMN: rng.choice(['Propuesta', 'Negociación', 'Cerrada']),
+                })
+                i += 1
+    return opp_n
+
+
+def generate_dataset(out_dir: str, n_frontiers: int, n_months: int, seed: int = 1) -> Dict[str, object]:
+    """Genera oportunidades.csv y tarifas.csv en out_dir."""
+    opps_path = os.path.join(out_dir, 'oportunidades.csv')
+    tariffs_path = os.path.join(out_dir, 'tarifas.csv')
+    n_opps = generate_opportunities(opps_path, n_frontiers, seed=seed)
+    n_tariffs = generate_tariffs(tariffs_path, n_months, seed=seed)
+    return {'opportunities_csv': opps_path, 'tariffs_csv': tariffs_path, 'opportunities': n_opps,
+            'frontiers': n_frontiers, 'months': n_months, 'tariff_rows': n_tariffs, 'seed': seed}
+
+
+def main():
+    p = argparse.ArgumentParser(description='Datos sintéticos de oportunidades y tarifas.')
+    p.add_argument('--frontiers', type=int, default=1000, help='Fronteras (filas del CSV de oportunidades)')
+    p.add_argument('--months', type=int, default=12, help='Meses de tarifas')
+    p.add_argument('--seed', type=int, default=1)
+    p.add_argument('--out', default=os.path.join('benchmarks', 'data'), help='Carpeta de salida')
+    args = p.parse_args()
+    info = generate_dataset(args.out, args.frontiers, args.months, args.seed)
+    print(f"✅ {info['opportunities']} oportunidades / {info['frontiers']} fronteras -> {info['opportunities_csv']}")
+    print(f"✅ {info['tariff_rows']} filas de tarifas ({info['months']} meses) -> {info['tariffs_csv']}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,161 @@
+# pipeline.py
+"""
+Pipeline en proceso: oportunidades -> análisis de tarifas -> resumen.
+
+Las etapas se pasan DataFrames y listas de registros en memoria (sin subprocesos ni
+JSON intermedios) y las tarifas se obtienen una sola vez. Los JSON se escriben al
+final: siempre el resumen; el anidado y el análisis solo si se piden
+(write_intermediates=True). El debug de búsquedas va en streaming a un AuditSink.
+
+Uso:
+  from pipeline import run_pipeline
+  res = run_pipeline('oportunidades.csv', from_month='2025-04', to_month='2025-06')
+"""
+import os
+from typing import Any, Dict, Optional, Sequence
+
+import run_opps_sql
+import run_summary
+import run_tariff_analysis as rta
+from src.audit import open_audit_sink
+from src.compute import DEFAULT_DISCOUNT_RATE
+from src.export import output_path
+from src.incremental import AnalysisCache
+from src.metrics import RunMetrics, RUN_METRICS_PATH
+from src.srcload import tariff_source_from_spec
+
+
+def output_paths(out_dir: str = 'outputs', output_format: str = 'json',
+                 compression: Optional[str] = None) -> Dict[str, str]:
+    return {
+        'nested': output_path(os.path.join(out_dir, 'opportunities_curated_nested.json'), output_format, compression),
+        'analysis': output_path(os.path.join(out_dir, 'analisis_tarifas_por_frontera.json'), output_format, compression),
+        'debug': output_path(os.path.join(out_dir, 'debug_tariff_lookup.json'), 'json', compression),
+        'summary': output_path(os.path.join(out_dir, 'resumen_oportunidades.json'), output_format, compression),
+    }
+
+
+def run_pipeline(csv_path: str, from_month: str, to_month: str,
+                 cities_map: Optional[str] = None, providers_map: Optional[str] = None,
+                 offline: bool = False, engine: str = 'loop', opps_engine: str = 'loop', csv_parser: str = 'c',
+                 out_dir: str = 'outputs', write_intermediates: bool = False,
+                 audit_format: str = 'json', audit_level: Optional[str] = None,
+                 incremental_db: Optional[str] = None, workers: int = 1,
+                 metrics_path: Optional[str] = RUN_METRICS_PATH, profile_dir: Optional[str] = None,
+                 tariff_source: Optional[str] = None,
+                 resource_ids: Optional[Sequence[int]] = None,
+                 discount_rate: Optional[float] = None,
+                 tariff_store: Optional[str] = None, output_format: str = 'json',
+                 compression: Optional[str] = None, json_backend: str = 'json') -> Dict[str, Any]:
+    """
+    Ejecuta las tres etapas en este proceso y devuelve los resultados en memoria:
+    {'opportunities', 'analisis', 'resumen', 'audit', 'paths'} (+ 'incremental' si aplica).
+    La auditoría se escribe en streaming (ver src/audit.py); por defecto 'full' si se piden
+    intermedios y 'off' si no.
+    Con incremental_db, solo se recalculan (análisis y resumen) las oportunidades nuevas o
+    modificadas; el resto sale de la tabla analysis_cache de esa base.
+    Con workers > 1 el cruce de tarifas se reparte entre procesos (misma salida).
+    tariff_source cambia el origen de las tarifas (URL, CSV o sqlite:RUTA; ver
+    src.srcload.tariff_source_from_spec); por defecto, el Lambda con caché. Con varios
+    resource_ids, los recursos se descargan en paralelo y se unen en ese orden.
+    La descarga de tarifas corre en un hilo mientras se lee el CSV de oportunidades.
+    discount_rate: tasa anual del VPN en el resumen (None = compute.DEFAULT_DISCOUNT_RATE).
+    Con tariff_store (carpeta) las tarifas se preparan por mes en ese almacén y solo se
+    procesan los meses del rango (ver src/tariff_store.py).
+    output_format / compression / json_backend: cómo se escriben los JSON (ver src/export.py).
+    Con opps_engine='compact' (y engine='vector') oportunidades y análisis quedan en el modelo
+    compacto de src/frontiers.py: los registros anidados se arman recién al escribirlos.
+    Las métricas por etapa quedan en la sección 'pipeline' de metrics_path (None = no escribir)
+    y en res['metrics']; con profile_dir, también los volcados cProfile/tracemalloc.
+    """
+    paths = output_paths(out_dir, output_format, compression)
+    export = (output_format, compression, json_backend)
+    metrics = RunMetrics('pipeline', metrics_path, profile_dir)
+
+    # 1) Tarifas en un hilo de fondo (una sola descarga/lectura de caché por recurso),
+    #    solapadas con la lectura del CSV de oportunidades
+    cache_info: Dict[str, Any] = {}
+    tariffs_future = rta.load_tariffs_async(
+        offline=offline, cache_info=cache_info, resource_ids=resource_ids,
+        source=tariff_source_from_spec(tariff_source) if tariff_source else None)
+
+    # 2) Oportunidades -> registros anidados
+    files: Dict[str, Any] = {}
+    with metrics.stage('load_csv') as st:
+        df_opp = run_opps_sql.load_opportunity_input(csv_path, parser=csv_parser, stats=files)
+        st.update(rows_out=len(df_opp), files=files['files'])
+    if files['files'] > 1:
+        metrics.count('opportunity_files', files)
+    with metrics.stage('build_nested') as st:
+        opps = run_opps_sql.BUILDERS[opps_engine](df_opp)
+        st.update(rows_in=len(df_opp), rows_out=len(opps))
+
+    # 3) Cruce de tarifas por frontera
+    city_map = rta.load_mapping_json(cities_map, 'cities_mapping.json')
+    prov_map = rta.load_mapping_json(providers_map, 'providers_mapping.json')
+    with metrics.stage('load_tariffs') as st:
+        df_tariffs = tariffs_future.result()
+        st['rows_out'] = len(df_tariffs)
+    metrics.count('tariff_cache', cache_info)
+    with metrics.stage('prepare_tariffs') as st:
+        if tariff_store:
+            store_stats: Dict[str, Any] = {}
+            df_tar = rta.prepare_tariffs_stored(df_tariffs, prov_map, from_month, to_month, tariff_store,
+                                                snapshot=cache_info.get('sha256'), stats=store_stats)
+            metrics.count('tariff_store', store_stats)
+        else:
+            df_tar = rta.prepare_tariffs(df_tariffs, prov_map, from_month, to_month)
+        st.update(rows_in=len(df_tariffs), rows_out=len(df_tar))
+    level = audit_level or ('full' if write_intermediates else 'off')
+    audit_path = paths['debug'] if audit_format == 'json' else None
+    cache = AnalysisCache(incremental_db) if incremental_db else None
+    stats = None
+    lookup: Dict[str, Any] = {}
+    with open_audit_sink(audit_format, level, audit_path, backend=json_backend, out_dir=out_dir) as audit, metrics.stage('analysis') as st:
+        if cache is not None:
+            salida, stats = rta.analizar_incremental(opps, df_tar, city_map, prov_map, from_month, to_month,
+                                                     cache, engine=engine, audit=audit, workers=workers,
+                                                     stats=lookup)
+            metrics.count('incremental', stats)
+        else:
+            salida, _ = rta.analizar(opps, df_tar, city_map, prov_map, engine=engine, audit=audit,
+                                     workers=workers, stats=lookup)
+        st.update(rows_in=len(opps), rows_out=lookup.get('cells', 0), engine=engine, workers=workers,
+                  index_s=lookup.pop('index_s', None))
+    matcher = {'hits': lookup.pop('matcher_hits', 0), 'misses': lookup.pop('matcher_misses', 0)}
+    metrics.count('lookup', lookup)
+    metrics.count('provider_matcher_cache', matcher)
+
+    # 4) Resumen por oportunidad
+    with metrics.stage('summary') as st:
+        if cache is not None:
+            resumen, _ = run_summary.build_summary_incremental(opps, lambda: salida, cache)
+            cache.close()
+        else:
+            resumen = run_summary.build_summary(opps, salida)
+        run_summary.add_financials(resumen, DEFAULT_DISCOUNT_RATE if discount_rate is None else discount_rate)
+        st.update(rows_in=len(opps), rows_out=len(resumen))
+
+    # 5) Escritura al final
+    with metrics.stage('write_outputs'):
+        written = {'summary': run_summary.write_summary(resumen, paths['summary'], *export)}
+        if write_intermediates:
+            written['nested'] = run_opps_sql.write_nested(opps, paths['nested'], *export)
+            written['analysis'] = rta.write_outputs(salida, None, paths['analysis'], output_format=output_format,
+                                                    compression=compression, json_backend=json_backend)
+    if audit.enabled:
+        written['debug'] = getattr(audit, 'path', None) or getattr(audit, 'db_path', None)
+
+    res = {
+        'opportunities': opps,
+        'analisis': salida,
+        'resumen': resumen,
+        'audit': {'level': audit.level, 'rows_seen': audit.rows_seen, 'rows_written': audit.rows_written},
+        'paths': written,
+        'metrics': metrics.as_dict(),
+    }
+    if metrics_path:
+        written['metrics'] = metrics.write()
+    if stats is not None:
+        res['incremental'] = stats
+    return res
@@ -2,7 +2,10 @@
 import os
 import sys
 import re
+import glob
+import argparse
 import subprocess
+from concurrent.futures import ThreadPoolExecutor
 
 # ---------- Utilidades ----------
 def info(msg): print(f"🟢 {msg}")
@@ -34,8 +37,8 @@ def choose_csv_file():
             warn(f"No se pudo abrir el explorador gráfico ({e}).")
             path = None
     if not path:
-        path = input("Ruta al CSV (arrástralo aquí o pega la ruta): ").strip().strip('"').strip("'")
-    if not path or not os.path.exists(path):
+        path = input("Ruta al CSV, carpeta o patrón glob (arrástralo aquí o pega la ruta): ").strip().strip('"').strip("'")
+    if not path or (not os.path.exists(path) and not glob.glob(path)):
         raise FileNotFoundError(f"No existe el archivo: {path}")
     return path
 
@@ -59,6 +62,29 @@ def ensure_mappings():
         )
     return cities, provs
 
+def _warm_tariff_cache(tariff_source, resource_ids):
+    import run_tariff_analysis as rta
+    from src.srcload import tariff_source_from_spec
+    source = tariff_source_from_spec(tariff_source) if tariff_source else None
+    return len(rta.load_tariffs(source=source, resource_ids=resource_ids))
+
+def prefetch_tariffs(args):
+    """
+    Descarga las tarifas a la caché local en un hilo mientras run_opps_sql.py procesa el CSV;
+    luego run_tariff_analysis.py las encuentra en caché (HIT). Las fuentes locales no lo necesitan.
+    """
+    if args.offline or (args.tariff_source and not args.tariff_source.startswith(("http://", "https://"))):
+        return None
+    pool = ThreadPoolExecutor(max_workers=1)
+    future = pool.submit(_warm_tariff_cache, args.tariff_source, args.resource_ids)
+    pool.shutdown(wait=False)
+    return future
+
+def out_json(args, path, fmt=None):
+    """Ruta de una salida JSON según --output-format/--compress (p. ej. .ndjson.gz)."""
+    from src.export import output_path
+    return output_path(path, fmt or args.output_format, args.compression)
+
 def run_subpy(script, args=None):
     args = args or []
     cmd = [sys.executable, script] + args
@@ -95,12 +121,79 @@ def open_folder(path_to_file):
     except Exception as e:
         warn(f"No pude abrir la carpeta: {e}")
 
+def parse_args():
+    p = argparse.ArgumentParser(description="Iniciador del análisis comercial.")
+    p.add_argument("--offline", action="store_true",
+                   help="Usar solo el snapshot de tarifas en caché local (sin llamar al Lambda)")
+    p.add_argument("--in-process", dest="in_process", action="store_true",
+                   help="Ejecutar las etapas en este proceso, pasando los datos en memoria")
+    p.add_argument("--write-intermediates", dest="write_intermediates", action="store_true",
+                   help="Con --in-process: escribir también el JSON anidado, el análisis y el debug")
+    p.add_argument("--incremental", action="store_true",
+                   help="Recalcular solo las oportunidades nuevas o modificadas (caché en data/analisis.sqlite)")
+    p.add_argument("--arrow", action="store_true",
+                   help="Pasar los datos entre etapas como tablas Arrow (outputs/columnar/); solo el resumen queda en JSON")
+    p.add_argument("--compact-model", dest="compact_model", action="store_true",
+                   help="Oportunidades y análisis en el modelo columnar compacto (motores 'compact' y 'vector'): "
+                        "menos memoria con carteras grandes, misma salida")
+    p.add_argument("--workers", type=int, default=1,
+                   help="Procesos para el análisis de tarifas (por defecto 1)")
+    p.add_argument("--tariff-source", dest="tariff_source", default=None,
+                   help="Origen de las tarifas: URL del Lambda (o de un sustituto local), CSV o sqlite:RUTA[#snapshot]")
+    p.add_argument("--resource-ids", dest="resource_ids", type=int, nargs="+", default=None,
+                   help="Recursos de tarifas a descargar en paralelo y unir (por defecto el configurado)")
+    p.add_argument("--tariff-store", dest="tariff_store", action="store_true",
+                   help="Preparar las tarifas por mes en data/tariff_store/ y procesar solo los meses del rango")
+    p.add_argument("--discount-rate", dest="discount_rate", type=float, default=None,
+                   help="Tasa de descuento anual efectiva para el VPN del resumen (por defecto 0.12)")
+    p.add_argument("--profile", action="store_true",
+                   help="Guardar perfiles cProfile/tracemalloc por etapa en outputs/profile/")
+    p.add_argument("--output-format", dest="output_format", choices=("json", "compact", "ndjson"), default="json",
+                   help="Formato de los JSON de salida: json (indent=2), compact o ndjson (uno por línea)")
+    p.add_argument("--compress", dest="compression", choices=("gzip", "zstd"), default=None,
+                   help="Comprimir los JSON de salida (.gz / .zst; zstd requiere zstandard)")
+    p.add_argument("--json-backend", dest="json_backend", choices=("json", "orjson", "auto"), default="json",
+                   help="Serializador JSON: json (stdlib), orjson (más rápido, opcional) o auto")
+    p.add_argument("--csv", default=None,
+                   help="CSV de oportunidades, o carpeta / patrón glob con varios (si no, se pregunta)")
+    p.add_argument("--from", dest="from_month", default=None, help="Mes inicial YYYY-MM (si no, se pregunta)")
+    p.add_argument("--to",   dest="to_month",   default=None, help="Mes final YYYY-MM (si no, se pregunta)")
+    return p.parse_args()
+
+def run_in_process(args, csv_path, cities_map, providers_map, from_m, to_m):
+    from pipeline import run_pipeline
+    info("Ejecutando etapas en proceso…")
+    res = run_pipeline(csv_path, from_m, to_m,
+                       cities_map=cities_map, providers_map=providers_map,
+                       offline=args.offline, write_intermediates=args.write_intermediates,
+                       engine="vector" if args.compact_model else "loop",
+                       opps_engine="compact" if args.compact_model else "loop",
+                       incremental_db=os.path.join("data", "analisis.sqlite") if args.incremental else None,
+                       workers=args.workers, tariff_source=args.tariff_source, resource_ids=args.resource_ids,
+                       discount_rate=args.discount_rate,
+                       tariff_store=os.path.join("data", "tariff_store") if args.tariff_store else None,
+                       output_format=args.output_format, compression=args.compression,
+                       json_backend=args.json_backend,
+                       profile_dir=os.path.join("outputs", "profile") if args.profile else None)
+    if "incremental" in res:
+        st = res["incremental"]
+        info(f"Incremental: {st['recalculadas']} recalculadas, {st['reutilizadas']} reutilizadas de {st['total']}")
+    out_summary = res["paths"]["summary"]
+    print("\n✅ Listo.")
+    print(f"   Resumen: {os.path.abspath(out_summary)}")
+    if args.write_intermediates:
+        print(f"   (También se generó {res['paths'].get('debug')} para auditoría)\n")
+    open_folder(out_summary)
+
 # ---------- Main ----------
 def main():
+    args = parse_args()
     print("\n=== Analisis comercial — Iniciador ===\n")
 
     # 1) CSV
-    csv_path = choose_csv_file()
+    csv_path = args.csv.strip().strip('"').strip("'") if args.csv else choose_csv_file()
+    if not os.path.exists(csv_path) and not glob.glob(csv_path):
+        raise FileNotFoundError(f"No existe el archivo: {csv_path}")
     info(f"CSV seleccionado: {csv_path}")
 
     # 2) Mapeos
@@ -108,31 +201,78 @@ def main():
     info(f"Usando mapeos:\n  - {cities_map}\n  - {providers_map}")
 
     # 3) Rango de meses (siempre inicio-fin)
-    from_m, to_m = ask_range()
+    if args.from_month and args.to_month:
+        for m in (args.from_month, args.to_month):
+            if not RE_YYYY_MM.match(m):
+                raise ValueError(f"Mes inválido: {m}. Usa YYYY-MM (ej. 2024-07).")
+        from_m, to_m = args.from_month, args.to_month
+        if from_m > to_m:
+            warn("Mes inicial > Mes final. Intercambiando…")
+            from_m, to_m = to_m, from_m
+    else:
+        from_m, to_m = ask_range()
     rango_args = ["--from", from_m, "--to", to_m]
     info(f"Rango aplicado: {from_m} .. {to_m}")
 
-    # 4) Oportunidades -> JSON anidado
-    out_nested = os.path.join("outputs", "opportunities_curated_nested.json")
-    run_subpy("run_opps_sql.py", [csv_path])
+    if args.in_process:
+        run_in_process(args, csv_path, cities_map, providers_map, from_m, to_m)
+        return
+
+    # 4) Oportunidades -> JSON anidado (o tablas Arrow)
+    export_args = ["--output-format", args.output_format, "--json-backend", args.json_backend]
+    if args.compression:
+        export_args += ["--compress", args.compression]
+    out_nested = out_json(args, os.path.join("outputs", "opportunities_curated_nested.json"))
+    arrow_args = ["--arrow"] if args.arrow else []
+    profile_args = ["--profile"] if args.profile else []
+    if args.arrow:
+        out_nested = os.path.join("outputs", "columnar", "opportunities.arrow")
+    prefetch = prefetch_tariffs(args)
+    compact_args = ["--engine", "compact"] if args.compact_model else []
+    run_subpy("run_opps_sql.py", [csv_path] + compact_args + arrow_args + profile_args + export_args)
     if not os.path.exists(out_nested):
-        raise RuntimeError("No se generó outputs/opportunities_curated_nested.json")
+        raise RuntimeError(f"No se generó {out_nested}")
+    if prefetch is not None:
+        try:
+            prefetch.result()
+        except Exception as e:
+            warn(f"No se pudieron precargar las tarifas ({e}); el análisis lo reintenta.")
 
     # 5) Análisis de tarifas por frontera (FILTRA aquí)
-    out_analysis = os.path.join("outputs", "analisis_tarifas_por_frontera.json")
-    run_subpy("run_tariff_analysis.py", [out_nested, cities_map, providers_map] + rango_args)
+    out_analysis = out_json(args, os.path.join("outputs", "analisis_tarifas_por_frontera.json"))
+    if args.arrow:
+        out_analysis = os.path.join("outputs", "columnar", "analysis_months.arrow")
+    tariff_args = ["--offline"] if args.offline else []
+    incremental_args = ["--incremental"] if args.incremental else []
+    if args.workers > 1:
+        tariff_args += ["--workers", str(args.workers)]
+    if args.tariff_source:
+        tariff_args += ["--tariff-source", args.tariff_source]
+    if args.resource_ids:
+        tariff_args += ["--resource-ids"] + [str(r) for r in args.resource_ids]
+    if args.tariff_store:
+        tariff_args += ["--tariff-store"]
+    if args.compact_model:
+        tariff_args += ["--engine", "vector", "--compact-model"]
+    # Con --arrow el primer posicional no se usa (se lee outputs/columnar/)
+    run_subpy("run_tariff_analysis.py",
+              [out_nested, cities_map, providers_map] + rango_args + tariff_args + incremental_args + arrow_args
+              + profile_args + export_args)
     if not os.path.exists(out_analysis):
-        raise RuntimeError("No se generó outputs/analisis_tarifas_por_frontera.json")
+        raise RuntimeError(f"No se generó {out_analysis}")
 
     # 6) Resumen usando el MISMO rango
-    out_summary = os.path.join("outputs", "resumen_oportunidades.json")
-    run_subpy("run_summary.py", rango_args)
+    out_summary = out_json(args, os.path.join("outputs", "resumen_oportunidades.json"))
+    summary_args = ["--discount-rate", str(args.discount_rate)] if args.discount_rate is not None else []
+    run_subpy("run_summary.py", rango_args + incremental_args + arrow_args + profile_args + summary_args + export_args)
     if not os.path.exists(out_summary):
-        raise RuntimeError("No se generó outputs/resumen_oportunidades.json")
+        raise RuntimeError(f"No se generó {out_summary}")
 
     print("\n✅ Listo.")
     print(f"   Resumen: {os.path.abspath(out_summary)}")
-    print("   (También se generó outputs/debug_tariff_lookup.json para auditoría)\n")
+    debug = out_json(args, os.path.join("outputs", "debug_tariff_lookup.json"), fmt="json")
+    print(f"   (También se generó {debug} para auditoría)")
+    print("   Métricas por etapa: outputs/run_metrics.json\n")
     open_folder(out_summary)
 
 if __name__ == "__main__":
@@ -4,87 +4,95 @@ PARTE 1 (anidado, listo para cruce con tarifas) — SOLO valores únicos y sumas
 - Totales y campos únicos en la cabecera de cada oportunidad
 - Detalle por frontera en la clave "fronteras"
 - Exporta: "nivel_de_tension" como nivel_{1|2|3}_{user|operator|shared}
-Salida: outputs/opportunities_curated_nested.json
+Entrada: un CSV, o una carpeta / patrón glob con varios (uno por región o equipo), leídos en paralelo.
+Salida: outputs/opportunities_curated_nested.json (o, con --arrow, tablas Arrow en outputs/columnar/)
 """
-import sys
 import os
-import json
-import unicodedata
+import argparse
+import tempfile
+import numpy as np
 import pandas as pd
-from src.srcload import load_opportunities
+from src.srcload import (load_opportunities, load_opportunity_files, opportunity_csv_paths, iter_opportunities,
+                         OPPORTUNITY_PIPELINE_COLUMNS, CSV_ENGINES, FFILLED_ATTR)
+from src.db import init_db, upsert_opportunities, DEFAULT_DB_PATH
+from src.columnar import write_opportunities, COLUMNAR_DIR
+from src.export import (write_records, output_path, add_export_args, encode_record, resolve_backend,
+                        RecordWriter)
+from src.metrics import RunMetrics, RUN_METRICS_PATH, PROFILE_DIR
+from src.textnorm import clean_str, nivel_frontera, map_distinct
+from src.frontiers import Portfolio, OPPORTUNITY_FIELDS, FRONTIER_FIELDS
 
 def _normalize_path(path: str) -> str:
     return path.strip().strip('"').strip("'")
 
-def _clean_str(x):
-    s = str(x) if x is not None else ''
-    return ' '.join(s.split())
-
-def _norm_text(s):
-    if s is None:
-        return ''
-    s = str(s).strip().upper()
-    s = ''.join(c for c in unicodedata.normalize('NFKD', s) if not unicodedata.combining(c))
-    s = ' '.join(s.split())
-    return s
-
-def _nivel_simple(nivel_raw):
-    n = _norm_text(nivel_raw)
-    if '1' in n: return 'NIVEL 1'
-    if '2' in n: return 'NIVEL 2'
-    if '3' in n: return 'NIVEL 3'
-    for ch in n:
-        if ch.isdigit() and ch in '123':
-            return f'NIVEL {ch}'
-    return None
-
-def _nivel_compuesto(propiedad_raw, nivel_raw):
-    """
-    Construye nivel_{1|2|3}_{operator|user|shared}
-    """
-    p = _norm_text(propiedad_raw)
-    n = _nivel_simple(nivel_raw)  # -> 'NIVEL X' o None
-    if not n:
-        return None
-    dig = n[-1]  # '1'/'2'/'3'
-
-    # tipo por propiedad
-    if 'USUARIO' in p:
-        kind = 'user'
-    elif 'OPERADOR' in p:
-        kind = 'operator'
-    elif 'COMPARTID' in p or 'SHARED' in p:
-        kind = 'shared'
-    else:
-        return None
-
-    return f'nivel_{dig}_{kind}'
-
 def _first_nonnull(series: pd.Series):
     for x in series:
         if pd.notna(x) and str(x).strip() != '':
             return x
     return None
 
-def main(raw_csv_path: str):
-    csv_path = _normalize_path(raw_csv_path)
+OUT_NESTED = os.path.join('outputs', 'opportunities_curated_nested.json')
 
-    # 1) Cargar oportunidades
-    df = load_opportunities(csv_path).copy()
-
-    # 1.1) Rellenar hacia adelante columnas de identidad
-    id_cols = [
-        'Oportunidad', 'Cliente', 'Calculadora Payback/Número de Cuenta',
-        'Calculadora Payback/Ciudad', 'Calculadora Payback/Ciiu',
-        'Calculadora Payback/Region', 'Calculadora Payback/Nivel Tension',
-        'Calculadora Payback/Propiedad de Equipos',
-        'Calculadora Payback/Operador de Red',
-        'Calculadora Payback/Comercializador Actual',
-        'Tarifa B', 'Costo Total Opex Oportunity', 'Costo Total Capex Oportunity',
-    ]
-    for c in id_cols:
-        if c in df.columns:
+# Columnas de identidad que se rellenan hacia adelante (filas de detalle sin cabecera)
+ID_COLS = [
+    'Oportunidad', 'Cliente', 'Calculadora Payback/Número de Cuenta',
+    'Calculadora Payback/Ciudad', 'Calculadora Payback/Ciiu',
+    'Calculadora Payback/Region', 'Calculadora Payback/Nivel Tension',
+    'Calculadora Payback/Propiedad de Equipos',
+    'Calculadora Payback/Operador de Red',
+    'Calculadora Payback/Comercializador Actual',
+    'Tarifa B', 'Costo Total Opex Oportunity', 'Costo Total Capex Oportunity',
+]
+
+def ffill_identity(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Copia de df con ID_COLS rellenadas hacia adelante. Las que load_opportunity_files ya
+    rellenó por archivo (attrs[FFILLED_ATTR]) se dejan igual: rellenarlas sobre los archivos
+    unidos pasaría valores de un archivo al siguiente.
+    """
+    df = df.copy()
+    done = set(df.attrs.get(FFILLED_ATTR, ()))
+    for c in ID_COLS:
+        if c in df.columns and c not in done:
             df[c] = df[c].ffill()
+    return df
+
+# Columnas que build_nested y build_portfolio leen sin valor por defecto
+BUILD_REQUIRED_COLS = [
+    'Oportunidad', 'Cliente', 'Calculadora Payback/Número de Cuenta', 'Calculadora Payback/Ciudad',
+    'Calculadora Payback/kWh Promedio / Mes', 'Calculadora Payback/Modem & Medidor',
+    'Tarifa B', 'Costo Total Opex Oportunity', 'Costo Total Capex Oportunity',
+]
+
+def require_columns(df: pd.DataFrame, cols=BUILD_REQUIRED_COLS) -> None:
+    """ValueError con todas las columnas que faltan (no un KeyError con la primera)."""
+    missing = [c for c in cols if c not in df.columns]
+    if missing:
+        raise ValueError(f"Faltan columnas para construir el anidado: {missing}")
+
+def load_opportunity_input(csv_path: str, parser: str = 'c',
+                           workers: int = None, stats: dict = None) -> pd.DataFrame:
+    """
+    Un CSV de oportunidades, o una carpeta / patrón glob con varios: estos se leen en paralelo,
+    con ID_COLS rellenadas por archivo y cada oportunidad tomada del primer archivo en que
+    aparece (ver srcload.load_opportunity_files).
+    """
+    if os.path.isfile(csv_path):
+        df = load_opportunities(csv_path, usecols=OPPORTUNITY_PIPELINE_COLUMNS, engine=parser)
+        if stats is not None:
+            stats.update(files=1, rows=len(df), duplicated_opportunities=0, duplicated_rows=0,
+                         orphan_rows=0)
+        return df
+    return load_opportunity_files(opportunity_csv_paths(csv_path), usecols=OPPORTUNITY_PIPELINE_COLUMNS,
+                                  engine=parser, workers=workers, ffill_cols=ID_COLS,
+                                  stats=stats)
+
+def build_nested(df: pd.DataFrame) -> list:
+    """
+    DataFrame de load_opportunities -> lista de oportunidades con sus fronteras anidadas.
+    """
+    require_columns(df)
+    df = ffill_identity(df)
 
     # 2) Construir salida anidada por Oportunidad
     out = []
@@ -93,33 +101,29 @@ def main(raw_csv_path: str):
         total_renting = float(g['Calculadora Payback/Modem & Medidor'].sum())
 
         frontier_name = _first_nonnull(g['Calculadora Payback/Número de Cuenta'])
-        cliente   = _clean_str(_first_nonnull(g['Cliente']))
+        cliente   = clean_str(_first_nonnull(g['Cliente']))
         tarifa_b  = _first_nonnull(g['Tarifa B'])
         opex      = _first_nonnull(g['Costo Total Opex Oportunity'])
         capex     = _first_nonnull(g['Costo Total Capex Oportunity'])
-        ciudad_u  = _clean_str(_first_nonnull(g['Calculadora Payback/Ciudad']))
+        ciudad_u  = clean_str(_first_nonnull(g['Calculadora Payback/Ciudad']))
         inversion_cliente = float(capex or 0) + float(opex or 0)
 
         fronteras = []
         for _, r in g.iterrows():
-            prop_act  = _clean_str(r.get('Calculadora Payback/Propiedad de Equipos', '') or '')
-            nivel_in  = _clean_str(r.get('Calculadora Payback/Nivel Tension', '') or '')
-            nivel_cmp = _nivel_compuesto(prop_act, nivel_in)      # <- compuesto
-            if nivel_cmp is None:
-                # respaldo a simple si no se pudo componer
-                ns = _nivel_simple(nivel_in)
-                nivel_cmp = ns.lower().replace(' ', '_') if ns else None  # ej. 'nivel_1'
+            prop_act  = clean_str(r.get('Calculadora Payback/Propiedad de Equipos', '') or '')
+            nivel_in  = clean_str(r.get('Calculadora Payback/Nivel Tension', '') or '')
+            nivel_cmp = nivel_frontera(prop_act, nivel_in)  # compuesto, o simple ('nivel_1') si no se pudo
 
             fronteras.append({
-                "frontier_name":  _clean_str(r.get('Calculadora Payback/Número de Cuenta', '') or ''),
+                "frontier_name":  clean_str(r.get('Calculadora Payback/Número de Cuenta', '') or ''),
                 "consumo": float(r.get('Calculadora Payback/kWh Promedio / Mes', 0) or 0),
                 "renting": float(r.get('Calculadora Payback/Modem & Medidor', 0) or 0),
-                "city":    _clean_str(r.get('Calculadora Payback/Region', '') or ''),   # ↔ tarifas.city
-                "ciudad":  _clean_str(r.get('Calculadora Payback/Ciudad', '') or ''),
+                "city":    clean_str(r.get('Calculadora Payback/Region', '') or ''),   # ↔ tarifas.city
+                "ciudad":  clean_str(r.get('Calculadora Payback/Ciudad', '') or ''),
                 "nivel_de_tension": nivel_cmp,   # <- SOLO este campo
-                "operador_de_red": _clean_str(r.get('Calculadora Payback/Operador de Red', '') or ''),
-                "provider_actual": _clean_str(r.get('Calculadora Payback/Comercializador Actual', '') or ''),
-                "provider":        _clean_str(r.get('Calculadora Payback/Comercializador Actual', '') or '')
+                "operador_de_red": clean_str(r.get('Calculadora Payback/Operador de Red', '') or ''),
+                "provider_actual": clean_str(r.get('Calculadora Payback/Comercializador Actual', '') or ''),
+                "provider":        clean_str(r.get('Calculadora Payback/Comercializador Actual', '') or '')
             })
 
         registro = {
@@ -137,12 +141,256 @@ def main(raw_csv_path: str):
         }
         out.append(registro)
 
-    os.makedirs('outputs', exist_ok=True)
-    with open(os.path.join('outputs', 'opportunities_curated_nested.json'), 'w', encoding='utf-8') as f:
-        json.dump(out, f, ensure_ascii=False, indent=2)
+    return out
+
+# --------- Constructor columnar ---------
+def _clean_cell(x):
+    # mismo resultado que clean_str(r.get(col, '') or '') en la versión por filas
+    return clean_str(x or '')
+
+def _is_filled(x) -> bool:
+    return bool(pd.notna(x) and str(x).strip() != '')
+
+def _clean_col(df: pd.DataFrame, col: str) -> np.ndarray:
+    if col not in df.columns:
+        return np.full(len(df), '', dtype=object)
+    return map_distinct(df[col], _clean_cell)
+
+def _num_col(df: pd.DataFrame, col: str) -> np.ndarray:
+    if col not in df.columns:
+        return np.zeros(len(df), dtype=float)
+    vals = df[col].to_numpy(dtype=float)
+    return np.where(vals == 0, 0.0, vals)  # float(x or 0): -0.0 -> 0.0
+
+def _nivel_frontera(pair):
+    return nivel_frontera(*pair)
+
+def build_portfolio(df: pd.DataFrame) -> Portfolio:
+    """
+    Mismo resultado que build_nested, sin groupby/iterrows y sin un dict por frontera:
+    - cabeceras con primer no nulo y sumas por oportunidad sobre arreglos ordenados por grupo,
+    - normalizaciones (limpieza de texto, nivel_de_tension) una sola vez por valor distinto,
+    - las fronteras quedan en columnas (src/frontiers.py); cada registro anidado se arma al pedirlo.
+    """
+    require_columns(df)
+    df = ffill_identity(df)
+    n = len(df)
+    if n == 0:
+        return Portfolio.from_columns({name: [] for name in OPPORTUNITY_FIELDS}, [],
+                                      {name: [] for name in FRONTIER_FIELDS})
+
+    # Grupos en el orden de groupby(sort=True, dropna=False): llaves ordenadas, NaN al final
+    codes, opp_keys = pd.factorize(df['Oportunidad'], sort=True, use_na_sentinel=False)
+    order = np.argsort(codes, kind='stable')
+    counts = np.bincount(codes, minlength=len(opp_keys))
+    starts = np.concatenate(([0], np.cumsum(counts)[:-1]))
+
+    # Cabecera: primer valor no vacío por grupo
+    def first_nonnull(col):
+        vals = df[col].to_numpy(dtype=object)[order]
+        ok = map_distinct(df[col], _is_filled).astype(bool)[order]
+        pos = np.where(ok, np.arange(n), n)
+        first = np.minimum.reduceat(pos, starts)
+        return [vals[p] if p < starts[i] + counts[i] else None for i, p in enumerate(first.tolist())]
+
+    cliente_f = first_nonnull('Cliente')
+    tarifa_f  = first_nonnull('Tarifa B')
+    opex_f    = first_nonnull('Costo Total Opex Oportunity')
+    capex_f   = first_nonnull('Costo Total Capex Oportunity')
+    ciudad_f  = first_nonnull('Calculadora Payback/Ciudad')
+
+    # Sumas por grupo (np.sum por tramo, como Series.sum)
+    kwh_sorted = df['Calculadora Payback/kWh Promedio / Mes'].to_numpy()[order]
+    rent_sorted = df['Calculadora Payback/Modem & Medidor'].to_numpy()[order]
+    bounds = list(zip(starts.tolist(), (starts + counts).tolist()))
+
+    # Columnas de frontera (en orden de grupo)
+    provider = _clean_col(df, 'Calculadora Payback/Comercializador Actual')[order]
+    pairs = pd.Series(list(zip(_clean_col(df, 'Calculadora Payback/Propiedad de Equipos'),
+                               _clean_col(df, 'Calculadora Payback/Nivel Tension'))), dtype=object)
+    frontiers = {
+        'frontier_name':    _clean_col(df, 'Calculadora Payback/Número de Cuenta')[order].tolist(),
+        'consumo':          _num_col(df, 'Calculadora Payback/kWh Promedio / Mes')[order],
+        'renting':          _num_col(df, 'Calculadora Payback/Modem & Medidor')[order],
+        'city':             _clean_col(df, 'Calculadora Payback/Region')[order],   # ↔ tarifas.city
+        'ciudad':           _clean_col(df, 'Calculadora Payback/Ciudad')[order],
+        'nivel_de_tension': map_distinct(pairs, _nivel_frontera)[order],
+        'operador_de_red':  _clean_col(df, 'Calculadora Payback/Operador de Red')[order],
+        'provider_actual':  provider,
+        'provider':         provider,
+    }
+
+    opex = [float(x or 0) for x in opex_f]
+    capex = [float(x or 0) for x in capex_f]
+    heads = {
+        'oportunidad': opp_keys.tolist(),
+        'cliente': [clean_str(x) for x in cliente_f],
+        'inversion_cliente': [c + o for c, o in zip(capex, opex)],
+        'tarifa_b': [float(x or 0) for x in tarifa_f],
+        'opex': opex,
+        'capex': capex,
+        'consumo_total': [float(kwh_sorted[a:b].sum()) for a, b in bounds],
+        'total_renting': [float(rent_sorted[a:b].sum()) for a, b in bounds],
+        'ciudad': [clean_str(x) for x in ciudad_f],
+    }
+    return Portfolio.from_columns(heads, counts.tolist(), frontiers)
+
+def build_nested_columnar(df: pd.DataFrame) -> list:
+    """build_portfolio materializado como la lista de registros anidados de siempre."""
+    return build_portfolio(df).to_records()
+
+BUILDERS = {
+    'loop': build_nested,
+    'columnar': build_nested_columnar,
+    'compact': build_portfolio,
+}
+
+def write_nested(out: list, out_path: str = OUT_NESTED, output_format: str = 'json',
+                 compression: str = None, json_backend: str = 'json') -> str:
+    """Escribe el anidado (ver src/export.py); devuelve la ruta final (.ndjson/.gz según el formato)."""
+    return write_records(out, output_path(out_path, output_format, compression), output_format,
+                         compression, json_backend)
+
+def _sort_key(opp):
+    # Orden de groupby(sort=True, dropna=False): llaves ordenadas, NaN al final
+    return (1, '') if pd.isna(opp) else (0, opp)
+
+def write_nested_stream(csv_path: str, engine: str = 'loop', parser: str = 'c', chunksize: int = 100_000,
+                        out_path: str = OUT_NESTED, output_format: str = 'json', compression: str = None,
+                        json_backend: str = 'json', con=None, stats: dict = None):
+    """
+    Anidado con memoria acotada: lee el CSV por bloques que cortan en el inicio de una
+    oportunidad (srcload.iter_opportunities), arma cada bloque con BUILDERS[engine] y deja
+    cada registro codificado en un archivo temporal; al final los copia a out_path en el
+    orden de build_nested. Mismos bytes que write_nested(BUILDERS[engine](df)).
+    Con `con` hace el upsert de cada bloque en SQLite. Devuelve la ruta escrita, o None si
+    una oportunidad aparece en filas no contiguas (en bloques distintos): en ese caso no
+    escribe el anidado y hay que usar la lectura completa.
+    `stats` recibe {'chunks', 'rows', 'opportunities', 'persisted'}.
+    """
+    backend = resolve_backend(json_backend)
+    offsets: dict = {}
+    chunks = rows = persisted = 0
+    with tempfile.TemporaryFile() as spool:
+        for df in iter_opportunities(csv_path, chunksize, usecols=OPPORTUNITY_PIPELINE_COLUMNS,
+                                     engine=parser, ffill_cols=ID_COLS):
+            chunks += 1
+            rows += len(df)
+            for rec in BUILDERS[engine](df):
+                opp = rec['oportunidad']
+                key = _sort_key(opp)
+                if key in offsets:
+                    return None
+                data = encode_record(rec, output_format, backend)
+                offsets[key] = (spool.tell(), len(data))
+                spool.write(data)
+            if con is not None:
+                persisted += upsert_opportunities(con, ffill_identity(df))
+
+        path = output_path(out_path, output_format, compression)
+        with RecordWriter(path, output_format, compression, backend) as w:
+            for key in sorted(offsets):
+                pos, size = offsets[key]
+                spool.seek(pos)
+                w.write_encoded(spool.read(size))
+    if stats is not None:
+        stats.update(chunks=chunks, rows=rows, opportunities=len(offsets), persisted=persisted)
+    return path
+
+def main(raw_csv_path: str, engine: str = 'loop', parser: str = 'c', chunksize: int = None,
+         workers: int = None, persist_db: str = None, columnar_dir: str = None,
+         metrics_path: str = RUN_METRICS_PATH, profile_dir: str = None,
+         output_format: str = 'json', compression: str = None, json_backend: str = 'json'):
+    csv_path = _normalize_path(raw_csv_path)
+    metrics = RunMetrics('run_opps_sql', metrics_path, profile_dir)
+
+    # 0) Por bloques (memoria acotada): un solo CSV y salida JSON anidada
+    if chunksize and os.path.isfile(csv_path) and not columnar_dir and parser != 'pyarrow':
+        stream: dict = {}
+        with metrics.stage('opps_stream') as st:
+            con = init_db(persist_db) if persist_db else None
+            try:
+                out_nested = write_nested_stream(csv_path, engine, parser, chunksize, OUT_NESTED, output_format,
+                                                 compression, json_backend, con=con, stats=stream)
+            finally:
+                if con is not None:
+                    con.close()
+            st.update(rows_in=stream.get('rows'), rows_out=stream.get('opportunities'),
+                      chunks=stream.get('chunks'), engine=engine, parser=parser, chunksize=chunksize)
+        if out_nested is not None:
+            if persist_db:
+                print(f"🗄️  {stream['persisted']} fronteras guardadas (upsert) en {persist_db}")
+            print(f"✅ Parte 1 lista: {out_nested} — 'nivel_de_tension' compuesto "
+                  f"({stream['chunks']} bloques de ~{chunksize} filas).")
+            print(f"📈 Métricas: {metrics.write()}")
+            return
+        print("🟡 Hay oportunidades en filas no contiguas del CSV: se usa la lectura completa")
+    elif chunksize:
+        print("🟡 --chunksize solo aplica a un CSV con salida JSON anidada y --parser c: se usa la lectura completa")
+
+    # 1) Cargar oportunidades (solo las columnas que se usan)
+    files: dict = {}
+    with metrics.stage('load_csv') as st:
+        df = load_opportunity_input(csv_path, parser=parser, workers=workers, stats=files)
+        st.update(rows_out=len(df), parser=parser, files=files['files'])
+    if files['files'] > 1:
+        metrics.count('opportunity_files', files)
+        print(f"🟢 {files['files']} CSV de oportunidades unidos: {files['rows']} filas"
+              f" ({files['duplicated_opportunities']} oportunidades repetidas descartadas,"
+              f" {files['duplicated_rows']} filas; {files['orphan_rows']} filas sin oportunidad al inicio"
+              f" de un archivo)")
+
+    with metrics.stage('build_nested') as st:
+        out = BUILDERS[engine](df)
+        st.update(rows_in=len(df), rows_out=len(out), engine=engine)
+    with metrics.stage('write_outputs') as st:
+        if columnar_dir:
+            write_opportunities(out, columnar_dir)
+        else:
+            out_nested = write_nested(out, OUT_NESTED, output_format, compression, json_backend)
+        st['rows_in'] = len(out)
+
+    if persist_db:
+        with metrics.stage('persist') as st:
+            con = init_db(persist_db)
+            n = upsert_opportunities(con, ffill_identity(df))
+            con.close()
+            st['rows_out'] = n
+        print(f"🗄️  {n} fronteras guardadas (upsert) en {persist_db}")
+
+    target = f"{columnar_dir} (Arrow)" if columnar_dir else out_nested
+    print(f"✅ Parte 1 lista: {target} — 'nivel_de_tension' compuesto.")
+    print(f"📈 Métricas: {metrics.write()}")
 
-    print("✅ Parte 1 lista: outputs/opportunities_curated_nested.json — 'nivel_de_tension' compuesto.")
+def parse_args():
+    p = argparse.ArgumentParser(description="Oportunidades CSV -> JSON anidado por oportunidad.")
+    p.add_argument("csv", nargs="?", default=None,
+                   help="CSV de oportunidades, o carpeta / patrón glob con varios (si no, se pregunta)")
+    p.add_argument("--engine", choices=BUILDERS, default="loop",
+                   help="Constructor: 'loop' (groupby + iterrows), 'columnar' (arreglos por columna) o "
+                        "'compact' (columnar sin dicts por frontera hasta la exportación)")
+    p.add_argument("--parser", choices=CSV_ENGINES, default="c",
+                   help="Motor de lectura del CSV: 'c' (pandas) o 'pyarrow' (requiere pyarrow)")
+    p.add_argument("--chunksize", type=int, default=None,
+                   help="Leer el CSV por bloques de ~N filas, cortando en el inicio de una oportunidad "
+                        "(memoria acotada en exportaciones grandes; no con --parser pyarrow ni --arrow)")
+    p.add_argument("--workers", type=int, default=None,
+                   help="Con varios CSV: procesos de lectura (por defecto uno por archivo, hasta el número de CPUs)")
+    p.add_argument("--persist", dest="persist_db", nargs="?", const=DEFAULT_DB_PATH, default=None,
+                   help=f"Guardar las fronteras en SQLite (upsert por oportunidad/frontera; por defecto {DEFAULT_DB_PATH})")
+    p.add_argument("--arrow", dest="columnar_dir", nargs="?", const=COLUMNAR_DIR, default=None,
+                   help=f"Escribir tablas Arrow (oportunidades + fronteras) en lugar del JSON anidado (por defecto {COLUMNAR_DIR})")
+    p.add_argument("--metrics", dest="metrics_path", default=RUN_METRICS_PATH,
+                   help=f"Archivo de métricas por etapa (por defecto {RUN_METRICS_PATH})")
+    p.add_argument("--profile", dest="profile_dir", nargs="?", const=PROFILE_DIR, default=None,
+                   help=f"Guardar volcados cProfile/tracemalloc por etapa (por defecto en {PROFILE_DIR})")
+    add_export_args(p)
+    return p.parse_args()
 
 if __name__ == '__main__':
-    raw = sys.argv[1] if len(sys.argv) > 1 else input('Ruta al CSV de oportunidades: ')
-    main(raw)
+    args = parse_args()
+    raw = args.csv if args.csv else input('Ruta al CSV de oportunidades (o carpeta / patrón glob): ')
+    main(raw, engine=args.engine, parser=args.parser, chunksize=args.chunksize, workers=args.workers,
+         persist_db=args.persist_db,
+         columnar_dir=args.columnar_dir, metrics_path=args.metrics_path, profile_dir=args.profile_dir,
+         output_format=args.output_format, compression=args.compression, json_backend=args.json_backend)
@@ -0,0 +1,301 @@
+# run_quote_server.py — Servicio local de cotización con el índice de tarifas en memoria
+"""
+Servidor HTTP (local) que carga una sola vez los mapeos, las tarifas preparadas del rango y
+el TariffIndex, y responde cotizaciones por oportunidad o por frontera con la misma lógica
+que run_tariff_analysis (motor 'vector') + run_summary (incluye payback, VPN y TIR).
+
+Un hilo de fondo revisa cada --reload-interval segundos si el snapshot de tarifas cambió
+(revalidando la caché contra el Lambda, o solo la caché con --offline) y, si cambió,
+prepara el índice nuevo y lo reemplaza sin cortar las consultas en curso.
+
+Endpoints:
+  GET  /health            estado, snapshot, meses, cotizaciones atendidas
+  POST /quote             oportunidad anidada (como opportunities_curated_nested.json),
+                          lista de ellas o {"oportunidades": [...]}; ?detalle=1 agrega el
+                          análisis por frontera y mes
+  POST /quote/frontier    frontera o lista de fronteras (+ "oportunidad" opcional)
+  POST /reload            fuerza la revisión del snapshot
+
+Uso:
+  python run_quote_server.py --from YYYY-MM --to YYYY-MM [cities_mapping.json] [providers_mapping.json]
+                             [--port 8780] [--offline] [--tariff-source SPEC] [--tariff-store [DIR]]
+                             [--reload-interval SEG]
+  curl -s localhost:8780/quote -d @oportunidad.json
+"""
+import argparse
+import http.server
+import json
+import threading
+import time
+from typing import Any, Dict, List, Optional, Tuple
+from urllib.parse import parse_qs, urlparse
+
+import run_tariff_analysis as rta
+import run_summary
+
+try:
+    from src.audit import NullSink
+    from src.compute import DEFAULT_DISCOUNT_RATE
+    from src.db import tariff_content_hash
+    from src.srcload import TARIFF_RESOURCE_ID, tariff_source_from_spec
+    from src.tariff_cache import TARIFF_CACHE_DIR, TARIFF_CACHE_TTL
+    from src.tariff_index import TariffIndex
+    from src.tariff_store import TARIFF_STORE_DIR
+except Exception:
+    from audit import NullSink
+    from compute import DEFAULT_DISCOUNT_RATE
+    from db import tariff_content_hash
+    from srcload import TARIFF_RESOURCE_ID, tariff_source_from_spec
+    from tariff_cache import TARIFF_CACHE_DIR, TARIFF_CACHE_TTL
+    from tariff_index import TariffIndex
+    from tariff_store import TARIFF_STORE_DIR
+
+DEFAULT_PORT = 8780
+RELOAD_INTERVAL = 300  # segundos
+MAX_BODY_BYTES = 8 << 20
+
+
+class QuoteService:
+    """
+    Mapeos + índice de tarifas del rango, listos para cotizar. El estado (índice, snapshot)
+    es inmutable y se reemplaza completo al recargar: cada consulta toma una referencia al
+    empezar y no ve cambios a mitad de camino.
+    """
+
+    def __init__(self, city_map: Dict[str, str], prov_map: Dict[str, str], from_month: str, to_month: str,
+                 offline: bool = False, tariff_source: Optional[str] = None,
+                 resource_ids: Optional[List[int]] = None, cache_dir: str = TARIFF_CACHE_DIR,
+                 tariff_store: Optional[str] = None, reload_interval: float = RELOAD_INTERVAL,
+                 discount_rate: float = DEFAULT_DISCOUNT_RATE):
+        self.city_map = city_map
+        self.prov_map = prov_map
+        self.from_month, self.to_month = from_month, to_month
+        self.offline = offline
+        self.tariff_source = tariff_source
+        self.resource_ids = resource_ids
+        self.cache_dir = cache_dir
+        self.tariff_store = tariff_store
+        self.reload_interval = float(reload_interval)
+        self.discount_rate = discount_rate
+        self.state: Optional[Dict[str, Any]] = None
+        self._reload_lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+        self._stats = {'quotes': 0, 'frontiers': 0, 'total_ms': 0.0, 'reloads': 0, 'reload_errors': 0}
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    # --------- Tarifas ---------
+    def _load_state(self) -> Optional[Dict[str, Any]]:
+        """Carga tarifas; si el snapshot es el mismo que el actual devuelve None (sin reconstruir)."""
+        info: Dict[str, Any] = {}
+        source = tariff_source_from_spec(self.tariff_source) if self.tariff_source else None
+        df_tariffs = rta.load_tariffs(offline=self.offline, cache_ttl=self.reload_interval or TARIFF_CACHE_TTL, cache_dir=self.cache_dir,
+                                      cache_info=info, source=source, resource_ids=self.resource_ids)
+        snapshot = info.get('sha256') or tariff_content_hash(df_tariffs)
+        if self.state is not None and self.state['snapshot'] == snapshot:
+            return None
+        t0 = time.perf_counter()
+        if self.tariff_store:
+            df_tar = rta.prepare_tariffs_stored(df_tariffs, self.prov_map, self.from_month, self.to_month,
+                                                self.tariff_store, snapshot=info.get('sha256'))
+        else:
+            df_tar = rta.prepare_tariffs(df_tariffs, self.prov_map, self.from_month, self.to_month)
+        index = TariffIndex.from_frame(df_tar)
+        return {'snapshot': snapshot, 'index': index, 'rows': int(len(df_tar)), 'loaded_at': time.time(),
+                'build_ms': round((time.perf_counter() - t0) * 1000, 1)}
+
+    def reload(self) -> bool:
+        """Revisa el snapshot y, si cambió, reemplaza el índice. True si hubo cambio."""
+        with self._reload_lock:
+            state = self._load_state()
+            if state is None:
+                return False
+            self.state = state
+        with self._stats_lock:
+            self._stats['reloads'] += 1
+        print(f"🟢 Tarifas cargadas: snapshot {state['snapshot'][:12]}, {state['rows']} filas, "
+              f"{len(state['index'].months)} meses ({state['build_ms']} ms)")
+        return True
+
+    def _reload_loop(self) -> None:
+        while not self._stop.wait(self.reload_interval):
+            try:
+                self.reload()
+            except Exception as e:  # se sigue atendiendo con el índice anterior
+                with self._stats_lock:
+                    self._stats['reload_errors'] += 1
+                print(f"🟡 No se pudo revisar el snapshot de tarifas ({e}); se mantiene el actual")
+
+    def start(self) -> 'QuoteService':
+        if self.state is None:
+            self.reload()
+        if self.reload_interval > 0 and self._thread is None:
+            self._thread = threading.Thread(target=self._reload_loop, name='recarga-tarifas', daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._stop.set()
+
+    # --------- Cotización ---------
+    def quote(self, opps: List[Dict[str, Any]], detalle: bool = False) -> Dict[str, Any]:
+        """Resumen por oportunidad (y opcionalmente el análisis por frontera) de `opps`."""
+        t0 = time.perf_counter()
+        state = self.state
+        salida, _ = rta.analizar_vectorizado(opps, None, self.city_map, self.prov_map,
+                                             index=state['index'], audit=NullSink())
+        resumen = run_summary.add_financials(run_summary.build_summary(opps, salida), self.discount_rate)
+        elapsed = (time.perf_counter() - t0) * 1000
+        with self._stats_lock:
+            self._stats['quotes'] += len(opps)
+            self._stats['frontiers'] += sum(len(reg.get('fronteras') or []) for reg in opps)
+            self._stats['total_ms'] += elapsed
+        out = {'snapshot': state['snapshot'], 'rango': {'from': self.from_month, 'to': self.to_month},
+               'resumen': resumen}
+        if detalle:
+            out['analisis'] = salida
+        out['elapsed_ms'] = round(elapsed, 3)
+        return out
+
+    def health(self) -> Dict[str, Any]:
+        state = self.state
+        with self._stats_lock:
+            stats = dict(self._stats)
+        n = stats.pop('quotes')
+        total_ms = stats.pop('total_ms')
+        return {'status': 'ok' if state else 'cargando',
+                'snapshot': state and state['snapshot'], 'rows': state and state['rows'],
+                'months': state and state['index'].months, 'loaded_at': state and state['loaded_at'],
+                'quotes': n, 'avg_ms': round(total_ms / n, 3) if n else None, **stats}
+
+
+# --------- Cuerpos de las consultas ---------
+def opportunities_from_body(body: Any) -> List[Dict[str, Any]]:
+    if isinstance(body, dict) and 'oportunidades' in body:
+        body = body['oportunidades']
+    opps = body if isinstance(body, list) else [body]
+    if not opps or not all(isinstance(reg, dict) for reg in opps):
+        raise ValueError('Se espera una oportunidad (objeto con "fronteras") o una lista de ellas.')
+    for i, reg in enumerate(opps):
+        if not isinstance(reg.get('fronteras', []), list):
+            raise ValueError(f'oportunidad {i + 1}: "fronteras" debe ser una lista.')
+        reg.setdefault('oportunidad', f'cotizacion-{i + 1}')
+    return opps
+
+
+def frontier_opportunity(body: Any) -> List[Dict[str, Any]]:
+    """Una o varias fronteras sueltas -> una oportunidad con esas fronteras."""
+    head: Dict[str, Any] = {}
+    if isinstance(body, dict) and 'fronteras' in body:
+        head = {k: v for k, v in body.items() if k != 'fronteras'}
+        body = body['fronteras']
+    fronteras = body if isinstance(body, list) else [body]
+    if not fronteras or not all(isinstance(f, dict) for f in fronteras):
+        raise ValueError('Se espera una frontera (objeto) o una lista de fronteras.')
+    return [{'oportunidad': head.pop('oportunidad', None) or 'cotizacion', **head, 'fronteras': fronteras}]
+
+
+# --------- HTTP ---------
+def _handler(service: QuoteService):
+    class Handler(http.server.BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+
+        def log_message(self, fmt, *args):  # sin una línea por consulta
+            pass
+
+        def _send(self, status: int, payload: Any) -> None:
+            data = json.dumps(payload, ensure_ascii=False).encode('utf-8')
+            self.send_response(status)
+            self.send_header('Content-Type', 'application/json; charset=utf-8')
+            self.send_header('Content-Length', str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def _body(self) -> Any:
+            size = int(self.headers.get('Content-Length') or 0)
+            if size > MAX_BODY_BYTES:
+                raise ValueError(f'Cuerpo demasiado grande ({size} bytes).')
+            return json.loads(self.rfile.read(size) or b'null')
+
+        def do_GET(self):
+            path = urlparse(self.path).path
+            if path == '/health':
+                self._send(200, service.health())
+            else:
+                self._send(404, {'error': f'ruta desconocida: {path}'})
+
+        def do_POST(self):
+            url = urlparse(self.path)
+            query = parse_qs(url.query)
+            detalle = query.get('detalle', ['0'])[0] not in ('0', '', 'false')
+            try:
+                if url.path == '/reload':
+                    self._send(200, {'changed': service.reload(), **service.health()})
+                    return
+                body = self._body()
+                if url.path == '/quote':
+                    self._send(200, service.quote(opportunities_from_body(body), detalle))
+                elif url.path == '/quote/frontier':
+                    self._send(200, service.quote(frontier_opportunity(body), detalle))
+                else:
+                    self._send(404, {'error': f'ruta desconocida: {url.path}'})
+            except (ValueError, json.JSONDecodeError) as e:
+                self._send(400, {'error': str(e)})
+            except Exception as e:
+                self._send(500, {'error': f'{type(e).__name__}: {e}'})
+
+    return Handler
+
+
+def make_server(service: QuoteService, host: str = '127.0.0.1',
+                port: int = DEFAULT_PORT) -> http.server.ThreadingHTTPServer:
+    """Servidor con un hilo por conexión; el índice es de solo lectura y se comparte."""
+    server = http.server.ThreadingHTTPServer((host, port), _handler(service))
+    server.daemon_threads = True
+    return server
+
+
+def parse_args():
+    p = argparse.ArgumentParser(description="Servicio local de cotización (índice de tarifas en memoria).")
+    p.add_argument("cities_map",  nargs="?", default=None)
+    p.add_argument("providers_map", nargs="?", default=None)
+    p.add_argument("--from", dest="from_month", required=True, help="Mes inicial (YYYY-MM)")
+    p.add_argument("--to",   dest="to_month",   required=True, help="Mes final (YYYY-MM)")
+    p.add_argument("--host", default="127.0.0.1", help="Interfaz donde escuchar (por defecto solo local)")
+    p.add_argument("--port", type=int, default=DEFAULT_PORT, help=f"Puerto HTTP (por defecto {DEFAULT_PORT})")
+    p.add_argument("--offline", action="store_true", help="Usar solo el snapshot de tarifas en caché (sin red)")
+    p.add_argument("--cache-dir", dest="cache_dir", default=TARIFF_CACHE_DIR, help="Carpeta de la caché de tarifas")
+    p.add_argument("--tariff-source", dest="tariff_source", default=None,
+                   help="Origen de las tarifas: URL del Lambda, CSV local o sqlite:RUTA[#snapshot]")
+    p.add_argument("--resource-ids", dest="resource_ids", type=int, nargs="+", default=[TARIFF_RESOURCE_ID],
+                   help=f"Recursos de tarifas a unir (por defecto {TARIFF_RESOURCE_ID})")
+    p.add_argument("--tariff-store", dest="tariff_store", nargs="?", const=TARIFF_STORE_DIR, default=None,
+                   help=f"Preparar las tarifas por mes en el almacén particionado (por defecto {TARIFF_STORE_DIR})")
+    p.add_argument("--reload-interval", dest="reload_interval", type=float, default=RELOAD_INTERVAL,
+                   help=f"Segundos entre revisiones del snapshot de tarifas (0 = nunca; por defecto {RELOAD_INTERVAL})")
+    p.add_argument("--discount-rate", dest="discount_rate", type=float, default=DEFAULT_DISCOUNT_RATE,
+                   help=f"Tasa de descuento anual efectiva para el VPN (por defecto {DEFAULT_DISCOUNT_RATE})")
+    return p.parse_args()
+
+
+def main():
+    args = parse_args()
+    service = QuoteService(
+        rta.load_mapping_json(args.cities_map, 'cities_mapping.json'),
+        rta.load_mapping_json(args.providers_map, 'providers_mapping.json'),
+        args.from_month, args.to_month, offline=args.offline, tariff_source=args.tariff_source,
+        resource_ids=args.resource_ids, cache_dir=args.cache_dir, tariff_store=args.tariff_store,
+        reload_interval=args.reload_interval, discount_rate=args.discount_rate).start()
+    server = make_server(service, args.host, args.port)
+    print(f"✅ Cotizador escuchando en http://{args.host}:{args.port} (rango {args.from_month}..{args.to_month})")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        service.stop()
+        server.server_close()
+
+
+if __name__ == '__main__':
+    main()
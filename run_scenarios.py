@@ -0,0 +1,216 @@
+# run_scenarios.py — Escenarios de precio BIA sobre el cruce de tarifas
+"""
+Evalúa N escenarios de precio BIA (descuentos, tarifas fijas por city/nivel, tablas
+alternativas; ver src/scenarios.py) en una sola pasada sobre la matriz frontera × mes,
+sin volver a correr el pipeline. El cruce con tarifas (llaves, tarifa actual y BIA) se
+resuelve una vez; cada escenario solo cambia la tarifa BIA.
+
+Salida (outputs/escenarios_bia.json): por escenario, el resumen por oportunidad con la
+misma forma que resumen_oportunidades.json y los totales de la cartera.
+
+Uso:
+  python run_scenarios.py --scenarios escenarios.json --from YYYY-MM --to YYYY-MM
+                          [path_nested_json] [cities_mapping.json] [providers_mapping.json]
+                          [--offline] [--tariff-source SPEC] [--index-dir DIR] [--arrow [DIR]]
+                          [--totals-only] [--out PATH]
+"""
+import os
+import argparse
+from typing import Any, Dict, List
+
+import numpy as np
+
+import run_tariff_analysis as rta
+from run_summary import _head, add_financials
+
+try:
+    from src.scenarios import load_scenarios, scenario_rates, aggregate_costs, round2
+    from src.srcload import tariff_source_from_spec
+    from src.tariff_index import TariffIndex
+    from src.columnar import read_opportunities, COLUMNAR_DIR, ANALYSIS_INPUT_FRONTIER_COLUMNS
+    from src.metrics import RunMetrics, RUN_METRICS_PATH
+    from src.compute import DEFAULT_DISCOUNT_RATE
+    from src.export import write_json, output_path, resolve_input, add_export_args
+    from src.frontiers import iter_heads
+except Exception:
+    from scenarios import load_scenarios, scenario_rates, aggregate_costs, round2
+    from srcload import tariff_source_from_spec
+    from tariff_index import TariffIndex
+    from columnar import read_opportunities, COLUMNAR_DIR, ANALYSIS_INPUT_FRONTIER_COLUMNS
+    from metrics import RunMetrics, RUN_METRICS_PATH
+    from compute import DEFAULT_DISCOUNT_RATE
+    from export import write_json, output_path, resolve_input, add_export_args
+    from frontiers import iter_heads
+
+OUT_SCENARIOS = os.path.join('outputs', 'escenarios_bia.json')
+
+
+def group_opportunities(opps: List[Dict[str, Any]], fr_opp: np.ndarray) -> Dict[str, Any]:
+    """
+    Oportunidades del resumen, como en build_summary: una por llave (las repetidas se suman),
+    las que tienen llave o alguna frontera, en orden de llave.
+    """
+    group_of: Dict[Any, int] = {}
+    heads: List[Dict[str, Any]] = []
+    opp_group: List[int] = []
+    for reg in iter_heads(opps):
+        k = reg.get('oportunidad')
+        if k not in group_of:
+            group_of[k] = len(heads)
+            heads.append({'oportunidad': k})
+        if k:
+            heads[group_of[k]] = _head(reg)
+        opp_group.append(group_of[k])
+    fr_group = np.asarray(opp_group, dtype=np.int64)[fr_opp]
+    with_frontiers = np.zeros(len(heads), dtype=bool)
+    with_frontiers[fr_group] = True
+    keys = list(group_of)
+    order = sorted((g for g, k in enumerate(keys) if k or with_frontiers[g]), key=lambda g: keys[g])
+    return {'heads': heads, 'fr_group': fr_group, 'with_frontiers': with_frontiers, 'order': order}
+
+
+def evaluate_scenarios(opps: List[Dict[str, Any]], df_tar, city_map: Dict[str, str], prov_map: Dict[str, str],
+                       scenarios: List[Dict[str, Any]], from_month: str, to_month: str,
+                       index: TariffIndex = None, totals_only: bool = False,
+                       discount_rate: float = DEFAULT_DISCOUNT_RATE) -> List[Dict[str, Any]]:
+    """
+    Resumen por oportunidad de cada escenario. Un escenario sin cambios ({"nombre": ...})
+    da los mismos números que run_summary sobre el análisis de las mismas tarifas (payback,
+    VPN y TIR incluidos, salvo con totals_only).
+    """
+    index = index if index is not None else TariffIndex.from_frame(df_tar)
+    meses = index.months
+    bia_tarifa_n = prov_map.get(rta.norm_text(rta.PROVIDER_BIA), rta.norm_text(rta.PROVIDER_BIA))
+
+    tabla = rta.frontier_table(opps, city_map, prov_map)
+    keys = tabla['keys']
+    t_act = rta.actual_rates(index, keys, rta.provider_matcher())['t_act']
+    t_bia = rta.bia_rates(index, keys, bia_tarifa_n)
+
+    # Tablas alternativas: mismas llaves y meses que el análisis
+    tables: Dict[str, np.ndarray] = {}
+    for spec in dict.fromkeys(sc['tarifas'] for sc in scenarios if sc.get('tarifas')):
+        df_alt = rta.prepare_tariffs(tariff_source_from_spec(spec).fetch(), prov_map, from_month, to_month)
+        tables[spec] = rta.bia_rates(TariffIndex.from_frame(df_alt), keys, bia_tarifa_n, months=meses)
+
+    grupos = group_opportunities(opps, tabla['fr_opp'])
+    n_groups = len(grupos['heads'])
+    args = (tabla['fr_key'], grupos['fr_group'], tabla['consumo'], tabla['consumo_ok'], n_groups)
+    actual = aggregate_costs(t_act[None], *args)
+    bia = aggregate_costs(scenario_rates(scenarios, t_bia, keys, city_map, tables), *args)
+
+    order = grupos['order']
+    seen = grupos['with_frontiers'][order] & (len(meses) > 0)
+
+    def monthly(agg, s):
+        vals = round2(agg['mensual'][s][order]).tolist()
+        has = agg['has'][s][order].tolist()
+        return [({m: (v if h else None) for m, v, h in zip(meses, vr, hr)} if ok else {})
+                for vr, hr, ok in zip(vals, has, seen.tolist())]
+
+    act_total = actual['total'][0][order]
+    act_mes = None if totals_only else monthly(actual, 0)
+    out: List[Dict[str, Any]] = []
+    for s, sc in enumerate(scenarios):
+        bia_total = bia['total'][s][order]
+        ahorro = act_total - bia_total
+        bia_mes = None if totals_only else monthly(bia, s)
+        t_act_r, t_bia_r, ahorro_r = (round2(x).tolist() for x in (act_total, bia_total, ahorro))
+        registros = []
+        for i, g in enumerate(order):
+            rec = dict(grupos['heads'][g])
+            if not totals_only:
+                rec["Costo actual total por mes"] = act_mes[i]
+                rec["Costo Bia total por mes"] = bia_mes[i]
+            rec["Costo total actual"] = t_act_r[i]
+            rec["Costo total Bia"] = t_bia_r[i]
+            rec["Ahorro Bia"] = ahorro_r[i]
+            registros.append(rec)
+        if not totals_only:
+            add_financials(registros, discount_rate)
+        out.append({
+            'nombre': sc['nombre'],
+            'definicion': sc,
+            'totales': {
+                'Costo total actual': round(float(act_total.sum()), 2),
+                'Costo total Bia': round(float(bia_total.sum()), 2),
+                'Ahorro Bia': round(float(ahorro.sum()), 2),
+            },
+            'oportunidades': registros,
+        })
+    return out
+
+
+def print_table(resultados: List[Dict[str, Any]]) -> None:
+    base = resultados[0]['totales']['Ahorro Bia']
+    print(f"\n  {'escenario':<28} {'Costo total Bia':>18} {'Ahorro Bia':>18} {'vs ' + resultados[0]['nombre'][:12]:>18}")
+    for r in resultados:
+        t = r['totales']
+        print(f"  {r['nombre'][:28]:<28} {t['Costo total Bia']:>18,.2f} {t['Ahorro Bia']:>18,.2f} "
+              f"{t['Ahorro Bia'] - base:>+18,.2f}")
+    print()
+
+
+def parse_args():
+    p = argparse.ArgumentParser(description="Escenarios de precio BIA sobre el cruce de tarifas.")
+    p.add_argument("nested_json", nargs="?", default=None,
+                   help=f"Anidado de run_opps_sql (por defecto la variante más reciente de {rta.NESTED_JSON})")
+    p.add_argument("cities_map",  nargs="?", default=None)
+    p.add_argument("providers_map", nargs="?", default=None)
+    p.add_argument("--scenarios", required=True, help="JSON con la lista de escenarios (ver src/scenarios.py)")
+    p.add_argument("--from", dest="from_month", required=True, help="Mes inicial (YYYY-MM)")
+    p.add_argument("--to",   dest="to_month",   required=True, help="Mes final (YYYY-MM)")
+    p.add_argument("--offline", action="store_true", help="Usar solo el snapshot de tarifas en caché (sin red)")
+    p.add_argument("--tariff-source", dest="tariff_source", default=None,
+                   help="Origen de las tarifas: URL del Lambda, CSV local o sqlite:RUTA[#snapshot]")
+    p.add_argument("--index-dir", dest="index_dir", default=None,
+                   help="Reutilizar/guardar el índice denso de tarifas en esta carpeta")
+    p.add_argument("--arrow", dest="columnar_dir", nargs="?", const=COLUMNAR_DIR, default=None,
+                   help=f"Leer las oportunidades de las tablas Arrow (por defecto {COLUMNAR_DIR})")
+    p.add_argument("--totals-only", dest="totals_only", action="store_true",
+                   help="Solo totales por oportunidad (sin los mapas por mes)")
+    p.add_argument("--discount-rate", dest="discount_rate", type=float, default=DEFAULT_DISCOUNT_RATE,
+                   help=f"Tasa de descuento anual efectiva para el VPN (por defecto {DEFAULT_DISCOUNT_RATE})")
+    p.add_argument("--out", default=OUT_SCENARIOS, help=f"Archivo de salida (por defecto {OUT_SCENARIOS})")
+    p.add_argument("--metrics", dest="metrics_path", default=RUN_METRICS_PATH,
+                   help=f"Archivo de métricas por etapa (por defecto {RUN_METRICS_PATH})")
+    add_export_args(p)
+    return p.parse_args()
+
+
+def main():
+    args = parse_args()
+    metrics = RunMetrics('run_scenarios', args.metrics_path)
+    scenarios = load_scenarios(args.scenarios)
+    city_map = rta.load_mapping_json(args.cities_map, 'cities_mapping.json')
+    prov_map = rta.load_mapping_json(args.providers_map, 'providers_mapping.json')
+
+    with metrics.stage('load_inputs') as st:
+        source = tariff_source_from_spec(args.tariff_source) if args.tariff_source else None
+        tariffs = rta.load_tariffs_async(offline=args.offline, source=source)
+        if args.columnar_dir:
+            opps = read_opportunities(args.columnar_dir, frontier_columns=ANALYSIS_INPUT_FRONTIER_COLUMNS)
+        else:
+            opps = rta.load_opps_nested(resolve_input(args.nested_json, rta.NESTED_JSON))
+        df_tar = rta.prepare_tariffs(tariffs.result(), prov_map, args.from_month, args.to_month)
+        index = TariffIndex.load_or_build(df_tar, args.index_dir)
+        st['rows_out'] = len(opps)
+
+    with metrics.stage('scenarios') as st:
+        resultados = evaluate_scenarios(opps, df_tar, city_map, prov_map, scenarios,
+                                        args.from_month, args.to_month, index=index,
+                                        totals_only=args.totals_only, discount_rate=args.discount_rate)
+        st.update(rows_in=len(opps), scenarios=len(scenarios))
+
+    with metrics.stage('write_outputs'):
+        out_path = write_json({'rango': {'from': args.from_month, 'to': args.to_month}, 'escenarios': resultados},
+                              output_path(args.out, args.output_format, args.compression),
+                              args.output_format, args.compression, args.json_backend)
+
+    print_table(resultados)
+    print(f'✅ Escenarios: {out_path} ({len(scenarios)} escenarios, {len(resultados[0]["oportunidades"])} oportunidades)')
+    print(f'📈 Métricas: {metrics.write()}')
+
+
+if __name__ == '__main__':
+    main()
@@ -22,48 +22,76 @@ Estructura por oportunidad:
   "Costo Bia total por mes":   { "YYYY-MM": float|null, ... },
   "Costo total actual": float,
   "Costo total Bia":   float,
-  "Ahorro Bia":        float
+  "Ahorro Bia":        float,
+  "Ahorro acumulado por mes": { "YYYY-MM": float, ... },
+  "Payback meses": int|null,        (primer mes en que el acumulado alcanza inversion_cliente)
+  "Mes de payback": "YYYY-MM"|null,
+  "VPN ahorro": float,              (-inversion_cliente + ahorros descontados, --discount-rate)
+  "TIR anual": float|null
 }
+El ahorro de cada mes es costo actual - costo Bia (un lado sin dato cuenta como 0, igual
+que en los totales).
 """
 
 import os
 import json
-from typing import Any, Dict, List, Optional
+import argparse
+import tempfile
+from itertools import zip_longest
+from typing import Any, Callable, Dict, List, Optional, Tuple
 from collections import defaultdict
 
+import numpy as np
+
+try:
+    from src.compute import portfolio_financials, DEFAULT_DISCOUNT_RATE
+    from src.db import DEFAULT_DB_PATH
+    from src.incremental import AnalysisCache, cacheable_keys, file_signature
+    from src.export import (RecordWriter, encode_record, write_records, load_json,
+                            iter_records, resolve_input, output_path, resolve_backend, add_export_args)
+    from src.columnar import read_table, COLUMNAR_DIR, OPPORTUNITIES_FILE, ANALYSIS_MONTHS_FILE
+    from src.metrics import RunMetrics, RUN_METRICS_PATH, PROFILE_DIR
+    from src.frontiers import iter_heads
+except Exception:
+    from compute import portfolio_financials, DEFAULT_DISCOUNT_RATE
+    from db import DEFAULT_DB_PATH
+    from incremental import AnalysisCache, cacheable_keys, file_signature
+    from export import (RecordWriter, encode_record, write_records, load_json,
+                        iter_records, resolve_input, output_path, resolve_backend, add_export_args)
+    from columnar import read_table, COLUMNAR_DIR, OPPORTUNITIES_FILE, ANALYSIS_MONTHS_FILE
+    from metrics import RunMetrics, RUN_METRICS_PATH, PROFILE_DIR
+    from frontiers import iter_heads
+
+OPPS_JSON = os.path.join("outputs", "opportunities_curated_nested.json")
+ANALISIS_JSON = os.path.join("outputs", "analisis_tarifas_por_frontera.json")
+
 def r2(x: Optional[float]) -> Optional[float]:
     return None if x is None else round(float(x), 2)
 
-def load_json(path: str) -> Any:
-    with open(path, "r", encoding="utf-8") as f:
-        return json.load(f)
+def _head(reg: Dict[str, Any]) -> Dict[str, Any]:
+    return {
+        "oportunidad": reg.get("oportunidad"),
+        "cliente": reg.get("cliente"),
+        "inversion_cliente": reg.get("inversion_cliente"),
+        "tarifa_b": reg.get("tarifa_b"),
+        "opex": reg.get("opex"),
+        "capex": reg.get("capex"),
+        "consumo_total": reg.get("consumo_total"),
+        "total_renting": reg.get("total_renting"),
+        "ciudad": reg.get("ciudad"),
+    }
 
-def main(
-    opps_path: str = os.path.join("outputs", "opportunities_curated_nested.json"),
-    analisis_path: str = os.path.join("outputs", "analisis_tarifas_por_frontera.json"),
-    out_path: str = os.path.join("outputs", "resumen_oportunidades.json")
-):
-    # 1) Cargar cabeceras/valores únicos por oportunidad
-    opps = load_json(opps_path)  # lista
+def build_summary(opps: List[Dict[str, Any]], analisis: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Cabeceras de oportunidades + análisis por frontera -> resumen por oportunidad."""
+    # 1) Cabeceras/valores únicos por oportunidad
     head_by_opp: Dict[str, Dict[str, Any]] = {}
-    for reg in opps:
+    for reg in iter_heads(opps):
         opp = reg.get("oportunidad")
         if not opp:
             continue
-        head_by_opp[opp] = {
-            "oportunidad": opp,
-            "cliente": reg.get("cliente"),
-            "inversion_cliente": reg.get("inversion_cliente"),
-            "tarifa_b": reg.get("tarifa_b"),
-            "opex": reg.get("opex"),
-            "capex": reg.get("capex"),
-            "consumo_total": reg.get("consumo_total"),
-            "total_renting": reg.get("total_renting"),
-            "ciudad": reg.get("ciudad"),
-        }
-
-    # 2) Cargar análisis por frontera y agregar por oportunidad/mes
-    analisis = load_json(analisis_path)  # lista
+        head_by_opp[opp] = _head(reg)
+
+    # 2) Agregar análisis por frontera por oportunidad/mes
     # Estructuras acumuladoras
     monthly_actual_by_opp: Dict[str, Dict[str, float]] = defaultdict(lambda: defaultdict(float))
     monthly_bia_by_opp: Dict[str, Dict[str, float]] = defaultdict(lambda: defaultdict(float))
@@ -122,10 +150,349 @@ def main(
             "Ahorro Bia": r2(ahorro_bia)
         })
 
-    os.makedirs(os.path.dirname(out_path), exist_ok=True)
-    with open(out_path, "w", encoding="utf-8") as f:
-        json.dump(out, f, ensure_ascii=False, indent=2)
+    return out
+
+def _number(x: Any) -> float:
+    return float(x) if isinstance(x, (int, float)) and not isinstance(x, bool) else np.nan
+
+def month_offsets(meses: List[str]) -> List[int]:
+    """
+    Columna de cada mes ('YYYY-MM') contada desde el primero del registro: un mes sin datos
+    en medio deja su columna en cero. Si algún mes no tiene esa forma, las posiciones 0..n-1.
+    """
+    try:
+        nums = [int(m[:4]) * 12 + int(m[5:7]) for m in meses]
+    except (TypeError, ValueError):
+        return list(range(len(meses)))
+    first = min(nums, default=0)
+    return [n - first for n in nums]
+
+def add_financials(out: List[Dict[str, Any]], discount_rate: float = DEFAULT_DISCOUNT_RATE) -> List[Dict[str, Any]]:
+    """
+    Completa cada registro del resumen con ahorro acumulado, payback, VPN y TIR, calculados
+    para toda la cartera a la vez (compute.portfolio_financials). Cada ahorro va en la columna
+    de su mes contado desde el primer mes de la oportunidad (month_offsets): un mes faltante
+    sigue contando para el payback y el descuento. El resultado de un registro no depende de
+    los demás (el modo streaming lo llama de a uno).
+    """
+    if not out:
+        return out
+    meses = [list(rec["Costo actual total por mes"]) for rec in out]
+    offsets = [month_offsets(ms) for ms in meses]
+    width = max((max(o, default=-1) + 1 for o in offsets), default=0)
+    savings = np.zeros((len(out), width))
+    for i, (rec, ms) in enumerate(zip(out, meses)):
+        act, bia = rec["Costo actual total por mes"], rec["Costo Bia total por mes"]
+        savings[i, offsets[i]] = [(act[m] or 0.0) - (bia.get(m) or 0.0) for m in ms]
+    inversion = np.fromiter((_number(rec.get("inversion_cliente")) for rec in out), dtype=np.float64, count=len(out))
+    fin = portfolio_financials(inversion, savings, discount_rate)
+
+    acumulado = fin["acumulado"].tolist()
+    payback = fin["payback"].tolist()
+    vpn = fin["vpn"].tolist()
+    tir = fin["tir"].tolist()
+    for i, (rec, ms) in enumerate(zip(out, meses)):
+        p = payback[i]
+        col = dict(zip(offsets[i], ms))
+        rec["Ahorro acumulado por mes"] = {m: r2(acumulado[i][o]) for m, o in zip(ms, offsets[i])}
+        rec["Payback meses"] = p or None
+        rec["Mes de payback"] = col.get(p - 1) if p else None
+        rec["VPN ahorro"] = r2(vpn[i])
+        rec["TIR anual"] = round(tir[i], 4) if np.isfinite(tir[i]) else None
+    return out
+
+def build_summary_incremental(opps: List[Dict[str, Any]], load_analisis: Callable[[], List[Dict[str, Any]]],
+                              cache: AnalysisCache) -> Tuple[List[Dict[str, Any]], Dict[str, int]]:
+    """
+    Igual que build_summary, reutilizando el resumen guardado de cada oportunidad cuyo análisis
+    no cambió en la última corrida incremental (analysis_cache). `load_analisis` solo se llama
+    si hay alguna oportunidad por recalcular.
+    Requiere que el análisis provenga de esa corrida (ver incremental_inputs_ok).
+    """
+    if not cacheable_keys(opps):
+        out = build_summary(opps, load_analisis())
+        return out, {'total': len(out), 'reutilizadas': 0, 'recalculadas': len(out)}
+
+    rows = cache.fetch(reg['oportunidad'] for reg in opps)
+    by_opp: Dict[str, Dict[str, Any]] = {}
+    todo: List[Dict[str, Any]] = []
+    for reg in opps:
+        row = rows.get(reg['oportunidad'])
+        if row is not None and row[3] is not None and row[2] == row[0]:
+            by_opp[reg['oportunidad']] = json.loads(row[3])
+        else:
+            todo.append(reg)
+
+    if todo:
+        keys = {reg['oportunidad'] for reg in todo}
+        analisis = [a for a in load_analisis() if a.get('oportunidad') in keys]
+        nuevos = build_summary(todo, analisis)
+        cache.store_summary([(rec['oportunidad'], rec) for rec in nuevos])
+        for rec in nuevos:
+            by_opp[rec['oportunidad']] = rec
+
+    out = [by_opp[k] for k in sorted(by_opp)]
+    return out, {'total': len(out), 'reutilizadas': len(out) - len(todo), 'recalculadas': len(todo)}
+
+# --------- Modo streaming (memoria acotada) ---------
+def summarize_opportunity(reg: Dict[str, Any], analisis_reg: Dict[str, Any],
+                          month_ids: Dict[str, int]) -> Dict[str, Any]:
+    """
+    Registro de build_summary para una sola oportunidad. Los costos se acumulan en arreglos
+    indexados por mes (month_ids es el vocabulario de meses compartido entre oportunidades);
+    has_* marca los meses con algún valor numérico para conservar None vs 0.0, y orden_*
+    el orden en que aparecieron, para sumar los totales igual que build_summary.
+    """
+    n = len(month_ids)
+    act, bia = [0.0] * n, [0.0] * n
+    seen, has_act, has_bia = bytearray(n), bytearray(n), bytearray(n)
+    orden_act: List[int] = []
+    orden_bia: List[int] = []
+    for fr in analisis_reg.get("fronteras", []):
+        for row in fr.get("analisis_mensual", []):
+            mes = row.get("mes")
+            j = month_ids.setdefault(mes, len(month_ids))
+            if j >= len(seen):
+                grow = len(month_ids) - len(seen)
+                act += [0.0] * grow
+                bia += [0.0] * grow
+                seen += bytearray(grow)
+                has_act += bytearray(grow)
+                has_bia += bytearray(grow)
+            seen[j] = 1
+            ca = row.get("costo_actual")
+            cb = row.get("costo_bia")
+            if isinstance(ca, (int, float)):
+                if not has_act[j]:
+                    has_act[j] = 1
+                    orden_act.append(j)
+                act[j] += float(ca)
+            if isinstance(cb, (int, float)):
+                if not has_bia[j]:
+                    has_bia[j] = 1
+                    orden_bia.append(j)
+                bia[j] += float(cb)
+
+    meses = sorted(m for m, j in month_ids.items() if j < len(seen) and seen[j])
+    total_actual = sum(act[j] for j in orden_act) if orden_act else 0.0
+    total_bia    = sum(bia[j] for j in orden_bia) if orden_bia else 0.0
+    return {
+        **_head(reg),
+        "Costo actual total por mes": {m: r2(act[month_ids[m]]) if has_act[month_ids[m]] else None for m in meses},
+        "Costo Bia total por mes": {m: r2(bia[month_ids[m]]) if has_bia[month_ids[m]] else None for m in meses},
+        "Costo total actual": r2(total_actual),
+        "Costo total Bia": r2(total_bia),
+        "Ahorro Bia": r2(total_actual - total_bia)
+    }
+
+def write_summary_stream(opps_path: str, analisis_path: str, out_path: str,
+                         discount_rate: Optional[float] = None, output_format: str = "json",
+                         compression: Optional[str] = None, json_backend: str = "json") -> Optional[int]:
+    """
+    Resumen sin cargar los JSON completos: recorre el anidado y el análisis en paralelo
+    (run_tariff_analysis deja un registro por oportunidad, en el mismo orden) y emite cada
+    resumen apenas se consume su oportunidad, a un archivo temporal. Al final se copia a
+    out_path en el orden de build_summary (por oportunidad); en memoria solo queda la
+    posición de cada registro. Mismos bytes que write_summary(build_summary(...)).
+    Devuelve la cantidad de oportunidades, o None si los archivos no están alineados
+    (oportunidades vacías, repetidas o en otro orden): en ese caso no escribe nada.
+    Con discount_rate se agregan las métricas financieras (add_financials) registro a registro.
+    Entradas y salida en cualquier formato de src/export.py (out_path ya con su extensión).
+    """
+    month_ids: Dict[str, int] = {}
+    offsets: Dict[str, Tuple[int, int]] = {}
+    backend = resolve_backend(json_backend)
+    with tempfile.TemporaryFile() as spool:
+        pairs = zip_longest(iter_records(opps_path), iter_records(analisis_path))
+        for reg, analisis_reg in pairs:
+            opp = reg.get("oportunidad") if reg is not None else None
+            if (not opp or not isinstance(opp, str) or opp in offsets
+                    or analisis_reg is None or analisis_reg.get("oportunidad") != opp):
+                return None
+            rec = summarize_opportunity(reg, analisis_reg, month_ids)
+            if discount_rate is not None:
+                add_financials([rec], discount_rate)
+            data = encode_record(rec, output_format, backend)
+            offsets[opp] = (spool.tell(), len(data))
+            spool.write(data)
+
+        with RecordWriter(out_path, output_format, compression, backend) as w:
+            for opp in sorted(offsets):
+                pos, size = offsets[opp]
+                spool.seek(pos)
+                w.write_encoded(spool.read(size))
+    return len(offsets)
+
+# --------- Desde el formato columnar ---------
+def build_summary_columnar(columnar_dir: str = COLUMNAR_DIR) -> List[Dict[str, Any]]:
+    """
+    Mismo resultado que build_summary, leyendo de las tablas Arrow solo la cabecera y
+    (opp_id, mes, costo_actual, costo_bia) de analysis_months. Las sumas por oportunidad/mes
+    se hacen con np.add.at, que acumula en el orden de las filas (igual que el bucle), y los
+    totales suman los meses en el orden en que apareció su primer valor.
+    """
+    head_cols = ["oportunidad", "cliente", "inversion_cliente", "tarifa_b", "opex", "capex",
+                 "consumo_total", "total_renting", "ciudad"]
+    head = read_table(columnar_dir, OPPORTUNITIES_FILE, head_cols).to_pydict()
+    names = head["oportunidad"]
+    head_by_opp: Dict[str, Dict[str, Any]] = {}
+    for i, opp in enumerate(names):
+        if opp:
+            head_by_opp[opp] = {c: head[c][i] for c in head_cols}
+
+    t = read_table(columnar_dir, ANALYSIS_MONTHS_FILE, ["opp_id", "mes", "costo_actual", "costo_bia"])
+    opp_id = t.column("opp_id").to_numpy()
+    mes_list = t.column("mes").to_pylist()
+
+    # Llave = nombre de la oportunidad (como build_summary), mes codificado
+    key_of_opp: Dict[Any, int] = {}
+    opp_key = np.fromiter((key_of_opp.setdefault(o, len(key_of_opp)) for o in names),
+                          dtype=np.int64, count=len(names))
+    key_vals = list(key_of_opp)
+    mes_of: Dict[Any, int] = {}
+    mes_code = np.fromiter((mes_of.setdefault(m, len(mes_of)) for m in mes_list), dtype=np.int64, count=len(mes_list))
+    mes_vals = list(mes_of)
+    n_mes = max(len(mes_vals), 1)
+    pair = opp_key[opp_id] * n_mes + mes_code
+
+    def monthly(col: str):
+        arr = t.column(col)
+        ok = arr.is_valid().to_numpy(zero_copy_only=False)
+        vals = arr.fill_null(0.0).to_numpy()[ok]
+        pairs, first, inv = np.unique(pair[ok], return_index=True, return_inverse=True)
+        sums = np.zeros(len(pairs))
+        np.add.at(sums, inv.ravel(), vals)
+        # totales por llave, sumando meses en orden de primera aparición
+        order = np.argsort(first, kind="stable")
+        totals = np.zeros(len(key_vals))
+        np.add.at(totals, pairs[order] // n_mes, sums[order])
+        has_total = np.zeros(len(key_vals), dtype=bool)
+        has_total[pairs // n_mes] = True
+        return dict(zip(pairs.tolist(), sums.tolist())), totals.tolist(), has_total.tolist()
+
+    act, tot_act, has_act = monthly("costo_actual")
+    bia, tot_bia, has_bia = monthly("costo_bia")
+    seen_pairs = np.unique(pair)
+    meses_by_key: Dict[int, List[str]] = defaultdict(list)
+    for p in seen_pairs.tolist():
+        meses_by_key[p // n_mes].append(mes_vals[p % n_mes])
+
+    out: List[Dict[str, Any]] = []
+    for opp in sorted({key_vals[k] for k in meses_by_key} | head_by_opp.keys()):
+        k = key_of_opp[opp]
+        meses = sorted(meses_by_key.get(k, []))
+        codes = [k * n_mes + mes_of[m] for m in meses]
+        total_actual = tot_act[k] if has_act[k] else 0.0
+        total_bia    = tot_bia[k] if has_bia[k] else 0.0
+        out.append({
+            **head_by_opp.get(opp, {"oportunidad": opp}),
+            "Costo actual total por mes": {m: r2(act[c]) if c in act else None for m, c in zip(meses, codes)},
+            "Costo Bia total por mes": {m: r2(bia[c]) if c in bia else None for m, c in zip(meses, codes)},
+            "Costo total actual": r2(total_actual),
+            "Costo total Bia": r2(total_bia),
+            "Ahorro Bia": r2(total_actual - total_bia)
+        })
+    return out
+
+def incremental_inputs_ok(opps_path: str, analisis_path: str, cache: AnalysisCache) -> bool:
+    """¿Son estos archivos los que dejó la última corrida de run_tariff_analysis --incremental?"""
+    return (file_signature(opps_path) == cache.get_meta('nested_signature')
+            and file_signature(analisis_path) == cache.get_meta('analysis_signature'))
+
+def write_summary(out: List[Dict[str, Any]], out_path: str, output_format: str = "json",
+                  compression: Optional[str] = None, json_backend: str = "json") -> str:
+    """Escribe el resumen vía src/export.py; devuelve la ruta final (.ndjson/.gz según el formato)."""
+    return write_records(out, output_path(out_path, output_format, compression), output_format,
+                         compression, json_backend)
+
+def main(
+    opps_path: Optional[str] = None,
+    analisis_path: Optional[str] = None,
+    out_path: str = os.path.join("outputs", "resumen_oportunidades.json"),
+    incremental_db: Optional[str] = None,
+    stream: bool = False,
+    columnar_dir: Optional[str] = None,
+    metrics_path: str = RUN_METRICS_PATH,
+    profile_dir: Optional[str] = None,
+    discount_rate: float = DEFAULT_DISCOUNT_RATE,
+    output_format: str = "json",
+    compression: Optional[str] = None,
+    json_backend: str = "json"
+):
+    metrics = RunMetrics('run_summary', metrics_path, profile_dir)
+    export = (output_format, compression, json_backend)
+    # Sin ruta explícita: la variante más reciente (.json, .ndjson, .gz, ...) de cada salida
+    opps_path = resolve_input(opps_path, OPPS_JSON)
+    analisis_path = resolve_input(analisis_path, ANALISIS_JSON)
+    out_path = output_path(out_path, output_format, compression)
+    if columnar_dir:
+        with metrics.stage('summary') as st:
+            out = add_financials(build_summary_columnar(columnar_dir), discount_rate)
+            st.update(rows_out=len(out), mode='arrow')
+        with metrics.stage('write_outputs') as st:
+            write_summary(out, out_path, *export)
+            st['rows_in'] = len(out)
+        print(f"✅ Resumen listo: {out_path} (desde {columnar_dir})")
+        print(f"📈 Métricas: {metrics.write()}")
+        return
+    if stream and not incremental_db:
+        with metrics.stage('summary_stream') as st:
+            n = write_summary_stream(opps_path, analisis_path, out_path, discount_rate, *export)
+            st.update(rows_out=n, mode='stream')
+        if n is not None:
+            print(f"✅ Resumen listo: {out_path} ({n} oportunidades, streaming)")
+            print(f"📈 Métricas: {metrics.write()}")
+            return
+        print("🟡 El anidado y el análisis no están alineados por oportunidad: se usa el modo en memoria")
+    with metrics.stage('load_inputs') as st:
+        opps = load_json(opps_path)          # lista
+        st['rows_out'] = len(opps)
+    with metrics.stage('summary') as st:
+        if incremental_db:
+            with AnalysisCache(incremental_db) as cache:
+                if incremental_inputs_ok(opps_path, analisis_path, cache):
+                    out, stats = build_summary_incremental(opps, lambda: load_json(analisis_path), cache)
+                else:
+                    print("🟡 El análisis no viene de la última corrida incremental: se recalcula todo el resumen")
+                    out = build_summary(opps, load_json(analisis_path))
+                    stats = {'total': len(out), 'reutilizadas': 0, 'recalculadas': len(out)}
+            metrics.count('incremental', stats)
+        else:
+            analisis = load_json(analisis_path)  # lista
+            out = build_summary(opps, analisis)
+        add_financials(out, discount_rate)
+        st.update(rows_in=len(opps), rows_out=len(out), mode='incremental' if incremental_db else 'memory')
+    with metrics.stage('write_outputs') as st:
+        write_summary(out, out_path, *export)
+        st['rows_in'] = len(out)
     print(f"✅ Resumen listo: {out_path}")
+    if incremental_db:
+        print(f"♻️  Incremental: {stats['recalculadas']} recalculadas, "
+              f"{stats['reutilizadas']} reutilizadas de {stats['total']} oportunidades")
+    print(f"📈 Métricas: {metrics.write()}")
+
+def parse_args():
+    p = argparse.ArgumentParser(description="Resumen por oportunidad.")
+    # run.py pasa el rango de meses; el análisis ya viene filtrado, así que aquí no se usa
+    p.add_argument("--from", dest="from_month", default=None, help=argparse.SUPPRESS)
+    p.add_argument("--to",   dest="to_month",   default=None, help=argparse.SUPPRESS)
+    p.add_argument("--incremental", dest="incremental_db", nargs="?", const=DEFAULT_DB_PATH, default=None,
+                   help=f"Reutilizar el resumen de las oportunidades sin cambios (tabla analysis_cache, por defecto {DEFAULT_DB_PATH})")
+    p.add_argument("--stream", action="store_true",
+                   help="Leer el anidado y el análisis por partes, con memoria acotada (se ignora con --incremental)")
+    p.add_argument("--arrow", dest="columnar_dir", nargs="?", const=COLUMNAR_DIR, default=None,
+                   help=f"Leer las tablas Arrow de run_tariff_analysis --arrow en lugar de los JSON (por defecto {COLUMNAR_DIR})")
+    p.add_argument("--discount-rate", dest="discount_rate", type=float, default=DEFAULT_DISCOUNT_RATE,
+                   help=f"Tasa de descuento anual efectiva para el VPN (por defecto {DEFAULT_DISCOUNT_RATE})")
+    p.add_argument("--metrics", dest="metrics_path", default=RUN_METRICS_PATH,
+                   help=f"Archivo de métricas por etapa (por defecto {RUN_METRICS_PATH})")
+    p.add_argument("--profile", dest="profile_dir", nargs="?", const=PROFILE_DIR, default=None,
+                   help=f"Guardar volcados cProfile/tracemalloc por etapa (por defecto en {PROFILE_DIR})")
+    add_export_args(p)
+    return p.parse_args()
 
 if __name__ == "__main__":
-    main()
+    args = parse_args()
+    main(incremental_db=args.incremental_db, stream=args.stream, columnar_dir=args.columnar_dir,
+         metrics_path=args.metrics_path, profile_dir=args.profile_dir, discount_rate=args.discount_rate,
+         output_format=args.output_format, compression=args.compression, json_backend=args.json_backend)
@@ -3,80 +3,62 @@
 Uso:
   python run_tariff_analysis.py [path_nested_json] [cities_mapping.json] [providers_mapping.json]
                                 --from YYYY-MM --to YYYY-MM
+                                [--offline] [--no-cache] [--cache-ttl SEG] [--cache-dir DIR]
+                                [--tariff-source URL|CSV|sqlite:DB[#id]] [--resource-ids ID [ID ...]]
+                                [--incremental [DB]] [--workers N] [--arrow [DIR]] [--compact-model]
 """
 import os
 import sys
 import json
 import argparse
-import unicodedata
-from typing import Any, Dict, List, Tuple, Optional
+import itertools
+import pickle
+import time
+import tempfile
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Any, Dict, List, Sequence, Tuple, Optional
 
+import numpy as np
 import pandas as pd
 
 # --------- Carga de tarifas ----------
 try:
-    from src.srcload import fetch_tariffs, LAMBDA_URL, TARIFF_RESOURCE_ID
+    from src.srcload import LAMBDA_URL, TARIFF_RESOURCE_ID, TariffSource, HttpTariffSource, tariff_source_from_spec, merge_tariff_frames
+    from src.tariff_cache import fetch_tariffs_cached, describe_cache_info, TARIFF_CACHE_DIR, TARIFF_CACHE_TTL
+    from src.tariff_index import TariffIndex
+    from src.tariff_store import TariffStore, store_signature, TARIFF_STORE_DIR
+    from src.provider_match import ProviderMatcher, matches_from_scores
+    from src.audit import AuditSink, ListSink, NullSink, open_audit_sink, AUDIT_FORMATS, AUDIT_LEVELS
+    from src.db import init_db, save_tariff_snapshot, tariff_content_hash, DEFAULT_DB_PATH
+    from src.incremental import AnalysisCache, cacheable_keys, context_hash, split_cached, file_signature
+    from src.columnar import read_opportunities, write_analysis, COLUMNAR_DIR, ANALYSIS_INPUT_FRONTIER_COLUMNS
+    from src.metrics import RunMetrics, RUN_METRICS_PATH, PROFILE_DIR
+    from src.export import load_json, iter_records, resolve_input, write_records, output_path, add_export_args
+    from src.frontiers import Portfolio, AnalysisTable, is_nested_record
+    from src.scenarios import round2
+    from src.textnorm import (norm_text, clean_space, canonical_simple, canonical_comp_from_tokens,
+                              provider_tokens, map_distinct)
 except Exception:
-    from srcload import fetch_tariffs, LAMBDA_URL, TARIFF_RESOURCE_ID
+    from srcload import LAMBDA_URL, TARIFF_RESOURCE_ID, TariffSource, HttpTariffSource, tariff_source_from_spec, merge_tariff_frames
+    from tariff_cache import fetch_tariffs_cached, describe_cache_info, TARIFF_CACHE_DIR, TARIFF_CACHE_TTL
+    from tariff_index import TariffIndex
+    from tariff_store import TariffStore, store_signature, TARIFF_STORE_DIR
+    from provider_match import ProviderMatcher, matches_from_scores
+    from audit import AuditSink, ListSink, NullSink, open_audit_sink, AUDIT_FORMATS, AUDIT_LEVELS
+    from db import init_db, save_tariff_snapshot, tariff_content_hash, DEFAULT_DB_PATH
+    from incremental import AnalysisCache, cacheable_keys, context_hash, split_cached, file_signature
+    from columnar import read_opportunities, write_analysis, COLUMNAR_DIR, ANALYSIS_INPUT_FRONTIER_COLUMNS
+    from metrics import RunMetrics, RUN_METRICS_PATH, PROFILE_DIR
+    from export import load_json, iter_records, resolve_input, write_records, output_path, add_export_args
+    from frontiers import Portfolio, AnalysisTable, is_nested_record
+    from scenarios import round2
+    from textnorm import (norm_text, clean_space, canonical_simple, canonical_comp_from_tokens,
+                          provider_tokens, map_distinct)
 
 PROVIDER_BIA = "BIA ENERGY"
+PROVIDER_MATCH_THRESHOLD = 0.45  # Jaccard mínimo para aceptar un provider por tokens
 
 # --------- Helpers ---------
-def norm_text(s: Any) -> str:
-    if s is None:
-        return ''
-    s = str(s).strip().upper()
-    s = ''.join(c for c in unicodedata.normalize('NFKD', s) if not unicodedata.combining(c))
-    s = ' '.join(s.split())
-    return s
-
-def clean_space(s: Any) -> str:
-    return ' '.join(str(s or '').split())
-
-def canonical_simple(n: Any) -> Optional[str]:
-    """Devuelve 'NIVEL 1/2/3' si encuentra dígito, si no None."""
-    nrm = norm_text(n)
-    if '1' in nrm: return 'NIVEL 1'
-    if '2' in nrm: return 'NIVEL 2'
-    if '3' in nrm: return 'NIVEL 3'
-    for ch in nrm:
-        if ch.isdigit() and ch in '123':
-            return f'NIVEL {ch}'
-    return None
-
-def canonical_comp_from_tokens(txt: str) -> Optional[str]:
-    """
-    Intenta construir nivel_{d}_{kind} a partir de texto (tarifas o calculadora).
-    Acepta variantes: NIVEL 1 OPERADOR, NIVEL_1_USER, BT1 USUARIO, etc.
-    """
-    t = norm_text(txt).replace('-', ' ').replace('/', ' ').replace('.', ' ').replace('_', ' ')
-    toks = t.split()
-    # detectar dígito
-    dig = None
-    for d in ('1','2','3'):
-        if d in toks or f'NIVEL{d}' in toks or f'BT{d}' in toks or d in ''.join(toks):
-            dig = d
-            break
-    if not dig:
-        # también si viene como 'NIVEL 1 USER' -> buscar 'NIVEL' y el token siguiente numérico
-        for i, w in enumerate(toks[:-1]):
-            if 'NIVEL' in w and toks[i+1] in ('1','2','3'):
-                dig = toks[i+1]; break
-    if not dig:
-        return None
-
-    # detectar tipo
-    kind = None
-    joined = ' '.join(toks)
-    if 'OPERADOR' in joined or 'OPERATOR' in joined:
-        kind = 'operator'
-    elif 'USUARIO' in joined or 'USER' in joined:
-        kind = 'user'
-    elif 'COMPARTID' in joined or 'SHARED' in joined:
-        kind = 'shared'
-
-    return f"nivel_{dig}_{kind}" if kind else None
-
 def coalesce(*vals):
     for v in vals:
         if v not in (None, ''):
@@ -122,13 +104,6 @@ def load_mapping_json(path_or_none: Optional[str], fname_default: str) -> Dict[s
     return out
 
 # --------- Tokens / fallback provider ---------
-def provider_tokens(name: str) -> List[str]:
-    s = norm_text(name)
-    s = s.replace('.', ' ').replace('/', ' ').replace('-', ' ')
-    stop = {'S', 'A', 'SA', 'SAS', 'ESP', 'E', 'P', 'ES', 'EP'}
-    toks = [t for t in s.split() if t and t not in stop]
-    return toks
-
 def best_token_match(target: str, candidates: List[str]) -> Tuple[Optional[str], float]:
     tgt = set(provider_tokens(target))
     if not tgt:
@@ -145,33 +120,55 @@ def best_token_match(target: str, candidates: List[str]) -> Tuple[Optional[str],
             best, best_score = c, score
     return best, best_score
 
+def provider_matcher(candidates: List[str] = ()) -> ProviderMatcher:
+    """Matcher con índice invertido y LRU; mismo criterio que best_token_match."""
+    return ProviderMatcher(provider_tokens, candidates)
+
 def r2(x: Optional[float]) -> Optional[float]:
     return None if x is None else round(float(x), 2)
 
 # --------- Tarifas ---------
-def prep_tariffs(df: pd.DataFrame, canonical_provider_targets: List[str]) -> pd.DataFrame:
+def add_stats(stats: Optional[Dict[str, Any]], **values) -> None:
+    """Suma contadores en `stats` (no hace nada si es None)."""
+    if stats is None:
+        return
+    for k, v in values.items():
+        stats[k] = stats.get(k, 0) + v
+
+def _lookup_stats(stats: Optional[Dict[str, Any]], cells: int, bia_hits: int, act_hits: int,
+                  fallbacks: int, matcher: ProviderMatcher, index_s: float) -> None:
+    info = matcher.cache_info()
+    add_stats(stats, cells=cells, bia_hits=bia_hits, bia_misses=cells - bia_hits,
+              actual_hits=act_hits, actual_misses=cells - act_hits, provider_fallbacks=fallbacks,
+              matcher_hits=info['hits'], matcher_misses=info['misses'], index_s=round(index_s, 4))
+
+def prep_tariffs(df: pd.DataFrame, canonical_provider_targets: List[str],
+                 matcher: Optional[ProviderMatcher] = None) -> pd.DataFrame:
     expected = {'mes', 'provider', 'city', 'nivel_de_tension', 'tarifa'}
     missing = expected - set(df.columns)
     if missing:
         raise ValueError(f'Faltan columnas en tarifas: {missing}. Esperadas: {expected}')
     out = df.copy()
     out['mes_key']        = out['mes'].astype(str).str[:7]
-    out['city_n']         = out['city'].map(norm_text)
-    out['provider_raw_n'] = out['provider'].map(norm_text)
+    # Cada normalización corre una vez por valor distinto de la columna (map_distinct)
+    out['city_n']         = map_distinct(out['city'], norm_text)
+    out['provider_raw_n'] = map_distinct(out['provider'], norm_text)
     out['tarifa']         = pd.to_numeric(out['tarifa'], errors='coerce')
 
     # Normalizar nivel de tarifas (intenta compuesto; si no, deja simple)
-    out['nivel_raw']      = out['nivel_de_tension'].map(clean_space)
-    out['nivel_comp']     = out['nivel_raw'].map(canonical_comp_from_tokens)
-    out['nivel_simp']     = out['nivel_raw'].map(canonical_simple)
+    out['nivel_raw']      = map_distinct(out['nivel_de_tension'], clean_space)
+    out['nivel_comp']     = map_distinct(out['nivel_raw'], canonical_comp_from_tokens)
+    out['nivel_simp']     = map_distinct(out['nivel_raw'], canonical_simple)
 
     # Canonizar provider (lado tarifas) a targets del mapping
+    # (una sola vez por valor distinto, con la matriz de puntajes contra todos los targets)
     targets = sorted(set(norm_text(t) for t in canonical_provider_targets if t), key=len, reverse=True)
-    def canon_provider_tar_side(p: str) -> str:
-        if p in targets: return p
-        best, score = best_token_match(p, targets)
-        return best if best and score >= 0.45 else p
-    out['provider_n'] = out['provider_raw_n'].map(canon_provider_tar_side)
+    matcher = matcher or provider_matcher(targets)
+    target_set = set(targets)
+    distinct = [p for p in out['provider_raw_n'].unique() if p not in target_set]
+    best = matches_from_scores(matcher.score_matrix(distinct, targets), targets, PROVIDER_MATCH_THRESHOLD)
+    canon = {p: (b or p) for p, b in zip(distinct, best)}
+    out['provider_n'] = map_distinct(out['provider_raw_n'], lambda p: canon.get(p, p))
 
     out = out.dropna(subset=['tarifa'])
     return out[['mes_key','city_n','provider_n','tarifa','nivel_comp','nivel_simp']]
@@ -204,47 +201,115 @@ def build_bucket(df: pd.DataFrame, level_col: str) -> Dict[Tuple[str,str,str], L
         bucket.setdefault(k, set()).add(r['provider_n'])
     return {k: sorted(list(v)) for k, v in bucket.items()}
 
+def build_loop_index(df: pd.DataFrame) -> Dict[str, Any]:
+    """Índices dict del motor 'loop' (compuesto, simple, buckets y meses), para construirlos una sola vez."""
+    return {
+        'comp': build_index_comp(df),
+        'simple': build_index_simple(df),
+        'bucket_comp': build_bucket(df, 'nivel_comp'),
+        'bucket_simp': build_bucket(df, 'nivel_simp'),
+        'months': sorted(df['mes_key'].unique()),
+    }
+
 # --------- Oportunidades ---------
+NESTED_JSON = os.path.join("outputs", "opportunities_curated_nested.json")
+
 def load_opps_nested(path_json: str) -> List[Dict[str, Any]]:
-    with open(path_json, 'r', encoding='utf-8') as f:
-        return json.load(f)
+    """Anidado de run_opps_sql en cualquier formato de src/export.py."""
+    return load_json(path_json)
 
-# --------- CLI / rango ---------
-def parse_args():
-    p = argparse.ArgumentParser(description="Análisis por frontera (nivel compuesto + rango de meses).")
-    p.add_argument("nested_json", nargs="?", default=os.path.join("outputs","opportunities_curated_nested.json"))
-    p.add_argument("cities_map",  nargs="?", default=None)
-    p.add_argument("providers_map", nargs="?", default=None)
-    p.add_argument("--from", dest="from_month", required=True, help="Mes inicial (YYYY-MM)")
-    p.add_argument("--to",   dest="to_month",   required=True, help="Mes final (YYYY-MM)")
-    return p.parse_args()
+def load_opps_compact(path_json: str) -> Any:
+    """
+    Anidado -> Portfolio (src/frontiers.py), leído registro a registro sin la lista de dicts.
+    La forma se revisa en el primer registro: si no es la de run_opps_sql, se sigue leyendo
+    la lista de siempre (sin volver a abrir el archivo). Si el primero la tiene y uno
+    posterior no, ValueError: el archivo está mezclado y no se adivina qué usar.
+    """
+    records = iter_records(path_json)
+    first = next(records, None)
+    if first is not None and not is_nested_record(first):
+        print("🟡 --compact-model: el anidado no tiene la forma de run_opps_sql; se usa la lista de registros")
+        return [first, *records]
+    return Portfolio.from_records(itertools.chain([first] if first is not None else [], records))
 
-# --------- MAIN ---------
-def main():
-    args = parse_args()
+# --------- Frontera ---------
+def resolve_frontier(f: Dict[str, Any], city_map: Dict[str, str], prov_map: Dict[str, str],
+                     norm=norm_text) -> Dict[str, Any]:
+    """
+    Llaves de cruce de una frontera: ciudad/provider canon (mapping), nivel compuesto y simple, consumo.
+    `norm` permite reemplazar norm_text (que ya viene memoizada por valor).
+    """
+    city_raw   = coalesce(f.get('city'), f.get('region'), f.get('ciudad'), f.get('market'))
+    nivel_raw  = f.get('nivel_de_tension')  # <- ya viene compuesto (nivel_1_user), pero soportamos simple
+    consumo_rw = f.get('consumo_kwh') or f.get('consumo') or f.get('kwh_mes')
+    prov_raw   = coalesce(
+        f.get('provider_actual'), f.get('provider'),
+        f.get('comercializador actual'), f.get('comercializador_actual'),
+        f.get('comercializador')
+    )
 
-    city_map = load_mapping_json(args.cities_map, 'cities_mapping.json')
-    prov_map = load_mapping_json(args.providers_map, 'providers_mapping.json')
+    # Ciudad y provider canon
+    city_calc_n   = norm(city_raw)
+    city_tarifa_n = city_map.get(city_calc_n, city_calc_n)
+    prov_calc_n   = norm(prov_raw)
+    prov_tarifa_n = prov_map.get(prov_calc_n, prov_calc_n)
 
-    df_tariffs = fetch_tariffs(LAMBDA_URL, TARIFF_RESOURCE_ID)
-    df_tar = prep_tariffs(df_tariffs, canonical_provider_targets=list(prov_map.values()) + [PROVIDER_BIA])
+    # Nivel de la frontera: intentar extraer compuesto y simple
+    nivel_comp_f  = canonical_comp_from_tokens(nivel_raw) or canonical_comp_from_tokens(norm(nivel_raw))
+    nivel_simp_f  = canonical_simple(nivel_raw)
 
-    # FILTRO DE RANGO AQUÍ
-    start = args.from_month.strip()[:7]
-    end   = args.to_month.strip()[:7]
-    df_tar = df_tar[(df_tar['mes_key'] >= start) & (df_tar['mes_key'] <= end)].copy()
+    try:
+        consumo = float(consumo_rw) if consumo_rw not in (None, '') else None
+    except Exception:
+        consumo = None
+
+    return {
+        'city_calc_n': city_calc_n,
+        'city_tarifa_n': city_tarifa_n,
+        'prov_calc_n': prov_calc_n,
+        'prov_tarifa_n': prov_tarifa_n,
+        'nivel_comp_f': nivel_comp_f,
+        'nivel_simp_f': nivel_simp_f,
+        'consumo': consumo,
+    }
+
+def frontier_row(f: Dict[str, Any], fr: Dict[str, Any], mensual: List[Dict[str, Any]]) -> Dict[str, Any]:
+    return {
+        'frontier_name': f.get('frontier_name'),
+        'city_calculadora': fr['city_calc_n'],
+        'city_tarifas_usada': fr['city_tarifa_n'],
+        'nivel_de_tension': fr['nivel_comp_f'] or fr['nivel_simp_f'],  # para visibilidad en salida
+        'provider_actual_calc_norm': fr['prov_calc_n'],
+        'provider_actual_tarifas_norm': fr['prov_tarifa_n'],
+        'analisis_mensual': mensual
+    }
 
+# --------- Motor 'loop' (frontera × mes) ---------
+def analizar_loop(opps: List[Dict[str, Any]], df_tar: Optional[pd.DataFrame],
+                  city_map: Dict[str, str], prov_map: Dict[str, str],
+                  audit: Optional[AuditSink] = None,
+                  stats: Optional[Dict[str, Any]] = None,
+                  index: Optional[Dict[str, Any]] = None) -> Tuple[List[Dict[str, Any]], Optional[List[Dict[str, Any]]]]:
+    """
+    Cruce celda a celda con índices dict. Devuelve (salida, debug_rows).
+    Si se pasa `audit`, las filas de debug van a ese destino en streaming y debug_rows es None.
+    Si se pasa `stats`, se le suman los contadores de búsqueda (celdas, hits/misses, fallbacks).
+    Con `index` (build_loop_index) no se reconstruyen los índices y `df_tar` puede ser None.
+    """
     # Índices y buckets (compuesto + simple)
-    index_comp   = build_index_comp(df_tar)
-    index_simple = build_index_simple(df_tar)
-    bucket_comp  = build_bucket(df_tar, 'nivel_comp')
-    bucket_simp  = build_bucket(df_tar, 'nivel_simp')
+    t_index = time.perf_counter()
+    index = index if index is not None else build_loop_index(df_tar)
+    index_comp, index_simple = index['comp'], index['simple']
+    bucket_comp, bucket_simp = index['bucket_comp'], index['bucket_simp']
+    index_s = time.perf_counter() - t_index
 
-    meses_disponibles = sorted(df_tar['mes_key'].unique())
-    opps = load_opps_nested(args.nested_json)
+    meses_disponibles = index['months']
+    bia_tarifa_n = prov_map.get(norm_text(PROVIDER_BIA), norm_text(PROVIDER_BIA))
+    matcher = provider_matcher()
+    sink = audit if audit is not None else ListSink()
+    n_cells = n_bia = n_act = n_fallback = 0
 
     salida: List[Dict[str, Any]] = []
-    debug_rows: List[Dict[str, Any]] = []
 
     for reg in opps:
         oportunidad = reg.get('oportunidad')
@@ -254,30 +319,12 @@ def main():
         filas_fronteras: List[Dict[str, Any]] = []
 
         for f in fronteras:
-            city_raw   = coalesce(f.get('city'), f.get('region'), f.get('ciudad'), f.get('market'))
-            nivel_raw  = f.get('nivel_de_tension')  # <- ya viene compuesto (nivel_1_user), pero soportamos simple
-            consumo_rw = f.get('consumo_kwh') or f.get('consumo') or f.get('kwh_mes')
-            prov_raw   = coalesce(
-                f.get('provider_actual'), f.get('provider'),
-                f.get('comercializador actual'), f.get('comercializador_actual'),
-                f.get('comercializador')
-            )
-
-            # Ciudad y provider canon
-            city_calc_n   = norm_text(city_raw)
-            city_tarifa_n = city_map.get(city_calc_n, city_calc_n)
-            prov_calc_n   = norm_text(prov_raw)
-            prov_tarifa_n = prov_map.get(prov_calc_n, prov_calc_n)
-            bia_tarifa_n  = prov_map.get(norm_text(PROVIDER_BIA), norm_text(PROVIDER_BIA))
-
-            # Nivel de la frontera: intentar extraer compuesto y simple
-            nivel_comp_f  = canonical_comp_from_tokens(nivel_raw) or canonical_comp_from_tokens(norm_text(nivel_raw))
-            nivel_simp_f  = canonical_simple(nivel_raw)
-
-            try:
-                consumo = float(consumo_rw) if consumo_rw not in (None, '') else None
-            except Exception:
-                consumo = None
+            fr = resolve_frontier(f, city_map, prov_map)
+            city_tarifa_n = fr['city_tarifa_n']
+            prov_tarifa_n = fr['prov_tarifa_n']
+            nivel_comp_f  = fr['nivel_comp_f']
+            nivel_simp_f  = fr['nivel_simp_f']
+            consumo       = fr['consumo']
 
             mensual: List[Dict[str, Any]] = []
             for mes in meses_disponibles:
@@ -309,8 +356,8 @@ def main():
                         providers_here = bucket_simp.get((mes, city_tarifa_n, nivel_simp_f), [])
 
                     if providers_here:
-                        cand, score = best_token_match(used_provider, providers_here)
-                        if cand is not None and score >= 0.45:
+                        cand, score = matcher.best(used_provider, providers_here)
+                        if cand is not None and score >= PROVIDER_MATCH_THRESHOLD:
                             if used_level_variant == 'compuesto' or (used_level_variant is None and nivel_comp_f):
                                 t_act = index_comp.get((mes, city_tarifa_n, nivel_comp_f, cand))
                             else:
@@ -324,6 +371,10 @@ def main():
                 costo_act = (consumo * t_act) if (consumo is not None and t_act is not None) else None
                 delta_unit = (t_act - t_bia) if (t_act is not None and t_bia is not None) else None
                 ahorro_mensual = (costo_act - costo_bia) if (costo_act is not None and costo_bia is not None) else None
+                n_cells += 1
+                n_bia += t_bia is not None
+                n_act += t_act is not None
+                n_fallback += used_fallback
 
                 mensual.append({
                     'mes': mes,
@@ -336,7 +387,9 @@ def main():
                     'ahorro_mensual_estimado': r2(ahorro_mensual)
                 })
 
-                debug_rows.append({
+                if not sink.enabled:
+                    continue
+                sink.write({
                     "oportunidad": oportunidad,
                     "frontier_name": f.get('frontier_name'),
                     "mes": mes,
@@ -344,7 +397,7 @@ def main():
                     "nivel_comp_fr": nivel_comp_f,
                     "nivel_simple_fr": nivel_simp_f,
                     "nivel_variant_usado": used_level_variant,
-                    "provider_calc": prov_calc_n,
+                    "provider_calc": fr['prov_calc_n'],
                     "provider_tarifas_mapeado": prov_tarifa_n,
                     "provider_usado_para_actual": used_provider if t_act is not None else None,
                     "fallback_usado": used_fallback,
@@ -353,15 +406,7 @@ def main():
                     "encontro_actual": t_act is not None
                 })
 
-            filas_fronteras.append({
-                'frontier_name': f.get('frontier_name'),
-                'city_calculadora': city_calc_n,
-                'city_tarifas_usada': city_tarifa_n,
-                'nivel_de_tension': nivel_comp_f or nivel_simp_f,  # para visibilidad en salida
-                'provider_actual_calc_norm': prov_calc_n,
-                'provider_actual_tarifas_norm': prov_tarifa_n,
-                'analisis_mensual': mensual
-            })
+            filas_fronteras.append(frontier_row(f, fr, mensual))
 
         salida.append({
             'oportunidad': oportunidad,
@@ -369,17 +414,638 @@ def main():
             'fronteras': filas_fronteras
         })
 
-    os.makedirs('outputs', exist_ok=True)
-    out_file = os.path.join('outputs','analisis_tarifas_por_frontera.json')
-    with open(out_file, 'w', encoding='utf-8') as f:
-        json.dump(salida, f, ensure_ascii=False, indent=2)
+    _lookup_stats(stats, n_cells, n_bia, n_act, n_fallback, matcher, index_s)
+    return salida, (sink.rows if audit is None else None)
+
+# --------- Motor 'vector' (índice denso) ---------
+def frontier_table(opps: List[Dict[str, Any]], city_map: Dict[str, str],
+                   prov_map: Dict[str, str]) -> Dict[str, Any]:
+    """
+    Fronteras en orden de salida con su llave de cruce única:
+      fr_opp     posición de la oportunidad de cada frontera
+      names      frontier_name de cada frontera
+      resolved   resolve_frontier(...) distintos; fr_res: cuál usa cada frontera
+      keys       llaves (city, nivel_comp, nivel_simp, provider) en orden de aparición
+      fr_key     índice en `keys` de cada frontera
+      consumo / consumo_ok  consumo por frontera (NaN si no hay) y si es válido
+    Con un Portfolio (src/frontiers.py) se resuelve una vez por combinación distinta de textos.
+    """
+    if isinstance(opps, Portfolio):
+        return _portfolio_frontier_table(opps, city_map, prov_map)
+    key_ids: Dict[Tuple[Any, ...], int] = {}
+    fr_opp: List[int] = []
+    names: List[Any] = []
+    resolved: List[Dict[str, Any]] = []
+    fr_key: List[int] = []
+    consumo_val: List[float] = []
+    consumo_ok: List[bool] = []
+    for i_opp, reg in enumerate(opps):
+        for f in reg.get('fronteras', []):
+            fr = resolve_frontier(f, city_map, prov_map)
+            k = (fr['city_tarifa_n'], fr['nivel_comp_f'], fr['nivel_simp_f'], fr['prov_tarifa_n'])
+            fr_key.append(key_ids.setdefault(k, len(key_ids)))
+            consumo_ok.append(fr['consumo'] is not None)
+            consumo_val.append(fr['consumo'] if fr['consumo'] is not None else np.nan)
+            fr_opp.append(i_opp)
+            names.append(f.get('frontier_name'))
+            resolved.append(fr)
+    return {
+        'fr_opp': np.asarray(fr_opp, dtype=np.int64),
+        'names': names,
+        'resolved': resolved,
+        'fr_res': np.arange(len(resolved), dtype=np.int64),
+        'keys': list(key_ids),
+        'fr_key': np.asarray(fr_key, dtype=np.int64),
+        'consumo': np.asarray(consumo_val, dtype=float),
+        'consumo_ok': np.asarray(consumo_ok, dtype=bool),
+    }
+
+_RESOLVE_FIELDS = ['city', 'ciudad', 'nivel_de_tension', 'provider_actual', 'provider']
+
+def _portfolio_frontier_table(opps: Portfolio, city_map: Dict[str, str],
+                              prov_map: Dict[str, str]) -> Dict[str, Any]:
+    # Combinaciones distintas de códigos de texto, en orden de primera aparición
+    if opps.n_frontiers:
+        combos = np.stack([opps.codes[c].astype(np.int64) for c in _RESOLVE_FIELDS], axis=1)
+        uniq, first, inverse = np.unique(combos, axis=0, return_index=True, return_inverse=True)
+        order = np.argsort(first, kind='stable')
+        rank = np.empty(len(order), dtype=np.int64)
+        rank[order] = np.arange(len(order))
+        fr_res = rank[inverse.reshape(-1)]
+        uniq = uniq[order].tolist()
+    else:
+        fr_res, uniq = np.zeros(0, dtype=np.int64), []
+    values = [opps.categories['provider' if c == 'provider_actual' else c].values for c in _RESOLVE_FIELDS]
+
+    key_ids: Dict[Tuple[Any, ...], int] = {}
+    resolved: List[Dict[str, Any]] = []
+    res_key: List[int] = []
+    for combo in uniq:
+        fr = resolve_frontier({c: v[code] for c, v, code in zip(_RESOLVE_FIELDS, values, combo)},
+                              city_map, prov_map)
+        k = (fr['city_tarifa_n'], fr['nivel_comp_f'], fr['nivel_simp_f'], fr['prov_tarifa_n'])
+        res_key.append(key_ids.setdefault(k, len(key_ids)))
+        resolved.append(fr)
+
+    # consumo: `f.get('consumo') or ...` en resolve_frontier -> 0 cuenta como faltante
+    consumo_ok = opps.consumo != 0
+    return {
+        'fr_opp': opps.frontier_opp(),
+        'names': opps.frontier_name,
+        'resolved': resolved,
+        'fr_res': fr_res,
+        'keys': list(key_ids),
+        'fr_key': np.asarray(res_key, dtype=np.int64)[fr_res],
+        'consumo': np.where(consumo_ok, opps.consumo, np.nan),
+        'consumo_ok': consumo_ok,
+    }
+
+def bia_rates(index: TariffIndex, keys: List[Tuple[Any, ...]], bia_provider: str,
+              months: Optional[Sequence[str]] = None) -> np.ndarray:
+    """
+    Tarifa BIA por llave × mes (K, M): compuesto y, si falta, simple. Con `months` se
+    alinea un índice de otra tabla a esos meses (NaN en los que no tenga).
+    """
+    c_mes  = (np.arange(len(index.months)) if months is None else index.encode('months', months))[None, :]
+    c_city = index.encode('cities', (k[0] for k in keys))[:, None]
+    c_comp = index.encode('levels', (k[1] for k in keys))[:, None]
+    c_simp = index.encode('levels', (k[2] for k in keys))[:, None]
+    c_bia  = index.code('providers', bia_provider)
+    t_bia = index.gather(c_mes, c_city, c_comp, c_bia)
+    return np.where(np.isnan(t_bia), index.gather(c_mes, c_city, c_simp, c_bia), t_bia)
+
+def actual_rates(index: TariffIndex, keys: List[Tuple[Any, ...]],
+                 matcher: ProviderMatcher) -> Dict[str, np.ndarray]:
+    """
+    Tarifa del comercializador actual por llave × mes (K, M): compuesto -> simple y, en las
+    celdas sin tarifa, provider difuso por tokens. Devuelve la tarifa ('t_act') y el detalle
+    para auditoría ('variant', 'used_provider', 'used_fallback', 'fallback_score').
+    """
+    meses = index.months
+    M = len(meses)
+    c_mes  = np.arange(M)[None, :]
+    c_city = index.encode('cities',    (k[0] for k in keys))[:, None]
+    c_comp = index.encode('levels',    (k[1] for k in keys))[:, None]
+    c_simp = index.encode('levels',    (k[2] for k in keys))[:, None]
+    c_prov = index.encode('providers', (k[3] for k in keys))[:, None]
+
+    # Actual: compuesto -> simple
+    t_act_c = index.gather(c_mes, c_city, c_comp, c_prov)
+    t_act_s = index.gather(c_mes, c_city, c_simp, c_prov)
+    found_c = ~np.isnan(t_act_c)
+    found_s = ~found_c & ~np.isnan(t_act_s)
+    t_act = np.where(found_c, t_act_c, t_act_s)
+    variant = np.where(found_c, 'compuesto', np.where(found_s, 'simple', None)).astype(object)
+
+    # Fallback de provider por tokens, solo en las llaves sin tarifa actual
+    prov_keys = np.empty(len(keys), dtype=object)
+    prov_keys[:] = [k[3] for k in keys]
+    used_provider = np.repeat(prov_keys[:, None], M, axis=1)
+    used_fallback = np.zeros(t_act.shape, dtype=bool)
+    fallback_score = np.full(t_act.shape, None, dtype=object)
+    for k, j in np.argwhere(np.isnan(t_act)).tolist():
+        city, nivel_comp, nivel_simp, prov = keys[k]
+        nivel = nivel_comp if nivel_comp else nivel_simp
+        providers_here = index.providers_at(meses[j], city, nivel)
+        if not providers_here:
+            continue
+        cand, score = matcher.best(prov, providers_here)
+        if cand is not None and score >= PROVIDER_MATCH_THRESHOLD:
+            t = index.lookup(meses[j], city, nivel, cand)
+            t_act[k, j] = np.nan if t is None else t
+            used_provider[k, j] = cand
+            used_fallback[k, j] = True
+            fallback_score[k, j] = score
+    return {'t_act': t_act, 'variant': variant, 'used_provider': used_provider,
+            'used_fallback': used_fallback, 'fallback_score': fallback_score}
+
+def analizar_vectorizado(opps: List[Dict[str, Any]], df_tar: Optional[pd.DataFrame],
+                         city_map: Dict[str, str], prov_map: Dict[str, str],
+                         index: Optional[TariffIndex] = None,
+                         audit: Optional[AuditSink] = None,
+                         stats: Optional[Dict[str, Any]] = None) -> Tuple[List[Dict[str, Any]], Optional[List[Dict[str, Any]]]]:
+    """
+    Mismo resultado que analizar_loop. La cadena compuesto -> simple -> provider difuso se
+    resuelve una sola vez por llave única (city, nivel_comp, nivel_simp, provider) × mes con
+    gathers sobre el TariffIndex, y tarifas y costos se difunden a todas las celdas
+    frontera × mes con arreglos NumPy. Si se pasa `index`, `df_tar` puede ser None.
+    `audit` y `stats` funcionan igual que en analizar_loop. Con un Portfolio devuelve una
+    AnalysisTable (src/frontiers.py): los registros se arman recién al recorrerla.
+    """
+    t_index = time.perf_counter()
+    index = index if index is not None else TariffIndex.from_frame(df_tar)
+    index_s = time.perf_counter() - t_index
+    meses = index.months
+    M = len(meses)
+    bia_tarifa_n = prov_map.get(norm_text(PROVIDER_BIA), norm_text(PROVIDER_BIA))
+
+    # 1) Tabla de fronteras (norm_text ya está memoizada por valor)
+    tabla = frontier_table(opps, city_map, prov_map)
+    keys, fr_key = tabla['keys'], tabla['fr_key']
+
+    # 2) Llaves únicas × meses: gathers sobre el índice (K, M)
+    t_bia = bia_rates(index, keys, bia_tarifa_n)
+    matcher = provider_matcher()
+    act = actual_rates(index, keys, matcher)
+    t_act, variant, used_provider = act['t_act'], act['variant'], act['used_provider']
+    used_fallback, fallback_score = act['used_fallback'], act['fallback_score']
+
+    # 3) Difusión a celdas frontera × mes (tarifas y delta quedan por llave)
+    idx = fr_key
+    if stats is not None:
+        w = np.bincount(idx, minlength=len(keys))  # fronteras por llave
+        _lookup_stats(stats, int(len(idx) * M), int((~np.isnan(t_bia)).sum(axis=1) @ w),
+                      int((~np.isnan(t_act)).sum(axis=1) @ w), int(used_fallback.sum(axis=1) @ w),
+                      matcher, index_s)
+    k_bia = ~np.isnan(t_bia)
+    k_act = ~np.isnan(t_act)
+    T_bia = t_bia[idx]
+    T_act = t_act[idx]
+    cons = tabla['consumo'][:, None]
+    cons_ok = tabla['consumo_ok'][:, None]
+    ok_cb = cons_ok & k_bia[idx]
+    ok_ca = cons_ok & k_act[idx]
+
+    with np.errstate(invalid='ignore'):
+        costo_bia = cons * T_bia
+        costo_act = cons * T_act
+        ahorro = costo_act - costo_bia
+        delta_unit = t_act - t_bia
+
+    if isinstance(opps, Portfolio):
+        oportunidad, cliente = opps.heads['oportunidad'], opps.heads['cliente']
+    else:
+        oportunidad = [reg.get('oportunidad') for reg in opps]
+        cliente = [reg.get('cliente') for reg in opps]
+    tabla_out = AnalysisTable(
+        oportunidad, cliente, meses, tabla['fr_opp'], tabla['names'], tabla['resolved'],
+        tabla['fr_res'], fr_key, tabla['consumo'], tabla['consumo_ok'],
+        key_cols={'tarifa_bia': (round2(t_bia), k_bia),
+                  'tarifa_actual': (round2(t_act), k_act),
+                  'delta_unit': (round2(delta_unit), k_bia & k_act)},
+        frontier_cols={'costo_bia': (round2(costo_bia), ok_cb),
+                       'costo_actual': (round2(costo_act), ok_ca),
+                       'ahorro_mensual_estimado': (round2(ahorro), ok_cb & ok_ca)})
+
+    # 4) Auditoría por frontera × mes
+    sink = audit if audit is not None else ListSink()
+    if sink.enabled:
+        g_variant = variant.tolist()
+        g_used = np.where(k_act, used_provider, None).tolist()
+        g_fallback = used_fallback.tolist()
+        g_score = fallback_score.tolist()
+        g_enc_bia = k_bia.tolist()
+        g_enc_act = k_act.tolist()
+        resolved, names = tabla['resolved'], tabla['names']
+        for i_opp, name, r, k in zip(tabla['fr_opp'].tolist(), names, tabla['fr_res'].tolist(), fr_key.tolist()):
+            fr = resolved[r]
+            for j, mes in enumerate(meses):
+                sink.write({
+                    "oportunidad": oportunidad[i_opp],
+                    "frontier_name": name,
+                    "mes": mes,
+                    "city_tarifas_usada": fr['city_tarifa_n'],
+                    "nivel_comp_fr": fr['nivel_comp_f'],
+                    "nivel_simple_fr": fr['nivel_simp_f'],
+                    "nivel_variant_usado": g_variant[k][j],
+                    "provider_calc": fr['prov_calc_n'],
+                    "provider_tarifas_mapeado": fr['prov_tarifa_n'],
+                    "provider_usado_para_actual": g_used[k][j],
+                    "fallback_usado": g_fallback[k][j],
+                    "fallback_score": g_score[k][j],
+                    "encontro_bia": g_enc_bia[k][j],
+                    "encontro_actual": g_enc_act[k][j]
+                })
+
+    # 5) Salida: la tabla tal cual con un Portfolio (registros al exportar); si no, la lista de siempre
+    salida = tabla_out if isinstance(opps, Portfolio) else tabla_out.to_records()
+    return salida, (sink.rows if audit is None else None)
+
+ENGINES = {
+    'loop': analizar_loop,
+    'vector': analizar_vectorizado,
+}
+
+# --------- CLI / rango ---------
+def parse_args():
+    p = argparse.ArgumentParser(description="Análisis por frontera (nivel compuesto + rango de meses).")
+    p.add_argument("nested_json", nargs="?", default=None,
+                   help=f"Anidado de run_opps_sql (por defecto la variante más reciente de {NESTED_JSON})")
+    p.add_argument("cities_map",  nargs="?", default=None)
+    p.add_argument("providers_map", nargs="?", default=None)
+    p.add_argument("--from", dest="from_month", required=True, help="Mes inicial (YYYY-MM)")
+    p.add_argument("--to",   dest="to_month",   required=True, help="Mes final (YYYY-MM)")
+    p.add_argument("--offline", action="store_true", help="Usar solo el snapshot de tarifas en caché (sin red)")
+    p.add_argument("--no-cache", dest="no_cache", action="store_true", help="Descargar tarifas sin usar la caché local")
+    p.add_argument("--cache-ttl", dest="cache_ttl", type=float, default=TARIFF_CACHE_TTL,
+                   help=f"Segundos de validez del snapshot sin revalidar (por defecto {TARIFF_CACHE_TTL})")
+    p.add_argument("--cache-dir", dest="cache_dir", default=TARIFF_CACHE_DIR, help="Carpeta de la caché de tarifas")
+    p.add_argument("--tariff-source", dest="tariff_source", default=None,
+                   help="Origen de las tarifas: URL del Lambda (o de un sustituto local), CSV local, "
+                        "o sqlite:RUTA[#snapshot] (por defecto el Lambda configurado)")
+    p.add_argument("--resource-ids", dest="resource_ids", type=int, nargs="+", default=[TARIFF_RESOURCE_ID],
+                   help="Recursos de tarifas a descargar en paralelo y unir, en orden de prioridad creciente "
+                        f"(por defecto {TARIFF_RESOURCE_ID})")
+    p.add_argument("--engine", choices=ENGINES, default="loop",
+                   help="Motor de cruce: 'loop' (frontera × mes en Python) o 'vector' (gathers sobre índice denso)")
+    p.add_argument("--audit", dest="audit_format", choices=AUDIT_FORMATS, default="json",
+                   help="Destino del debug de búsquedas: json (outputs/debug_tariff_lookup.json), "
+                        "jsonl o sqlite (tabla tariff_lookup_audit en data/analisis.sqlite)")
+    p.add_argument("--audit-level", dest="audit_level", choices=AUDIT_LEVELS, default="full",
+                   help="Filas de debug a guardar: off, misses (sin tarifa), sampled o full")
+    p.add_argument("--audit-sample", dest="audit_sample", type=int, default=100,
+                   help="Con --audit-level sampled: guardar 1 de cada N fronteras")
+    p.add_argument("--audit-path", dest="audit_path", default=None,
+                   help="Ruta del archivo/base de auditoría (por defecto según el formato)")
+    p.add_argument("--persist-tariffs", dest="persist_db", nargs="?", const=DEFAULT_DB_PATH, default=None,
+                   help=f"Guardar el snapshot de tarifas como partición versionada en SQLite (por defecto {DEFAULT_DB_PATH})")
+    p.add_argument("--tariff-store", dest="tariff_store", nargs="?", const=TARIFF_STORE_DIR, default=None,
+                   help="Preparar y leer las tarifas por mes desde un almacén particionado: solo los meses "
+                        f"de --from/--to (por defecto en {TARIFF_STORE_DIR})")
+    p.add_argument("--index-dir", dest="index_dir", default=None,
+                   help="Carpeta donde guardar/reutilizar el TariffIndex (.npy, memory-mapped) del motor 'vector'")
+    p.add_argument("--arrow", dest="columnar_dir", nargs="?", const=COLUMNAR_DIR, default=None,
+                   help="Leer oportunidades y escribir el análisis como tablas Arrow en esa carpeta "
+                        f"(de run_opps_sql --arrow; por defecto {COLUMNAR_DIR}) en lugar de los JSON")
+    p.add_argument("--compact-model", dest="compact_model", action="store_true",
+                   help="Cargar las oportunidades en el modelo columnar compacto (src/frontiers.py): sin un "
+                        "dict por frontera; con --engine vector el análisis se arma recién al escribirlo")
+    p.add_argument("--workers", type=int, default=1,
+                   help="Procesos para repartir las oportunidades (1 = sin pool; salida idéntica)")
+    p.add_argument("--metrics", dest="metrics_path", default=RUN_METRICS_PATH,
+                   help=f"Archivo de métricas por etapa (por defecto {RUN_METRICS_PATH})")
+    p.add_argument("--profile", dest="profile_dir", nargs="?", const=PROFILE_DIR, default=None,
+                   help=f"Guardar volcados cProfile/tracemalloc por etapa (por defecto en {PROFILE_DIR})")
+    p.add_argument("--incremental", dest="incremental_db", nargs="?", const=DEFAULT_DB_PATH, default=None,
+                   help="Recalcular solo las oportunidades nuevas o modificadas; el resto sale de la tabla "
+                        f"analysis_cache (por defecto en {DEFAULT_DB_PATH})")
+    add_export_args(p)
+    return p.parse_args()
+
+def load_tariffs(offline: bool = False, no_cache: bool = False,
+                 cache_ttl: float = TARIFF_CACHE_TTL, cache_dir: str = TARIFF_CACHE_DIR,
+                 cache_info: Optional[Dict[str, Any]] = None,
+                 source: Optional[TariffSource] = None,
+                 resource_ids: Optional[Sequence[int]] = None,
+                 by_resource: Optional[Dict[int, pd.DataFrame]] = None) -> pd.DataFrame:
+    """
+    Tarifas crudas: desde la caché local (por defecto) o directo del Lambda con no_cache.
+    `source` cambia el origen (ver tariff_source_from_spec); las fuentes locales (archivo,
+    SQLite) se leen directo, sin caché.
+    Con varios `resource_ids` (p. ej. tarifas reguladas + ofertas BIA) cada recurso se
+    descarga en su propio hilo y se unen en ese orden (ver merge_tariff_frames).
+    Si se pasa `cache_info`, se completa con el estado de la caché (hit/miss/...), y
+    `by_resource` con la tabla de cada resource_id antes de unirlas ({resource_id: df}; una
+    fuente que no distingue recursos queda bajo el primero).
+    """
+    ids = list(resource_ids or [TARIFF_RESOURCE_ID])
+    source = source or HttpTariffSource(LAMBDA_URL, ids[0])
+    if len(ids) == 1 and resource_ids:
+        source = source.for_resource(ids[0])
+    if len(ids) > 1:
+        sources: List[TariffSource] = []
+        owners: List[int] = []
+        for rid in ids:
+            src = source.for_resource(rid)
+            if src not in sources:
+                sources.append(src)
+                owners.append(rid)
+        infos: List[Dict[str, Any]] = [{} for _ in sources]
+        with ThreadPoolExecutor(max_workers=len(sources), thread_name_prefix='tarifas') as pool:
+            frames = list(pool.map(
+                lambda i: load_tariffs(offline, no_cache, cache_ttl, cache_dir, infos[i], sources[i]),
+                range(len(sources))))
+        if by_resource is not None:
+            by_resource.update(zip(owners, frames))
+        df = merge_tariff_frames(frames)
+        if cache_info is not None:
+            cache_info.update({'status': ','.join(str(i.get('status')) for i in infos),
+                               'rows': int(len(df)), 'resources': ids,
+                               'elapsed_ms': max(i.get('elapsed_ms') or 0 for i in infos)})
+        return df
+    if not source.cacheable or (no_cache and not offline):
+        t0 = time.perf_counter()
+        df = source.fetch()
+        info = {'status': 'source' if not source.cacheable else 'disabled', 'source': source.describe(),
+                'rows': int(len(df)), 'elapsed_ms': round((time.perf_counter() - t0) * 1000, 1)}
+        if not source.cacheable:
+            print(f"🗃️  {describe_cache_info(info)}")
+    else:
+        df, info = fetch_tariffs_cached(source.lambda_url, source.resource_id, cache_dir=cache_dir,
+                                        ttl=cache_ttl, offline=offline, source=source)
+        print(f"🗃️  {describe_cache_info(info)}")
+    if cache_info is not None:
+        cache_info.update(info)
+    if by_resource is not None:
+        by_resource[ids[0]] = df
+    return df
+
+def load_tariffs_async(**kwargs) -> Future:
+    """
+    load_tariffs(**kwargs) en un hilo de fondo. La descarga es casi toda espera de red, así
+    que se solapa con la lectura de oportunidades; `.result()` entrega el DataFrame (o
+    relanza el error de la descarga).
+    """
+    pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix='tarifas')
+    future = pool.submit(load_tariffs, **kwargs)
+    pool.shutdown(wait=False)
+    return future
+
+def prepare_tariffs(df_tariffs: pd.DataFrame, prov_map: Dict[str, str],
+                    from_month: str, to_month: str) -> pd.DataFrame:
+    """prep_tariffs + filtro de rango [from_month, to_month] por mes_key."""
+    df_tar = prep_tariffs(df_tariffs, canonical_provider_targets=list(prov_map.values()) + [PROVIDER_BIA])
+    start = from_month.strip()[:7]
+    end   = to_month.strip()[:7]
+    return df_tar[(df_tar['mes_key'] >= start) & (df_tar['mes_key'] <= end)].copy()
+
+def prepare_tariffs_stored(df_tariffs: pd.DataFrame, prov_map: Dict[str, str],
+                           from_month: str, to_month: str, store_dir: str = TARIFF_STORE_DIR,
+                           snapshot: Optional[str] = None,
+                           stats: Optional[Dict[str, Any]] = None) -> pd.DataFrame:
+    """
+    Mismo resultado que prepare_tariffs, desde el almacén particionado por mes
+    (src/tariff_store.py): solo se preparan los meses del rango que falten o cambiaron y solo
+    se leen esos. `snapshot` es el sha256 del snapshot de la caché de tarifas, si se conoce.
+    """
+    targets = list(prov_map.values()) + [PROVIDER_BIA]
+    signature = store_signature(list(dict.fromkeys(norm_text(t) for t in targets if t)), PROVIDER_MATCH_THRESHOLD)
+    store = TariffStore(store_dir, signature)
+    res = store.sync(df_tariffs, lambda raw: prep_tariffs(raw, canonical_provider_targets=targets),
+                     from_month, to_month, snapshot=snapshot)
+    add_stats(stats, partitions=len(res['months']), written=res['written'], reused=res['reused'],
+              scan_skipped=int(res['skipped_scan']))
+    if not res['months']:
+        return prep_tariffs(df_tariffs.iloc[:0], canonical_provider_targets=targets)
+    return store.read_months(res['months'])
+
+# --------- Ejecución por shards en un pool de procesos ---------
+_WORKER: Dict[str, Any] = {}
+
+LOOP_INDEX_FILE = 'loop_index.pkl'
+
+def _worker_init(state_dir: str, engine: str, city_map: Dict[str, str], prov_map: Dict[str, str],
+                 audit_level: str, audit_sample: int) -> None:
+    """Carga una sola vez por proceso el índice ya construido (memory-mapped o dicts del motor 'loop')."""
+    _WORKER.update(engine=engine, city_map=city_map, prov_map=prov_map,
+                   audit_level=audit_level, audit_sample=audit_sample, index=None)
+    if engine == 'vector':
+        _WORKER['index'] = TariffIndex.load(state_dir, mmap=True)
+    else:
+        with open(os.path.join(state_dir, LOOP_INDEX_FILE), 'rb') as f:
+            _WORKER['index'] = pickle.load(f)
+
+def _worker_run(shard: List[Dict[str, Any]]) -> Tuple[List[Dict[str, Any]], List[Dict[str, Any]], int, Dict[str, Any]]:
+    w = _WORKER
+    sink = ListSink(w['audit_level'], w['audit_sample']) if w['audit_level'] != 'off' else NullSink()
+    stats: Dict[str, Any] = {}
+    if w['engine'] == 'vector':
+        salida, _ = analizar_vectorizado(shard, None, w['city_map'], w['prov_map'], index=w['index'],
+                                         audit=sink, stats=stats)
+    else:
+        salida, _ = analizar_loop(shard, None, w['city_map'], w['prov_map'], audit=sink, stats=stats,
+                                  index=w['index'])
+    return salida, getattr(sink, 'rows', []), sink.rows_seen, stats
+
+def _shards(opps: List[Dict[str, Any]], n: int) -> List[List[Dict[str, Any]]]:
+    size = max(1, -(-len(opps) // n))
+    return [opps[i:i + size] for i in range(0, len(opps), size)]
+
+def analizar_paralelo(opps: List[Dict[str, Any]], df_tar: pd.DataFrame,
+                      city_map: Dict[str, str], prov_map: Dict[str, str],
+                      engine: str = 'loop', workers: int = 2, index_dir: Optional[str] = None,
+                      audit: Optional[AuditSink] = None,
+                      stats: Optional[Dict[str, Any]] = None) -> Tuple[List[Dict[str, Any]], Optional[List[Dict[str, Any]]]]:
+    """
+    Reparte las oportunidades en shards contiguos entre `workers` procesos. El índice de
+    tarifas se construye una sola vez aquí y cada proceso lo carga al arrancar: el
+    TariffIndex como .npy memory-mapped (motor 'vector', páginas compartidas entre procesos)
+    o los dicts de build_loop_index (motor 'loop'); los shards no reconstruyen nada.
+    Los shards se recogen en orden, así que salida y auditoría son idénticas a la corrida
+    en un solo proceso (ver tests/test_parallel.py).
+    """
+    sink = audit if audit is not None else ListSink()
+    with tempfile.TemporaryDirectory(prefix='tariff_workers_') as tmp:
+        t_index = time.perf_counter()
+        if engine == 'vector':
+            state_dir = index_dir or os.path.join(tmp, 'index')
+            TariffIndex.load_or_build(df_tar, state_dir)
+        else:
+            state_dir = tmp
+            with open(os.path.join(tmp, LOOP_INDEX_FILE), 'wb') as f:
+                pickle.dump(build_loop_index(df_tar), f, protocol=pickle.HIGHEST_PROTOCOL)
+        add_stats(stats, index_s=round(time.perf_counter() - t_index, 4))
+
+        salida: List[Dict[str, Any]] = []
+        init = (state_dir, engine, city_map, prov_map, sink.level, sink.sample_every)
+        # Varios shards por proceso para equilibrar carga sin perder el orden
+        with ProcessPoolExecutor(max_workers=workers, initializer=_worker_init, initargs=init) as pool:
+            for part, rows, seen, part_stats in pool.map(_worker_run, _shards(opps, workers * 4)):
+                salida.extend(part)
+                sink.extend(rows, seen)
+                add_stats(stats, **part_stats)
+    return salida, (sink.rows if audit is None else None)
+
+def analizar(opps: List[Dict[str, Any]], df_tar: pd.DataFrame,
+             city_map: Dict[str, str], prov_map: Dict[str, str],
+             engine: str = 'loop', index_dir: Optional[str] = None,
+             audit: Optional[AuditSink] = None,
+             workers: int = 1,
+             stats: Optional[Dict[str, Any]] = None) -> Tuple[List[Dict[str, Any]], Optional[List[Dict[str, Any]]]]:
+    """
+    Cruce de oportunidades con tarifas ya preparadas. Devuelve (salida, debug_rows).
+    Con workers > 1 se reparte entre procesos (analizar_paralelo). `stats` recibe los
+    contadores de búsqueda (ver analizar_loop).
+    """
+    if workers > 1 and len(opps) > 1:
+        return analizar_paralelo(opps, df_tar, city_map, prov_map, engine=engine, workers=workers,
+                                 index_dir=index_dir, audit=audit, stats=stats)
+    if engine == 'vector':
+        t_index = time.perf_counter()
+        index = TariffIndex.load_or_build(df_tar, index_dir)
+        add_stats(stats, index_s=round(time.perf_counter() - t_index, 4))
+        return analizar_vectorizado(opps, df_tar, city_map, prov_map, index=index, audit=audit, stats=stats)
+    return ENGINES[engine](opps, df_tar, city_map, prov_map, audit=audit, stats=stats)
+
+def analizar_incremental(opps: List[Dict[str, Any]], df_tar: pd.DataFrame,
+                         city_map: Dict[str, str], prov_map: Dict[str, str],
+                         from_month: str, to_month: str, cache: AnalysisCache,
+                         engine: str = 'loop', index_dir: Optional[str] = None,
+                         audit: Optional[AuditSink] = None, workers: int = 1,
+                         stats: Optional[Dict[str, Any]] = None) -> Tuple[List[Dict[str, Any]], Dict[str, int]]:
+    """
+    Como analizar(), pero solo cruza las oportunidades cuyo hash (registro + tarifas + rango +
+    mapeos) cambió desde la última corrida; las demás salen de la caché. El orden de salida es
+    el de `opps`. La auditoría solo recibe filas de las oportunidades recalculadas.
+    Devuelve (salida, {'total', 'reutilizadas', 'recalculadas'}).
+    """
+    ctx = context_hash(tariff_content_hash(df_tar), from_month, to_month, city_map, prov_map)
+    hashes, cached, todo = split_cached(opps, ctx, cache)
+    nuevos: List[Dict[str, Any]] = []
+    if todo:
+        pendientes = opps.take(todo) if isinstance(opps, Portfolio) else [opps[i] for i in todo]
+        nuevos, _ = analizar(pendientes, df_tar, city_map, prov_map,
+                             engine=engine, index_dir=index_dir, audit=audit, workers=workers, stats=stats)
+    salida: List[Dict[str, Any]] = [None] * len(opps)  # type: ignore[list-item]
+    for i, reg in cached.items():
+        salida[i] = reg
+    for i, reg in zip(todo, nuevos):
+        salida[i] = reg
+    if todo and cacheable_keys(opps):
+        cache.store_analysis([(opps[i]['oportunidad'], hashes[i], salida[i]) for i in todo])
+    return salida, {'total': len(opps), 'reutilizadas': len(cached), 'recalculadas': len(todo)}
+
+OUT_ANALYSIS = os.path.join('outputs', 'analisis_tarifas_por_frontera.json')
+OUT_DEBUG    = os.path.join('outputs', 'debug_tariff_lookup.json')
+
+def write_outputs(salida: List[Dict[str, Any]], debug_rows: Optional[List[Dict[str, Any]]],
+                  out_file: str = OUT_ANALYSIS, debug_file: str = OUT_DEBUG,
+                  output_format: str = 'json', compression: Optional[str] = None,
+                  json_backend: str = 'json') -> str:
+    """Escribe el análisis (y el debug, si se pasa) vía src/export.py; devuelve la ruta del análisis."""
+    out_file = write_records(salida, output_path(out_file, output_format, compression),
+                             output_format, compression, json_backend)
+    if debug_rows is not None:
+        write_records(debug_rows, output_path(debug_file, output_format, compression),
+                      output_format, compression, json_backend)
+    return out_file
+
+# --------- MAIN ---------
+def main():
+    args = parse_args()
+    args.nested_json = resolve_input(args.nested_json, NESTED_JSON)
+    metrics = RunMetrics('run_tariff_analysis', args.metrics_path, args.profile_dir)
+
+    city_map = load_mapping_json(args.cities_map, 'cities_mapping.json')
+    prov_map = load_mapping_json(args.providers_map, 'providers_mapping.json')
+
+    # Las tarifas se descargan en un hilo mientras se leen las oportunidades
+    cache_info: Dict[str, Any] = {}
+    by_resource: Dict[int, pd.DataFrame] = {}
+    tariffs_future = load_tariffs_async(
+        offline=args.offline, no_cache=args.no_cache, cache_ttl=args.cache_ttl, cache_dir=args.cache_dir,
+        cache_info=cache_info, resource_ids=args.resource_ids, by_resource=by_resource,
+        source=tariff_source_from_spec(args.tariff_source) if args.tariff_source else None)
+
+    with metrics.stage('load_opportunities') as st:
+        if args.columnar_dir:
+            opps = read_opportunities(args.columnar_dir, opp_columns=['oportunidad', 'cliente'],
+                                      frontier_columns=ANALYSIS_INPUT_FRONTIER_COLUMNS)
+        elif args.compact_model:
+            opps = load_opps_compact(args.nested_json)
+        else:
+            opps = load_opps_nested(args.nested_json)
+        st.update(rows_out=len(opps), compact=isinstance(opps, Portfolio))
+
+    with metrics.stage('load_tariffs') as st:
+        df_tariffs = tariffs_future.result()  # solo la espera que no alcanzó a solaparse
+        st.update(rows_out=len(df_tariffs), resources=len(args.resource_ids))
+    metrics.count('tariff_cache', cache_info)
+    if args.persist_db:
+        # Un snapshot por resource_id: --tariff-source sqlite:... los vuelve a leer y unir igual
+        with metrics.stage('persist_tariffs'):
+            con = init_db(args.persist_db)
+            snapshots = {rid: save_tariff_snapshot(con, df, resource_id=rid) for rid, df in by_resource.items()}
+            con.close()
+        print(f"🗄️  Tarifas en {args.persist_db}: "
+              + ', '.join(f"snapshot {s} (resource_id {rid})" for rid, s in snapshots.items()))
+    # FILTRO DE RANGO AQUÍ
+    with metrics.stage('prepare_tariffs') as st:
+        if args.tariff_store:
+            store_stats: Dict[str, Any] = {}
+            df_tar = prepare_tariffs_stored(df_tariffs, prov_map, args.from_month, args.to_month,
+                                            args.tariff_store, snapshot=cache_info.get('sha256'), stats=store_stats)
+            metrics.count('tariff_store', store_stats)
+        else:
+            df_tar = prepare_tariffs(df_tariffs, prov_map, args.from_month, args.to_month)
+        st.update(rows_in=len(df_tariffs), rows_out=len(df_tar))
+    if args.tariff_store:
+        print(f"🗄️  Almacén de tarifas: {store_stats['partitions']} meses "
+              f"({store_stats['written']} preparados, {store_stats['reused']} reutilizados)")
 
-    debug_file = os.path.join('outputs','debug_tariff_lookup.json')
-    with open(debug_file, 'w', encoding='utf-8') as f:
-        json.dump(debug_rows, f, ensure_ascii=False, indent=2)
+    cache = AnalysisCache(args.incremental_db) if args.incremental_db else None
+    lookup: Dict[str, Any] = {}
+    audit_path = args.audit_path
+    if audit_path is None and args.audit_format == 'json' and args.compression:
+        audit_path = output_path(OUT_DEBUG, 'json', args.compression)
+    with open_audit_sink(args.audit_format, args.audit_level, audit_path, args.audit_sample,
+                         args.json_backend) as audit, \
+            metrics.stage('analysis') as st:
+        if cache is not None:
+            salida, stats = analizar_incremental(opps, df_tar, city_map, prov_map, args.from_month, args.to_month,
+                                                 cache, engine=args.engine, index_dir=args.index_dir, audit=audit,
+                                                 workers=args.workers, stats=lookup)
+            metrics.count('incremental', stats)
+        else:
+            salida, _ = analizar(opps, df_tar, city_map, prov_map, engine=args.engine,
+                                 index_dir=args.index_dir, audit=audit, workers=args.workers, stats=lookup)
+        st.update(rows_in=len(opps), rows_out=lookup.get('cells', 0), engine=args.engine, workers=args.workers,
+                  index_s=lookup.pop('index_s', None))
+    matcher = {'hits': lookup.pop('matcher_hits', 0), 'misses': lookup.pop('matcher_misses', 0)}
+    metrics.count('lookup', lookup)
+    metrics.count('provider_matcher_cache', matcher)
+    metrics.count('audit', {'level': audit.level, 'rows_seen': audit.rows_seen, 'rows_written': audit.rows_written})
 
-    print(f'✅ Análisis: {out_file}')
-    print(f'🪪 Debug:    {debug_file}')
+    with metrics.stage('write_outputs') as st:
+        if args.columnar_dir:
+            write_analysis(salida, args.columnar_dir)
+        else:
+            out_analysis = write_outputs(salida, None, output_format=args.output_format,
+                                         compression=args.compression, json_backend=args.json_backend)
+        st['rows_in'] = len(salida)
+    print(f'✅ Análisis: {args.columnar_dir} (Arrow)' if args.columnar_dir else f'✅ Análisis: {out_analysis}')
+    if cache is not None:
+        # run_summary --incremental solo reutiliza resúmenes si lee exactamente estos dos archivos
+        json_out = not args.columnar_dir
+        cache.set_meta('nested_signature', file_signature(args.nested_json) if json_out else None)
+        cache.set_meta('analysis_signature', file_signature(out_analysis) if json_out else None)
+        cache.close()
+        print(f"♻️  Incremental: {stats['recalculadas']} recalculadas, "
+              f"{stats['reutilizadas']} reutilizadas de {stats['total']} oportunidades")
+    if audit.enabled:
+        target = getattr(audit, 'path', None) or getattr(audit, 'db_path', None)
+        print(f'🪪 Debug:    {target} ({audit.rows_written}/{audit.rows_seen} filas, nivel {audit.level})')
+    print(f'📈 Métricas: {metrics.write()}')
 
 if __name__ == '__main__':
     main()
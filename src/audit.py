@@ -0,0 +1,241 @@
+# src/audit.py
+"""
+Auditoría del cruce de tarifas (una fila por frontera × mes), escrita en streaming.
+
+Destinos:
+- JsonArraySink: el debug_tariff_lookup.json de siempre (mismos bytes que json.dump(indent=2)),
+  pero fila a fila, sin acumular la lista en memoria.
+- JsonlSink: una fila JSON por línea.
+- SqliteSink: tabla indexada en data/analisis.sqlite para consultar fallos al instante.
+Los dos primeros escriben con src/export.py: una ruta terminada en .gz (o .zst) sale comprimida.
+Escriben a un temporal junto al destino y lo renombran al cerrar; si la corrida falla (salida
+del `with` con excepción) el temporal se borra y queda el archivo de la corrida anterior.
+
+Niveles: off | misses (solo filas sin tarifa BIA o actual) | sampled (1 de cada N fronteras,
+con todos sus meses) | full.
+"""
+import abc
+import os
+import sqlite3
+import time
+import zlib
+from typing import Any, Dict, List, Optional
+
+try:
+    from src.export import RecordWriter, compression_for
+except Exception:
+    from export import RecordWriter, compression_for
+
+AUDIT_LEVELS = ('off', 'misses', 'sampled', 'full')
+AUDIT_FORMATS = ('json', 'jsonl', 'sqlite')
+AUDIT_TABLE = 'tariff_lookup_audit'
+
+AUDIT_COLUMNS = [
+    ('oportunidad', 'TEXT'),
+    ('frontier_name', 'TEXT'),
+    ('mes', 'TEXT'),
+    ('city_tarifas_usada', 'TEXT'),
+    ('nivel_comp_fr', 'TEXT'),
+    ('nivel_simple_fr', 'TEXT'),
+    ('nivel_variant_usado', 'TEXT'),
+    ('provider_calc', 'TEXT'),
+    ('provider_tarifas_mapeado', 'TEXT'),
+    ('provider_usado_para_actual', 'TEXT'),
+    ('fallback_usado', 'INTEGER'),
+    ('fallback_score', 'REAL'),
+    ('encontro_bia', 'INTEGER'),
+    ('encontro_actual', 'INTEGER'),
+]
+
+
+class AuditSink(abc.ABC):
+    """Base: filtra por nivel y delega la escritura en _write()."""
+
+    def __init__(self, level: str = 'full', sample_every: int = 100):
+        if level not in AUDIT_LEVELS:
+            raise ValueError(f'Nivel de auditoría inválido: {level}. Opciones: {AUDIT_LEVELS}')
+        self.level = level
+        self.sample_every = max(1, int(sample_every))
+        self.rows_seen = 0
+        self.rows_written = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.level != 'off'
+
+    def accepts(self, row: Dict[str, Any]) -> bool:
+        if self.level == 'full':
+            return True
+        if self.level == 'misses':
+            return not (row.get('encontro_bia') and row.get('encontro_actual'))
+        if self.level == 'sampled':
+            key = f"{row.get('oportunidad')}|{row.get('frontier_name')}".encode('utf-8')
+            return zlib.crc32(key) % self.sample_every == 0
+        return False
+
+    def write(self, row: Dict[str, Any]) -> None:
+        self.rows_seen += 1
+        if self.accepts(row):
+            self._write(row)
+            self.rows_written += 1
+
+    def extend(self, rows: List[Dict[str, Any]], seen: int) -> None:
+        """Filas ya filtradas por un sink del mismo nivel (p. ej. un ListSink en otro proceso)."""
+        self.rows_seen += seen
+        for row in rows:
+            self._write(row)
+        self.rows_written += len(rows)
+
+    @abc.abstractmethod
+    def _write(self, row: Dict[str, Any]) -> None:
+        ...
+
+    def close(self) -> None:
+        pass
+
+    def abort(self) -> None:
+        """Cierre tras un error: por defecto igual que close()."""
+        self.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, *exc):
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+
+
+class NullSink(AuditSink):
+    def __init__(self):
+        super().__init__('off')
+
+    def write(self, row: Dict[str, Any]) -> None:
+        pass
+
+    def extend(self, rows: List[Dict[str, Any]], seen: int) -> None:
+        pass
+
+    def _write(self, row: Dict[str, Any]) -> None:
+        pass
+
+
+class ListSink(AuditSink):
+    """Acumula en memoria (comportamiento histórico de debug_rows)."""
+
+    def __init__(self, level: str = 'full', sample_every: int = 100):
+        super().__init__(level, sample_every)
+        self.rows: List[Dict[str, Any]] = []
+
+    def _write(self, row: Dict[str, Any]) -> None:
+        self.rows.append(row)
+
+
+class JsonArraySink(AuditSink):
+    """Lista JSON con indent=2, escrita elemento a elemento."""
+
+    fmt = 'json'
+
+    def __init__(self, path: str, level: str = 'full', sample_every: int = 100, backend: str = 'json'):
+        super().__init__(level, sample_every)
+        self.path = path
+        self.tmp_path = f'{path}.tmp{os.getpid()}'
+        self._w = RecordWriter(self.tmp_path, self.fmt, compression_for(path), backend)
+        self._done = False
+
+    def _write(self, row: Dict[str, Any]) -> None:
+        self._w.write(row)
+
+    def close(self) -> None:
+        if self._done:
+            return
+        self._w.close()
+        os.replace(self.tmp_path, self.path)
+        self._done = True
+
+    def abort(self) -> None:
+        if self._done:
+            return
+        self._w.close()
+        try:
+            os.remove(self.tmp_path)
+        except FileNotFoundError:
+            pass
+        self._done = True
+
+
+class JsonlSink(JsonArraySink):
+    """Una fila JSON por línea."""
+
+    fmt = 'ndjson'
+
+
+class SqliteSink(AuditSink):
+    """
+    Tabla tariff_lookup_audit con índices en (oportunidad, mes), encontro_actual y fallback_usado.
+    Cada corrida reemplaza las filas anteriores salvo keep_history=True (se distinguen por run_id).
+    """
+
+    def __init__(self, db_path: str = os.path.join('data', 'analisis.sqlite'), level: str = 'full',
+                 sample_every: int = 100, batch_size: int = 5000, keep_history: bool = False):
+        super().__init__(level, sample_every)
+        self.db_path = db_path
+        self.batch_size = batch_size
+        self.run_id = time.strftime('%Y%m%dT%H%M%S')
+        self._batch: List[tuple] = []
+        os.makedirs(os.path.dirname(db_path) or '.', exist_ok=True)
+        self.con = sqlite3.connect(db_path)
+        cols = ', '.join(f'"{c}" {t}' for c, t in AUDIT_COLUMNS)
+        self.con.execute(f'CREATE TABLE IF NOT EXISTS {AUDIT_TABLE} (run_id TEXT, {cols})')
+        self.con.execute(f'CREATE INDEX IF NOT EXISTS ix_{AUDIT_TABLE}_opp_mes ON {AUDIT_TABLE} (oportunidad, mes)')
+        self.con.execute(f'CREATE INDEX IF NOT EXISTS ix_{AUDIT_TABLE}_actual ON {AUDIT_TABLE} (encontro_actual)')
+        self.con.execute(f'CREATE INDEX IF NOT EXISTS ix_{AUDIT_TABLE}_fallback ON {AUDIT_TABLE} (fallback_usado)')
+        if not keep_history:
+            self.con.execute(f'DELETE FROM {AUDIT_TABLE}')
+        self._insert = (f'INSERT INTO {AUDIT_TABLE} (run_id, {", ".join(c for c, _ in AUDIT_COLUMNS)}) '
+                        f'VALUES ({", ".join("?" * (len(AUDIT_COLUMNS) + 1))})')
+
+    def _write(self, row: Dict[str, Any]) -> None:
+        self._batch.append((self.run_id,) + tuple(row.get(c) for c, _ in AUDIT_COLUMNS))
+        if len(self._batch) >= self.batch_size:
+            self._flush()
+
+    def _flush(self) -> None:
+        if self._batch:
+            self.con.executemany(self._insert, self._batch)
+            self._batch = []
+
+    def close(self) -> None:
+        if self.con is None:
+            return
+        self._flush()
+        self.con.commit()
+        self.con.close()
+        self.con = None
+
+    def abort(self) -> None:
+        """Descarta las filas de esta corrida (y el borrado de las anteriores)."""
+        if self.con is None:
+            return
+        self.con.rollback()
+        self.con.close()
+        self.con = None
+
+
+def open_audit_sink(fmt: str = 'json', level: str = 'full', path: Optional[str] = None,
+                    sample_every: int = 100, backend: str = 'json', out_dir: str = 'outputs') -> AuditSink:
+    """
+    Crea el destino de auditoría según formato/nivel (NullSink si level == 'off').
+    `backend` es el serializador JSON de src/export.py ('json', 'orjson' o 'auto').
+    Sin `path`, json y jsonl escriben debug_tariff_lookup.json(l) en `out_dir`.
+    """
+    if level == 'off':
+        return NullSink()
+    if fmt == 'json':
+        return JsonArraySink(path or os.path.join(out_dir, 'debug_tariff_lookup.json'), level, sample_every, backend)
+    if fmt == 'jsonl':
+        return JsonlSink(path or os.path.join(out_dir, 'debug_tariff_lookup.jsonl'), level, sample_every, backend)
+    if fmt == 'sqlite':
+        return SqliteSink(path or os.path.join('data', 'analisis.sqlite'), level, sample_every)
+    raise ValueError(f'Formato de auditoría inválido: {fmt}. Opciones: {AUDIT_FORMATS}')
@@ -0,0 +1,149 @@
+# src/columnar.py
+"""
+Formato intermedio columnar entre etapas (Arrow IPC / Feather v2, comprimido con zstd).
+
+En lugar del JSON anidado con indent=2, cada etapa deja tablas planas en una carpeta:
+
+- opportunities.arrow     (run_opps_sql)         una fila por oportunidad (cabecera)
+- frontiers.arrow         (run_opps_sql)         una fila por frontera, con opp_id
+- analysis_frontiers.arrow (run_tariff_analysis) una fila por frontera analizada
+- analysis_months.arrow   (run_tariff_analysis) una fila por frontera × mes
+
+opp_id es la posición de la oportunidad en opportunities.arrow (y en la lista anidada);
+frontier_id, la posición de la frontera en frontiers.arrow. Los archivos se leen con
+memory map y solo las columnas pedidas. Los JSON quedan como artefactos finales.
+
+pyarrow es opcional: solo se importa al usar este formato.
+"""
+import math
+import os
+from typing import Any, Dict, List, Optional, Sequence
+
+COLUMNAR_DIR = os.path.join('outputs', 'columnar')
+COLUMNAR_COMPRESSION = 'zstd'
+
+OPPORTUNITIES_FILE = 'opportunities.arrow'
+FRONTIERS_FILE = 'frontiers.arrow'
+ANALYSIS_FRONTIERS_FILE = 'analysis_frontiers.arrow'
+ANALYSIS_MONTHS_FILE = 'analysis_months.arrow'
+
+# (columna, tipo) — 'str' | 'float' | 'int'
+OPPORTUNITY_FIELDS = [
+    ('oportunidad', 'str'), ('cliente', 'str'), ('inversion_cliente', 'float'), ('tarifa_b', 'float'),
+    ('opex', 'float'), ('capex', 'float'), ('consumo_total', 'float'), ('total_renting', 'float'),
+    ('ciudad', 'str'), ('provider_objetivo', 'str'),
+]
+FRONTIER_FIELDS = [
+    ('frontier_name', 'str'), ('consumo', 'float'), ('renting', 'float'), ('city', 'str'),
+    ('ciudad', 'str'), ('nivel_de_tension', 'str'), ('operador_de_red', 'str'),
+    ('provider_actual', 'str'), ('provider', 'str'),
+]
+ANALYSIS_FRONTIER_FIELDS = [
+    ('frontier_name', 'str'), ('city_calculadora', 'str'), ('city_tarifas_usada', 'str'),
+    ('nivel_de_tension', 'str'), ('provider_actual_calc_norm', 'str'), ('provider_actual_tarifas_norm', 'str'),
+]
+ANALYSIS_MONTH_FIELDS = [
+    ('mes', 'str'), ('tarifa_bia', 'float'), ('tarifa_actual', 'float'), ('consumo_kwh', 'float'),
+    ('costo_bia', 'float'), ('costo_actual', 'float'), ('delta_unit', 'float'),
+    ('ahorro_mensual_estimado', 'float'),
+]
+# Columnas que usa el cruce de tarifas (proyección al leer frontiers.arrow)
+ANALYSIS_INPUT_FRONTIER_COLUMNS = ['frontier_name', 'consumo', 'city', 'ciudad', 'nivel_de_tension',
+                                   'provider_actual', 'provider']
+
+
+def _pa():
+    try:
+        import pyarrow as pa
+        import pyarrow.feather as feather
+    except ImportError as e:
+        raise ImportError('El formato columnar requiere pyarrow (pip install pyarrow).') from e
+    return pa, feather
+
+
+def _schema(pa, fields):
+    types = {'str': pa.string(), 'float': pa.float64(), 'int': pa.int64()}
+    return pa.schema([(name, types[kind]) for name, kind in fields])
+
+
+def _as_str(value: Any) -> Optional[str]:
+    """Celda de una columna 'str': None/NaN -> null; otros tipos (p. ej. una llave numérica) -> str."""
+    if value is None or (isinstance(value, float) and math.isnan(value)):
+        return None
+    return value if isinstance(value, str) else str(value)
+
+
+def _write(path: str, columns: Dict[str, list], fields) -> None:
+    pa, feather = _pa()
+    columns = dict(columns)
+    for name, kind in fields:
+        if kind == 'str':
+            columns[name] = [_as_str(v) for v in columns[name]]
+    table = pa.Table.from_pydict(columns, schema=_schema(pa, fields))
+    feather.write_feather(table, path, compression=COLUMNAR_COMPRESSION)
+
+
+def read_table(columnar_dir: str, name: str, columns: Optional[Sequence[str]] = None):
+    """Tabla Arrow (memory-mapped) con solo las columnas pedidas."""
+    _, feather = _pa()
+    return feather.read_table(os.path.join(columnar_dir, name), columns=list(columns) if columns else None,
+                              memory_map=True)
+
+
+# --------- Oportunidades (salida de run_opps_sql) ---------
+def write_opportunities(opps: List[Dict[str, Any]], columnar_dir: str = COLUMNAR_DIR) -> str:
+    """Lista anidada -> opportunities.arrow + frontiers.arrow."""
+    os.makedirs(columnar_dir, exist_ok=True)
+    head = {name: [reg.get(name) for reg in opps] for name, _ in OPPORTUNITY_FIELDS}
+    _write(os.path.join(columnar_dir, OPPORTUNITIES_FILE), head, OPPORTUNITY_FIELDS)
+
+    fronteras = [(i, f) for i, reg in enumerate(opps) for f in reg.get('fronteras', [])]
+    cols: Dict[str, list] = {'opp_id': [i for i, _ in fronteras]}
+    cols.update({name: [f.get(name) for _, f in fronteras] for name, _ in FRONTIER_FIELDS})
+    _write(os.path.join(columnar_dir, FRONTIERS_FILE), cols, [('opp_id', 'int')] + FRONTIER_FIELDS)
+    return columnar_dir
+
+
+def read_opportunities(columnar_dir: str = COLUMNAR_DIR,
+                       opp_columns: Optional[Sequence[str]] = None,
+                       frontier_columns: Optional[Sequence[str]] = None) -> List[Dict[str, Any]]:
+    """
+    Reconstruye la lista anidada (solo con las columnas pedidas; por defecto todas) para los
+    motores de cruce, que trabajan con registros.
+    """
+    opp_columns = list(opp_columns or [n for n, _ in OPPORTUNITY_FIELDS])
+    frontier_columns = list(frontier_columns or [n for n, _ in FRONTIER_FIELDS])
+    head = read_table(columnar_dir, OPPORTUNITIES_FILE, opp_columns).to_pydict()
+    fr = read_table(columnar_dir, FRONTIERS_FILE, ['opp_id'] + frontier_columns).to_pydict()
+    n = len(head[opp_columns[0]]) if opp_columns else 0
+    opps: List[Dict[str, Any]] = [{c: head[c][i] for c in opp_columns} for i in range(n)]
+    for reg in opps:
+        reg['fronteras'] = []
+    for j, i in enumerate(fr['opp_id']):
+        opps[i]['fronteras'].append({c: fr[c][j] for c in frontier_columns})
+    return opps
+
+
+# --------- Análisis (salida de run_tariff_analysis) ---------
+def write_analysis(salida: List[Dict[str, Any]], columnar_dir: str = COLUMNAR_DIR) -> str:
+    """
+    Salida de analizar() -> analysis_frontiers.arrow + analysis_months.arrow.
+    opp_id es la posición en `salida`, que sigue el orden de opportunities.arrow.
+    """
+    os.makedirs(columnar_dir, exist_ok=True)
+    fronteras = [(i, f) for i, reg in enumerate(salida) for f in reg.get('fronteras', [])]
+    cols: Dict[str, list] = {'opp_id': [i for i, _ in fronteras]}
+    cols.update({name: [f.get(name) for _, f in fronteras] for name, _ in ANALYSIS_FRONTIER_FIELDS})
+    _write(os.path.join(columnar_dir, ANALYSIS_FRONTIERS_FILE), cols,
+           [('opp_id', 'int')] + ANALYSIS_FRONTIER_FIELDS)
+
+    filas = [(i, k, row) for k, (i, f) in enumerate(fronteras) for row in f.get('analisis_mensual', [])]
+    cols = {'opp_id': [i for i, _, _ in filas], 'frontier_id': [k for _, k, _ in filas]}
+    cols.update({name: [row.get(name) for _, _, row in filas] for name, _ in ANALYSIS_MONTH_FIELDS})
+    _write(os.path.join(columnar_dir, ANALYSIS_MONTHS_FILE), cols,
+           [('opp_id', 'int'), ('frontier_id', 'int')] + ANALYSIS_MONTH_FIELDS)
+    return columnar_dir
+
+
+def has_analysis(columnar_dir: str) -> bool:
+    return os.path.exists(os.path.join(columnar_dir, ANALYSIS_MONTHS_FILE))
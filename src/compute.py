@@ -1,9 +1,22 @@
 # src/compute.py
 """
 Funciones para unir datos de oportunidades con tarifas y calcular métricas comerciales.
+
+portfolio_financials evalúa toda la cartera a la vez sobre una matriz oportunidad × mes de
+ahorros: ahorro acumulado, mes de payback, VPN e TIR (ver run_summary.add_financials).
 """
+from typing import Dict, Tuple
+
+import numpy as np
 import pandas as pd
 
+DEFAULT_DISCOUNT_RATE = 0.12   # tasa de descuento anual efectiva para el VPN
+IRR_MAX_ITER = 100
+IRR_TOL = 1e-11
+# Tasas mensuales donde se buscan los cambios de signo del VPN para la TIR
+IRR_GRID = (-0.95, -0.8, -0.6, -0.4, -0.25, -0.15, -0.08, -0.04, -0.02, -0.01, 0.0, 0.01, 0.02,
+            0.04, 0.08, 0.15, 0.25, 0.4, 0.6, 1.0, 2.0, 4.0, 10.0, 30.0, 100.0, 1000.0)
+
 
 def merge_data(df_opp: pd.DataFrame, df_tariffs: pd.DataFrame, on_fields: dict) -> pd.DataFrame:
     """
@@ -50,3 +63,135 @@ def calculate_payback(df: pd.DataFrame, capex_col: str, opex_col: str, revenue_c
     total_cost = df[capex_col] + df[opex_col]
     df[output_col] = total_cost / df[revenue_col]
     return df
+
+
+# --------- Cartera (vectorizado) ---------
+def monthly_rate(annual_rate: float) -> float:
+    """Tasa mensual equivalente a una tasa anual efectiva."""
+    return (1.0 + float(annual_rate)) ** (1.0 / 12.0) - 1.0
+
+
+def _pv(flows: np.ndarray, rate: np.ndarray) -> np.ndarray:
+    """
+    Valor presente por fila de flujos al final de los meses 1..M. Suma secuencial (cumsum):
+    los ceros de relleno a la derecha no cambian el resultado de ninguna fila.
+    """
+    t = np.arange(1, flows.shape[1] + 1, dtype=np.float64)
+    disc = (1.0 + rate)[:, None] ** -t
+    return np.cumsum(flows * disc, axis=1)[:, -1] if flows.shape[1] else np.zeros(len(flows))
+
+
+def _poly_at(investment: np.ndarray, flows_t: np.ndarray, x: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    VPN(x) = -investment + Σ flows_t · x^t con x = 1/(1+r), y su derivada en x, por Horner
+    (flows_t es (M, N), del mes M al 1 se recorre de atrás hacia adelante). Los ceros de
+    relleno de los meses finales no alteran ninguna fila.
+    """
+    p = np.zeros(len(x))
+    d = np.zeros(len(x))
+    for col in flows_t[::-1]:
+        d = d * x + p
+        p = p * x + col
+    d = d * x + p
+    return p * x - investment, d
+
+
+def _poly_grid(investment: np.ndarray, flows: np.ndarray, xs: np.ndarray) -> np.ndarray:
+    """
+    VPN de cada fila de flows (N, M) en cada x de xs (G,) -> (N, G), por Horner elemento a
+    elemento: a diferencia de un producto matricial (BLAS), el valor de una fila no depende de
+    cuántas filas se evalúan juntas.
+    """
+    p = np.zeros((len(flows), len(xs)))
+    for col in flows.T[::-1]:
+        p *= xs
+        p += col[:, None]
+    return p * xs - investment[:, None]
+
+
+def irr_monthly(investment: np.ndarray, flows: np.ndarray,
+                max_iter: int = IRR_MAX_ITER, tol: float = IRR_TOL) -> np.ndarray:
+    """
+    TIR mensual de cada fila: -investment en t=0 y flows (N, M) al final de cada mes.
+
+    Con ahorros de signo mixto puede haber varias raíces: como numpy-financial, se toma la
+    más cercana a 0. Los cambios de signo se ubican en la grilla IRR_GRID y la raíz se refina
+    dentro de ese intervalo con Newton acotado (bisección si Newton se sale), vectorizado y
+    en x = 1/(1+r), donde el VPN es un polinomio; cada fila itera por su cuenta.
+    NaN si no aplica (sin inversión o sin ahorros positivos) o no hay raíz en la grilla.
+    """
+    investment = np.asarray(investment, dtype=np.float64)
+    flows = np.asarray(flows, dtype=np.float64)
+    out = np.full(len(flows), np.nan)
+    rows = np.flatnonzero((investment > 0) & (flows > 0).any(axis=1)) if flows.shape[1] else []
+    if not len(rows):
+        return out
+    inv, cf = investment[rows], flows[rows]
+
+    # Intervalo de la grilla con cambio de signo más cercano a r = 0
+    grid = np.asarray(IRR_GRID)
+    vals = _poly_grid(inv, cf, 1.0 / (1.0 + grid))  # (N, G); aquí solo importa el signo
+    exact = vals == 0.0
+    change = np.signbit(vals[:, :-1]) != np.signbit(vals[:, 1:])
+    dist = np.minimum(np.abs(grid[:-1]), np.abs(grid[1:]))
+    pick = np.argmin(np.where(change, dist, np.inf), axis=1)
+    found = change[np.arange(len(rows)), pick]
+
+    hit = exact.any(axis=1)
+    best_exact = np.argmin(np.where(exact, np.abs(grid), np.inf), axis=1)
+    use_exact = hit & (~found | (np.abs(grid[best_exact]) <= dist[pick]))
+    out[rows[use_exact]] = grid[best_exact[use_exact]]
+
+    sel = found & ~use_exact
+    rows, inv, pick = rows[sel], inv[sel], pick[sel]
+    flows_t = np.ascontiguousarray(cf[sel].T)
+    lo, hi = 1.0 / (1.0 + grid[pick + 1]), 1.0 / (1.0 + grid[pick])   # x decrece con r
+    f_lo, f_hi = vals[sel, pick + 1], vals[sel, pick]
+    neg_lo = np.signbit(f_lo)
+    x = np.clip(lo + (hi - lo) * f_lo / (f_lo - f_hi), lo, hi)   # secante como punto de partida
+    for _ in range(max_iter):
+        if not len(rows):
+            break
+        f, df = _poly_at(inv, flows_t, x)
+        at_lo = np.signbit(f) == neg_lo
+        lo = np.where(at_lo, x, lo)
+        hi = np.where(at_lo, hi, x)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            step = f / df
+        nx = x - step
+        inside = (nx >= lo) & (nx <= hi)
+        nx = np.where(inside, nx, 0.5 * (lo + hi))
+        done = (f == 0.0) | (inside & (np.abs(step) <= tol * x)) | (hi - lo <= tol * x)
+        out[rows[done]] = 1.0 / np.where(f == 0.0, x, nx)[done] - 1.0
+        keep = ~done
+        if not keep.all():
+            rows, inv, lo, hi, neg_lo = rows[keep], inv[keep], lo[keep], hi[keep], neg_lo[keep]
+            flows_t = flows_t[:, keep]
+        x = nx[keep]
+    return out
+
+
+def portfolio_financials(investment: np.ndarray, savings: np.ndarray,
+                         annual_rate: float = DEFAULT_DISCOUNT_RATE) -> Dict[str, np.ndarray]:
+    """
+    Métricas financieras de N oportunidades a la vez.
+
+    investment (N,) inversión del cliente (NaN o <= 0: sin payback ni TIR);
+    savings (N, M) ahorro de cada mes, alineado a la izquierda (mes 1 = primera columna,
+    ceros en los meses sin datos y de relleno al final). Devuelve:
+      'acumulado' (N, M)  ahorro acumulado mes a mes,
+      'payback'   (N,)    mes (1..M) en que el acumulado alcanza la inversión, 0 si no llega,
+      'vpn'       (N,)    -inversión + valor presente de los ahorros a annual_rate,
+      'tir'       (N,)    TIR anual efectiva (NaN si no aplica).
+    """
+    investment = np.asarray(investment, dtype=np.float64)
+    savings = np.nan_to_num(np.asarray(savings, dtype=np.float64), nan=0.0)
+    acumulado = np.cumsum(savings, axis=1)
+    inv_ok = np.isfinite(investment) & (investment > 0)
+    reached = (acumulado >= investment[:, None]) & inv_ok[:, None]
+    payback = (np.where(reached.any(axis=1), reached.argmax(axis=1) + 1, 0) if reached.shape[1]
+               else np.zeros(len(investment), dtype=np.int64))
+    rate = np.full(len(investment), monthly_rate(annual_rate))
+    vpn = _pv(savings, rate) - np.where(inv_ok, investment, 0.0)
+    tir = (1.0 + irr_monthly(np.where(inv_ok, investment, 0.0), savings)) ** 12 - 1.0
+    return {'acumulado': acumulado, 'payback': payback, 'vpn': vpn, 'tir': tir}
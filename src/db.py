@@ -1,24 +1,237 @@
 # src/db.py
 """
 Capa de persistencia usando SQLite para alojar oportunidades y tarifas.
+
+- Esquema declarado (ensure_schema) con índices en la llave de búsqueda de tarifas
+  (mes, city, nivel, provider) y en la oportunidad.
+- WAL: los lectores no se bloquean mientras se escribe.
+- Oportunidades: upsert por lotes (executemany) con llave (oportunidad, frontera); una
+  oportunidad reimportada reemplaza todas sus fronteras (las que ya no vienen se borran).
+- Tarifas: cada snapshot distinto es una partición versionada (snapshot_id) de un
+  resource_id; un snapshot con el mismo contenido que uno ya guardado para ese resource_id
+  no se vuelve a escribir.
 """
+import hashlib
 import os
 import sqlite3
+import time
+from typing import Optional
+
 import pandas as pd
 
-def init_db(db_path: str = 'data/analisis.sqlite') -> sqlite3.Connection:
-    os.makedirs(os.path.dirname(db_path), exist_ok=True)
-    con = sqlite3.connect(db_path)
+DEFAULT_DB_PATH = os.path.join('data', 'analisis.sqlite')
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS opportunity_frontiers (
+    oportunidad            TEXT NOT NULL,
+    frontier_key           TEXT NOT NULL,
+    frontier_name          TEXT,
+    cliente                TEXT,
+    region                 TEXT,
+    ciudad                 TEXT,
+    ciiu                   TEXT,
+    nivel_tension          TEXT,
+    propiedad_equipos      TEXT,
+    operador_red           TEXT,
+    comercializador_actual TEXT,
+    kwh_mes                REAL,
+    modem_medidor          REAL,
+    tarifa_b               REAL,
+    opex                   REAL,
+    capex                  REAL,
+    updated_at             TEXT,
+    PRIMARY KEY (oportunidad, frontier_key)
+);
+CREATE INDEX IF NOT EXISTS ix_opportunity_frontiers_oportunidad ON opportunity_frontiers (oportunidad);
+
+CREATE TABLE IF NOT EXISTS tariff_snapshots (
+    snapshot_id  INTEGER PRIMARY KEY AUTOINCREMENT,
+    resource_id  INTEGER,
+    sha256       TEXT NOT NULL UNIQUE,
+    rows         INTEGER,
+    created_at   TEXT
+);
+
+CREATE TABLE IF NOT EXISTS tariff_rates (
+    snapshot_id      INTEGER NOT NULL REFERENCES tariff_snapshots (snapshot_id),
+    mes              TEXT,
+    provider         TEXT,
+    city             TEXT,
+    nivel_de_tension TEXT,
+    tarifa           REAL
+);
+CREATE INDEX IF NOT EXISTS ix_tariff_rates_lookup
+    ON tariff_rates (snapshot_id, mes, city, nivel_de_tension, provider);
+"""
+
+# Columna del CSV de oportunidades -> columna de opportunity_frontiers
+OPPORTUNITY_COLUMNS = {
+    'Calculadora Payback/Número de Cuenta': 'frontier_name',
+    'Cliente': 'cliente',
+    'Calculadora Payback/Region': 'region',
+    'Calculadora Payback/Ciudad': 'ciudad',
+    'Calculadora Payback/Ciiu': 'ciiu',
+    'Calculadora Payback/Nivel Tension': 'nivel_tension',
+    'Calculadora Payback/Propiedad de Equipos': 'propiedad_equipos',
+    'Calculadora Payback/Operador de Red': 'operador_red',
+    'Calculadora Payback/Comercializador Actual': 'comercializador_actual',
+    'Calculadora Payback/kWh Promedio / Mes': 'kwh_mes',
+    'Calculadora Payback/Modem & Medidor': 'modem_medidor',
+    'Tarifa B': 'tarifa_b',
+    'Costo Total Opex Oportunity': 'opex',
+    'Costo Total Capex Oportunity': 'capex',
+}
+TARIFF_COLUMNS = ['mes', 'provider', 'city', 'nivel_de_tension', 'tarifa']
+
+
+def init_db(db_path: str = DEFAULT_DB_PATH, wal: bool = True) -> sqlite3.Connection:
+    os.makedirs(os.path.dirname(db_path) or '.', exist_ok=True)
+    con = sqlite3.connect(db_path, timeout=30)
+    if wal:
+        con.execute('PRAGMA journal_mode=WAL')
+        con.execute('PRAGMA synchronous=NORMAL')
+    ensure_schema(con)
     return con
 
+
+def ensure_schema(con: sqlite3.Connection) -> None:
+    con.executescript(SCHEMA)
+    con.commit()
+
+
+def _now() -> str:
+    return time.strftime('%Y-%m-%dT%H:%M:%S')
+
+
+def _none_if_na(v):
+    return None if pd.isna(v) else v
+
+
+def _chunks(rows: list, size: int):
+    for i in range(0, len(rows), size):
+        yield rows[i:i + size]
+
+
+# --------- Oportunidades ---------
+def upsert_opportunities(con: sqlite3.Connection, df_opp: pd.DataFrame, batch_size: int = 5000) -> int:
+    """
+    Inserta o actualiza filas de frontera con llave (oportunidad, frontier_key). Las fronteras
+    guardadas de una oportunidad presente en df_opp que ya no vienen en él se borran.
+    df_opp: salida de load_opportunities, idealmente con las columnas de identidad ya
+    rellenadas hacia adelante (run_opps_sql.ffill_identity); 'Oportunidad' se rellena aquí.
+    frontier_key es el número de cuenta o, si viene vacío, '#<n>' (posición dentro de la oportunidad);
+    una cuenta repetida en la misma oportunidad queda como 'cuenta#2', 'cuenta#3', ...
+    Devuelve las filas guardadas.
+    """
+    if df_opp.empty:
+        return 0
+    opp = df_opp['Oportunidad'].ffill().fillna('').astype(str)
+    present = [c for c in OPPORTUNITY_COLUMNS if c in df_opp.columns]
+    name_col = 'Calculadora Payback/Número de Cuenta'
+    if name_col in df_opp.columns:
+        names = df_opp[name_col].map(lambda x: '' if pd.isna(x) else ' '.join(str(x).split()))
+    else:
+        names = pd.Series('', index=df_opp.index)
+    ordinal = opp.groupby(opp, sort=False).cumcount()
+    key = names.where(names != '', '#' + ordinal.astype(str))
+    # Cuenta repetida dentro de la oportunidad: 'cuenta', 'cuenta#2', ... (no se fusionan)
+    repeat = key.groupby([opp, key], sort=False).cumcount()
+    key = key.where(repeat == 0, key + '#' + (repeat + 1).astype(str))
+
+    db_cols = ['oportunidad', 'frontier_key'] + [OPPORTUNITY_COLUMNS[c] for c in present] + ['updated_at']
+    values = [opp.tolist(), key.tolist()] + [[_none_if_na(v) for v in df_opp[c].tolist()] for c in present]
+    now = _now()
+    rows = [r + (now,) for r in zip(*values)]
+
+    updates = ', '.join(f'{c}=excluded.{c}' for c in db_cols[2:])
+    sql = (f'INSERT INTO opportunity_frontiers ({", ".join(db_cols)}) '
+           f'VALUES ({", ".join("?" * len(db_cols))}) '
+           f'ON CONFLICT (oportunidad, frontier_key) DO UPDATE SET {updates}')
+    with con:
+        con.executemany('DELETE FROM opportunity_frontiers WHERE oportunidad = ?',
+                        [(o,) for o in opp.unique().tolist()])
+        before = con.total_changes
+        for batch in _chunks(rows, batch_size):
+            con.executemany(sql, batch)
+        stored = con.total_changes - before
+    return stored
+
+
+# --------- Tarifas (snapshots versionados) ---------
+def tariff_content_hash(df_tariffs: pd.DataFrame) -> str:
+    cols = [c for c in TARIFF_COLUMNS if c in df_tariffs.columns]
+    h = pd.util.hash_pandas_object(df_tariffs[cols].reset_index(drop=True), index=False).to_numpy()
+    return hashlib.sha256(h.tobytes()).hexdigest()
+
+
+def save_tariff_snapshot(con: sqlite3.Connection, df_tariffs: pd.DataFrame,
+                         resource_id: Optional[int] = None, batch_size: int = 5000) -> int:
+    """
+    Guarda las tarifas como una partición nueva y devuelve su snapshot_id.
+    Si ya existe un snapshot con el mismo contenido para el mismo resource_id, devuelve ese
+    id sin reescribir nada (dos recursos con la misma tabla quedan en snapshots propios).
+    """
+    sha = tariff_content_hash(df_tariffs)
+    if resource_id is not None:
+        sha = hashlib.sha256(f'{resource_id}|{sha}'.encode('utf-8')).hexdigest()
+    found = con.execute('SELECT snapshot_id FROM tariff_snapshots WHERE sha256 = ?', (sha,)).fetchone()
+    if found:
+        return int(found[0])
+    cols = [c for c in TARIFF_COLUMNS if c in df_tariffs.columns]
+    with con:
+        cur = con.execute(
+            'INSERT INTO tariff_snapshots (resource_id, sha256, rows, created_at) VALUES (?, ?, ?, ?)',
+            (resource_id, sha, int(len(df_tariffs)), _now()),
+        )
+        snapshot_id = int(cur.lastrowid)
+        values = [
+            [_none_if_na(v) if c == 'tarifa' else (None if pd.isna(v) else str(v)) for v in df_tariffs[c].tolist()]
+            for c in cols
+        ]
+        rows = [(snapshot_id,) + r for r in zip(*values)]
+        sql = (f'INSERT INTO tariff_rates (snapshot_id, {", ".join(cols)}) '
+               f'VALUES ({", ".join("?" * (len(cols) + 1))})')
+        for batch in _chunks(rows, batch_size):
+            con.executemany(sql, batch)
+    return snapshot_id
+
+
+def latest_tariff_snapshot(con: sqlite3.Connection, resource_id: Optional[int] = None) -> Optional[int]:
+    if resource_id is None:
+        row = con.execute('SELECT MAX(snapshot_id) FROM tariff_snapshots').fetchone()
+    else:
+        row = con.execute('SELECT MAX(snapshot_id) FROM tariff_snapshots WHERE resource_id = ?',
+                          (resource_id,)).fetchone()
+    return int(row[0]) if row and row[0] is not None else None
+
+
+def load_tariff_snapshot(con: sqlite3.Connection, snapshot_id: Optional[int] = None,
+                         resource_id: Optional[int] = None) -> pd.DataFrame:
+    """Tarifas de un snapshot (por defecto el más reciente) con las columnas originales."""
+    if snapshot_id is None:
+        snapshot_id = latest_tariff_snapshot(con, resource_id)
+    if snapshot_id is None:
+        raise LookupError('No hay snapshots de tarifas guardados en la base.')
+    return pd.read_sql_query(
+        f'SELECT {", ".join(TARIFF_COLUMNS)} FROM tariff_rates WHERE snapshot_id = ? ORDER BY rowid',
+        con, params=(snapshot_id,),
+    )
+
+
 def persist_tables(con: sqlite3.Connection,
                    df_opp: pd.DataFrame,
-                   df_tariffs: pd.DataFrame | None = None) -> None:
-    # Oportunidades
-    df_opp.to_sql('opportunities', con, if_exists='replace', index=False)
-    # Tarifas (opcional)
+                   df_tariffs: Optional[pd.DataFrame] = None,
+                   resource_id: Optional[int] = None) -> Optional[int]:
+    """
+    Oportunidades (upsert) y, si se pasan, tarifas (snapshot versionado). Crea el esquema si
+    la conexión no viene de init_db. Devuelve el snapshot_id de tarifas o None.
+    """
+    ensure_schema(con)
+    upsert_opportunities(con, df_opp)
     if df_tariffs is not None:
-        df_tariffs.to_sql('tariffs', con, if_exists='replace', index=False)
+        return save_tariff_snapshot(con, df_tariffs, resource_id=resource_id)
+    return None
+
 
 def query_to_df(con: sqlite3.Connection, sql: str) -> pd.DataFrame:
     return pd.read_sql_query(sql, con)
@@ -1,32 +1,304 @@
 # src/export.py
 """
-Funciones para exportar resultados a archivos o formatos requeridos.
+Capa única de escritura (y lectura) de las salidas JSON de las etapas.
+
+Formatos (--output-format):
+- json:    lista con indent=2, los mismos bytes que json.dump(..., ensure_ascii=False, indent=2),
+- compact: la misma lista sin sangría ni espacios,
+- ndjson:  un registro por línea (archivo .ndjson) con los separadores de json.dumps por
+           defecto, como las filas de auditoría .jsonl de siempre, escrito a medida que llegan.
+Compresión (--compress): gzip (.gz) o zstd (.zst, requiere el paquete zstandard).
+Backend (--json-backend): json (stdlib, por defecto) u orjson (opcional, mucho más rápido;
+mismos datos, aunque puede escribir algunos flotantes distinto, p. ej. 1e-5 en vez de 1e-05,
+y NaN como null). 'auto' usa orjson si está instalado.
+
+Cada registro se serializa una sola vez y va directo al archivo (sin armar el texto completo).
+Los lectores (load_json / iter_records) detectan la compresión por el contenido y el formato por
+la extensión (.ndjson / .jsonl: una línea por registro), así que una etapa lee lo que escribió la
+anterior en cualquier combinación. resolve_input ubica la variante (.json, .ndjson, .gz, .zst)
+más reciente de una ruta de salida por defecto; una ruta explícita se usa tal cual.
 """
+import gzip
+import io
 import json
 import os
+from typing import Any, BinaryIO, Iterable, Iterator, Optional
+
 import pandas as pd
 
+EXPORT_FORMATS = ('json', 'compact', 'ndjson')
+COMPRESSIONS = ('gzip', 'zstd')
+JSON_BACKENDS = ('json', 'orjson', 'auto')
+COMPRESSION_SUFFIX = {'gzip': '.gz', 'zstd': '.zst'}
+FORMAT_SUFFIX = {'json': '.json', 'compact': '.json', 'ndjson': '.ndjson'}
+GZIP_MAGIC = b'\x1f\x8b'
+ZSTD_MAGIC = b'\x28\xb5\x2f\xfd'
+WRITE_BUFFER = 1 << 20
+
+
+def _zstd():
+    try:
+        import zstandard
+    except ImportError as e:
+        raise ImportError('La compresión zstd requiere zstandard (pip install zstandard).') from e
+    return zstandard
+
+
+def _orjson():
+    try:
+        import orjson
+    except ImportError as e:
+        raise ImportError('El backend orjson requiere orjson (pip install orjson).') from e
+    return orjson
+
+
+def resolve_backend(backend: Optional[str] = 'json') -> str:
+    """'json' | 'orjson' | 'auto' (orjson si está instalado) -> backend efectivo."""
+    backend = backend or 'json'
+    if backend not in JSON_BACKENDS:
+        raise ValueError(f'Backend JSON inválido: {backend}. Opciones: {JSON_BACKENDS}')
+    if backend == 'auto':
+        try:
+            _orjson()
+            return 'orjson'
+        except ImportError:
+            return 'json'
+    return backend
+
+
+def _check_format(fmt: str) -> str:
+    if fmt not in EXPORT_FORMATS:
+        raise ValueError(f'Formato de salida inválido: {fmt}. Opciones: {EXPORT_FORMATS}')
+    return fmt
+
+
+def dumps(obj: Any, fmt: str = 'json', backend: Optional[str] = 'json') -> bytes:
+    """obj en UTF-8: con indent=2 en 'json', sin espacios en 'compact' y en una línea en 'ndjson'."""
+    indent = _check_format(fmt) == 'json'
+    if resolve_backend(backend) == 'orjson':
+        orjson = _orjson()
+        option = orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY
+        return orjson.dumps(obj, option=option | orjson.OPT_INDENT_2 if indent else option)
+    if indent:
+        return json.dumps(obj, ensure_ascii=False, indent=2).encode('utf-8')
+    if fmt == 'ndjson':
+        return json.dumps(obj, ensure_ascii=False).encode('utf-8')
+    return json.dumps(obj, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+
+
+# --------- Rutas y archivos ---------
+def compression_for(path: str) -> Optional[str]:
+    """Compresión según la extensión (.gz / .zst) o None."""
+    for name, suffix in COMPRESSION_SUFFIX.items():
+        if path.endswith(suffix):
+            return name
+    return None
+
+
+def _stem(path: str) -> str:
+    for suffix in COMPRESSION_SUFFIX.values():
+        if path.endswith(suffix):
+            path = path[:-len(suffix)]
+    for suffix in ('.json', '.ndjson', '.jsonl'):
+        if path.endswith(suffix):
+            return path[:-len(suffix)]
+    return path
+
+
+def output_path(path: str, fmt: str = 'json', compression: Optional[str] = None) -> str:
+    """outputs/x.json -> outputs/x.ndjson.gz según formato y compresión (json/compact: .json)."""
+    if compression and compression not in COMPRESSIONS:
+        raise ValueError(f'Compresión inválida: {compression}. Opciones: {COMPRESSIONS}')
+    return _stem(path) + FORMAT_SUFFIX[_check_format(fmt)] + COMPRESSION_SUFFIX.get(compression, '')
+
+
+def find_output(path: str) -> str:
+    """
+    La variante existente más reciente de `path` (.json / .ndjson, sin comprimir, .gz o .zst),
+    o `path` tal cual si no hay ninguna.
+    """
+    stem = _stem(path)
+    candidates = [stem + fs + cs for fs in ('.json', '.ndjson')
+                  for cs in ('',) + tuple(COMPRESSION_SUFFIX.values())]
+    existing = [p for p in dict.fromkeys([path] + candidates) if os.path.exists(p)]
+    return max(existing, key=os.path.getmtime) if existing else path
+
+
+def resolve_input(path: Optional[str], default: str) -> str:
+    """Entrada de una etapa: `path` tal cual si se indicó; si no, find_output(default)."""
+    return path if path else find_output(default)
+
+
+def is_ndjson(path: str) -> bool:
+    """Formato de una línea por registro según la extensión (.ndjson / .jsonl, comprimido o no)."""
+    for suffix in COMPRESSION_SUFFIX.values():
+        if path.endswith(suffix):
+            path = path[:-len(suffix)]
+    return path.endswith(('.ndjson', '.jsonl'))
+
+
+def open_output(path: str, compression: Optional[str] = None) -> BinaryIO:
+    """Archivo binario de escritura (con búfer grande), comprimido si se pide."""
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    compression = compression or compression_for(path)
+    if compression == 'gzip':
+        return gzip.open(path, 'wb', compresslevel=6)
+    if compression == 'zstd':
+        zstandard = _zstd()
+        return zstandard.ZstdCompressor(level=3).stream_writer(open(path, 'wb'), closefd=True)
+    if compression:
+        raise ValueError(f'Compresión inválida: {compression}. Opciones: {COMPRESSIONS}')
+    return open(path, 'wb', buffering=WRITE_BUFFER)
 
+
+def open_input(path: str) -> BinaryIO:
+    """Archivo binario de lectura; gzip y zstd se detectan por los primeros bytes."""
+    f = open(path, 'rb')
+    magic = f.read(4)
+    f.seek(0)
+    if magic.startswith(GZIP_MAGIC):
+        return gzip.GzipFile(fileobj=f, mode='rb')
+    if magic == ZSTD_MAGIC:
+        return _zstd().ZstdDecompressor().stream_reader(f, closefd=True)
+    return f
+
+
+def add_export_args(p) -> None:
+    """Opciones de salida comunes a las etapas (--output-format, --compress, --json-backend)."""
+    p.add_argument("--output-format", dest="output_format", choices=EXPORT_FORMATS, default="json",
+                   help="Formato de los JSON de salida: json (indent=2), compact (sin espacios) o ndjson (uno por línea)")
+    p.add_argument("--compress", dest="compression", choices=COMPRESSIONS, default=None,
+                   help="Comprimir las salidas JSON (gzip -> .gz; zstd -> .zst, requiere zstandard)")
+    p.add_argument("--json-backend", dest="json_backend", choices=JSON_BACKENDS, default="json",
+                   help="Serializador: json (stdlib), orjson (más rápido, opcional) o auto")
+
+
+# --------- Escritura ---------
+def encode_record(rec: Any, fmt: str = 'json', backend: Optional[str] = 'json') -> bytes:
+    """Un registro tal como queda dentro de la salida (en 'json', con la sangría de la lista)."""
+    data = dumps(rec, fmt, backend)
+    return data.replace(b'\n', b'\n  ') if fmt == 'json' else data
+
+
+class RecordWriter:
+    """
+    Escribe una lista de registros a medida que llegan. En formato 'json' el archivo queda
+    con los mismos bytes que json.dump(lista, indent=2); 'compact' es la lista sin espacios y
+    'ndjson' una línea por registro. write_encoded() recibe registros ya serializados con
+    encode_record() (p. ej. para reordenarlos antes, como el resumen en streaming).
+    """
+
+    def __init__(self, path: str, fmt: str = 'json', compression: Optional[str] = None,
+                 backend: Optional[str] = 'json'):
+        self.path = path
+        self.fmt = _check_format(fmt)
+        self.backend = resolve_backend(backend)
+        self.count = 0
+        self._f = open_output(path, compression)
+        self._closed = False
+
+    def write_encoded(self, data: bytes) -> None:
+        if self.fmt == 'ndjson':
+            self._f.write(data + b'\n')
+        elif self.fmt == 'json':
+            self._f.write((b',\n  ' if self.count else b'[\n  ') + data)
+        else:
+            self._f.write((b',' if self.count else b'[') + data)
+        self.count += 1
+
+    def write(self, rec: Any) -> None:
+        self.write_encoded(encode_record(rec, self.fmt, self.backend))
+
+    def write_many(self, records: Iterable[Any]) -> int:
+        for rec in records:
+            self.write(rec)
+        return self.count
+
+    def close(self) -> None:
+        if self._closed:
+            return
+        if self.fmt == 'json':
+            self._f.write(b'\n]' if self.count else b'[]')
+        elif self.fmt == 'compact':
+            self._f.write(b']' if self.count else b'[]')
+        self._f.close()
+        self._closed = True
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def write_records(records: Iterable[Any], path: str, fmt: str = 'json', compression: Optional[str] = None,
+                  backend: Optional[str] = 'json') -> str:
+    """Lista (o iterable) de registros -> archivo; devuelve la ruta escrita."""
+    with RecordWriter(path, fmt, compression, backend) as w:
+        w.write_many(records)
+    return path
+
+
+def write_json(obj: Any, path: str, fmt: str = 'json', compression: Optional[str] = None,
+               backend: Optional[str] = 'json') -> str:
+    """Un objeto cualquiera; en 'ndjson' una lista va registro a registro y lo demás en una línea."""
+    if isinstance(obj, list):
+        return write_records(obj, path, fmt, compression, backend)
+    with open_output(path, compression) as f:
+        f.write(dumps(obj, fmt, backend))
+        if fmt == 'ndjson':
+            f.write(b'\n')
+    return path
+
+
+# --------- Lectura ---------
+def iter_records(path: str) -> Iterator[Any]:
+    """Registros de una lista JSON o de un NDJSON (comprimidos o no; ver is_ndjson), uno a la vez."""
+    try:
+        from src.srcload import iter_json_array
+    except Exception:
+        from srcload import iter_json_array
+    with open_input(path) as raw:
+        f = io.BufferedReader(raw) if not hasattr(raw, 'peek') else raw
+        if not is_ndjson(path):
+            yield from iter_json_array(io.TextIOWrapper(f, encoding='utf-8'))
+            return
+        for line in f:
+            if line.strip():
+                yield json.loads(line)
+
+
+def load_json(path: str) -> Any:
+    """Contenido de un JSON o NDJSON (comprimidos o no; ver is_ndjson); un NDJSON se devuelve como lista."""
+    with open_input(path) as f:
+        data = f.read()
+    if is_ndjson(path):
+        return [json.loads(line) for line in data.splitlines() if line.strip()]
+    return json.loads(data)
+
+
+# --------- DataFrames ---------
 def export_to_json(df: pd.DataFrame, output_path: str,
-                   orient: str = 'records', indent: int = 2) -> None:
+                   orient: str = 'records', indent: int = 2,
+                   fmt: Optional[str] = None, compression: Optional[str] = None) -> str:
     """
-    Exporta un DataFrame a un archivo JSON.
+    Exporta un DataFrame a un archivo JSON en una sola pasada (df.to_json directo al archivo).
 
     Parámetros:
     - df: DataFrame a exportar.
     - output_path: Ruta del archivo JSON de salida.
     - orient: Formato de to_json (por defecto 'records').
-    - indent: Espacios para sangría en el JSON.
+    - indent: Espacios para sangría en el JSON (None o 0 = compacto).
+    - fmt: 'ndjson' para una fila por línea (solo orient='records'); 'compact' = sin sangría.
+    - compression: 'gzip' o 'zstd' (por defecto, según la extensión).
     """
-    # Crear directorio si no existe
-    os.makedirs(os.path.dirname(output_path), exist_ok=True)
-
-    # Convertir DataFrame a lista de dicts
-    data = json.loads(df.to_json(orient=orient, force_ascii=False))
-
-    # Guardar JSON en archivo
-    with open(output_path, 'w', encoding='utf-8') as f:
-        json.dump(data, f, ensure_ascii=False, indent=indent)
+    if fmt == 'ndjson':
+        text = df.to_json(orient='records', lines=True, force_ascii=False)
+    else:
+        text = df.to_json(orient=orient, force_ascii=False, indent=None if fmt == 'compact' else indent)
+    with open_output(output_path, compression) as f:
+        f.write(text.encode('utf-8'))
+    return output_path
 
 
 def export_to_console_json(df: pd.DataFrame,
@@ -0,0 +1,293 @@
+# src/frontiers.py
+"""
+Modelo compacto (struct-of-arrays) de la cartera y del análisis por frontera.
+
+- Portfolio: las oportunidades de run_opps_sql sin un dict por frontera. Las cabeceras van
+  en listas por campo; las fronteras en arreglos: consumo/renting float64, textos repetidos
+  (city, ciudad, nivel, operador, provider) como códigos int32 sobre un diccionario de
+  valores únicos (provider_actual y provider comparten el suyo) y los límites de cada
+  oportunidad en `offsets`.
+- AnalysisTable: la salida del motor 'vector' de run_tariff_analysis. Tarifas y delta por
+  llave de cruce × mes (K, M) y costos/ahorro por frontera × mes (F, M), ya redondeados.
+
+Ambas se comportan como la lista de registros de siempre (len, índice, iteración): cada
+registro se arma al pedirlo, con la misma forma y tipos que el JSON, así que las etapas y
+la exportación (src/export.py) los consumen sin cambios y en memoria nunca está la lista
+completa de dicts.
+"""
+from collections.abc import Sequence
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+import numpy as np
+
+OPPORTUNITY_FIELDS = ['oportunidad', 'cliente', 'inversion_cliente', 'tarifa_b', 'opex', 'capex',
+                      'consumo_total', 'total_renting', 'ciudad']
+FRONTIER_FIELDS = ['frontier_name', 'consumo', 'renting', 'city', 'ciudad', 'nivel_de_tension',
+                   'operador_de_red', 'provider_actual', 'provider']
+RECORD_FIELDS = OPPORTUNITY_FIELDS + ['fronteras', 'provider_objetivo']
+CATEGORICAL_FIELDS = ['city', 'ciudad', 'nivel_de_tension', 'operador_de_red', 'provider']
+
+
+class Categories:
+    """Diccionario de valores únicos (en orden de aparición) -> código int32."""
+
+    __slots__ = ('values', '_codes')
+
+    def __init__(self):
+        self.values: List[Any] = []
+        self._codes: Dict[Any, int] = {}
+
+    def code(self, value: Any) -> int:
+        c = self._codes.get(value)
+        if c is None:
+            c = self._codes[value] = len(self.values)
+            self.values.append(value)
+        return c
+
+    def encode(self, values: Iterable[Any]) -> np.ndarray:
+        return np.fromiter((self.code(v) for v in values), dtype=np.int32)
+
+    def __len__(self) -> int:
+        return len(self.values)
+
+
+def is_nested_record(reg: Any) -> bool:
+    """True si `reg` tiene exactamente la forma de un registro de run_opps_sql (ver from_records)."""
+    return (isinstance(reg, dict) and list(reg) == RECORD_FIELDS
+            and all(_is_frontier(f) for f in reg['fronteras']))
+
+
+def _is_frontier(f: Any) -> bool:
+    return (isinstance(f, dict) and list(f) == FRONTIER_FIELDS
+            and type(f['consumo']) is float and type(f['renting']) is float)
+
+
+def _offsets(counts: Iterable[int]) -> np.ndarray:
+    return np.concatenate(([0], np.cumsum(np.fromiter(counts, dtype=np.int64)))).astype(np.int64)
+
+
+class Portfolio(Sequence):
+    """Oportunidades con sus fronteras en columnas; portfolio[i] es el registro anidado i."""
+
+    def __init__(self, heads: Dict[str, List[Any]], offsets: np.ndarray, frontier_name: List[Any],
+                 consumo: np.ndarray, renting: np.ndarray, codes: Dict[str, np.ndarray],
+                 categories: Dict[str, Categories], provider_objetivo: Optional[List[Any]] = None):
+        self.heads = heads
+        self.offsets = np.asarray(offsets, dtype=np.int64)
+        self.frontier_name = frontier_name
+        self.consumo = np.asarray(consumo, dtype=np.float64)
+        self.renting = np.asarray(renting, dtype=np.float64)
+        self.codes = codes            # campo -> int32 (F,); 'provider_actual' usa categories['provider']
+        self.categories = categories  # campo de CATEGORICAL_FIELDS -> Categories
+        n = len(self.offsets) - 1
+        self.provider_objetivo = provider_objetivo if provider_objetivo is not None else ['BIA ENERGY'] * n
+        self._bounds = self.offsets.tolist()
+
+    # --------- Construcción ---------
+    @classmethod
+    def from_columns(cls, heads: Dict[str, List[Any]], counts: Iterable[int],
+                     frontiers: Dict[str, Any], provider_objetivo: Optional[List[Any]] = None) -> 'Portfolio':
+        """
+        Cabeceras por campo + cantidad de fronteras de cada oportunidad + columnas de frontera
+        (en orden de oportunidad). Los textos se codifican aquí.
+        """
+        categories = {name: Categories() for name in CATEGORICAL_FIELDS}
+        codes = {name: categories[name].encode(frontiers[name]) for name in CATEGORICAL_FIELDS}
+        codes['provider_actual'] = categories['provider'].encode(frontiers['provider_actual'])
+        return cls(heads, _offsets(counts), list(frontiers['frontier_name']),
+                   np.asarray(frontiers['consumo'], dtype=np.float64),
+                   np.asarray(frontiers['renting'], dtype=np.float64), codes, categories, provider_objetivo)
+
+    @classmethod
+    def from_records(cls, records: Iterable[Dict[str, Any]]) -> 'Portfolio':
+        """
+        Registros anidados (p. ej. iter_records del JSON) -> Portfolio, registro a registro.
+        ValueError si algún registro no tiene exactamente la forma de run_opps_sql (el
+        redondeo de ida y vuelta no sería exacto; ver is_nested_record).
+        """
+        heads: Dict[str, List[Any]] = {name: [] for name in OPPORTUNITY_FIELDS}
+        objetivo: List[Any] = []
+        counts: List[int] = []
+        categories = {name: Categories() for name in CATEGORICAL_FIELDS}
+        codes: Dict[str, List[int]] = {name: [] for name in CATEGORICAL_FIELDS + ['provider_actual']}
+        names: List[Any] = []
+        consumo: List[float] = []
+        renting: List[float] = []
+        for i, reg in enumerate(records):
+            if not isinstance(reg, dict) or list(reg) != RECORD_FIELDS:
+                raise ValueError(f'oportunidad {i + 1}: no tiene la forma del anidado de run_opps_sql')
+            for name in OPPORTUNITY_FIELDS:
+                heads[name].append(reg[name])
+            objetivo.append(reg['provider_objetivo'])
+            fronteras = reg['fronteras']
+            counts.append(len(fronteras))
+            for f in fronteras:
+                if not _is_frontier(f):
+                    raise ValueError(f'oportunidad {i + 1}: frontera con otra forma')
+                names.append(f['frontier_name'])
+                consumo.append(f['consumo'])
+                renting.append(f['renting'])
+                for name in CATEGORICAL_FIELDS:
+                    codes[name].append(categories[name].code(f[name]))
+                codes['provider_actual'].append(categories['provider'].code(f['provider_actual']))
+        return cls(heads, _offsets(counts), names, np.asarray(consumo, dtype=np.float64),
+                   np.asarray(renting, dtype=np.float64),
+                   {k: np.asarray(v, dtype=np.int32) for k, v in codes.items()}, categories, objetivo)
+
+    def take(self, indices: Iterable[int]) -> 'Portfolio':
+        """Subconjunto de oportunidades (mismos diccionarios de textos)."""
+        idx = [int(i) for i in indices]
+        bounds = self._bounds
+        sel = (np.concatenate([np.arange(bounds[i], bounds[i + 1]) for i in idx]).astype(np.int64)
+               if idx else np.zeros(0, dtype=np.int64))
+        return Portfolio({k: [v[i] for i in idx] for k, v in self.heads.items()},
+                         _offsets(bounds[i + 1] - bounds[i] for i in idx),
+                         [self.frontier_name[k] for k in sel.tolist()], self.consumo[sel], self.renting[sel],
+                         {k: v[sel] for k, v in self.codes.items()}, self.categories,
+                         [self.provider_objetivo[i] for i in idx])
+
+    # --------- Acceso ---------
+    def __len__(self) -> int:
+        return len(self._bounds) - 1
+
+    @property
+    def n_frontiers(self) -> int:
+        return self._bounds[-1]
+
+    def frontier_opp(self) -> np.ndarray:
+        """Posición de la oportunidad de cada frontera (F,)."""
+        return np.repeat(np.arange(len(self), dtype=np.int64), np.diff(self.offsets))
+
+    def column(self, name: str, a: int = 0, b: Optional[int] = None) -> List[Any]:
+        """Columna de frontera [a:b] con los valores de siempre (textos decodificados)."""
+        b = self.n_frontiers if b is None else b
+        if name == 'frontier_name':
+            return self.frontier_name[a:b]
+        if name in ('consumo', 'renting'):
+            return getattr(self, name)[a:b].tolist()
+        values = self.categories['provider' if name == 'provider_actual' else name].values
+        return [values[c] for c in self.codes[name][a:b].tolist()]
+
+    def head(self, i: int) -> Dict[str, Any]:
+        return {name: self.heads[name][i] for name in OPPORTUNITY_FIELDS}
+
+    def iter_heads(self) -> Iterator[Dict[str, Any]]:
+        """Solo las cabeceras (sin armar las fronteras)."""
+        for i in range(len(self)):
+            yield self.head(i)
+
+    def record(self, i: int) -> Dict[str, Any]:
+        a, b = self._bounds[i], self._bounds[i + 1]
+        cols = [self.column(name, a, b) for name in FRONTIER_FIELDS]
+        reg = self.head(i)
+        reg['fronteras'] = [dict(zip(FRONTIER_FIELDS, vals)) for vals in zip(*cols)]
+        reg['provider_objetivo'] = self.provider_objetivo[i]
+        return reg
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return self.take(range(*i.indices(len(self))))
+        if i < 0:
+            i += len(self)
+        if not 0 <= i < len(self):
+            raise IndexError('Portfolio index out of range')
+        return self.record(i)
+
+    def __iter__(self) -> Iterator[Dict[str, Any]]:
+        for i in range(len(self)):
+            yield self.record(i)
+
+    def to_records(self) -> List[Dict[str, Any]]:
+        return list(self)
+
+    def nbytes(self) -> int:
+        """Bytes de los arreglos de frontera (sin los textos únicos ni las cabeceras)."""
+        return int(self.offsets.nbytes + self.consumo.nbytes + self.renting.nbytes
+                   + sum(c.nbytes for c in self.codes.values()))
+
+
+def iter_heads(opps: Iterable[Dict[str, Any]]) -> Iterator[Dict[str, Any]]:
+    """Registros (o solo cabeceras, si es un Portfolio) para quien no necesita las fronteras."""
+    return opps.iter_heads() if isinstance(opps, Portfolio) else iter(opps)
+
+
+class AnalysisTable(Sequence):
+    """
+    Salida del cruce de tarifas en arreglos; table[i] es el registro de análisis de la
+    oportunidad i (misma forma que analizar_loop). Por llave de cruce (K, M): tarifa BIA,
+    tarifa actual y delta; por frontera (F, M): costos y ahorro. Cada valor se guarda ya
+    redondeado junto con si es válido (None en el JSON si no).
+    """
+
+    def __init__(self, oportunidad: List[Any], cliente: List[Any], months: List[str],
+                 fr_opp: np.ndarray, frontier_name: List[Any], resolved: List[Dict[str, Any]],
+                 fr_res: np.ndarray, fr_key: np.ndarray, consumo: np.ndarray, consumo_ok: np.ndarray,
+                 key_cols: Dict[str, Tuple[np.ndarray, np.ndarray]],
+                 frontier_cols: Dict[str, Tuple[np.ndarray, np.ndarray]]):
+        self.oportunidad = oportunidad
+        self.cliente = cliente
+        self.months = list(months)
+        counts = np.bincount(np.asarray(fr_opp, dtype=np.int64), minlength=len(oportunidad))
+        self._bounds = _offsets(counts.tolist()).tolist()
+        self.frontier_name = frontier_name
+        self.resolved = resolved
+        self.fr_res = np.asarray(fr_res, dtype=np.int64)
+        self.fr_key = np.asarray(fr_key, dtype=np.int64)
+        self.consumo = consumo
+        self.consumo_ok = consumo_ok
+        self.key_cols = key_cols            # campo -> (valores (K, M), válidos (K, M))
+        self.frontier_cols = frontier_cols  # campo -> (valores (F, M), válidos (F, M))
+
+    def __len__(self) -> int:
+        return len(self.oportunidad)
+
+    @staticmethod
+    def _grid(values: np.ndarray, valid: np.ndarray) -> List[List[Optional[float]]]:
+        return [[v if ok else None for v, ok in zip(vr, okr)]
+                for vr, okr in zip(values.tolist(), valid.tolist())]
+
+    def record(self, i: int) -> Dict[str, Any]:
+        a, b = self._bounds[i], self._bounds[i + 1]
+        keys = self.fr_key[a:b]
+        grids = {name: self._grid(vals[keys], ok[keys]) for name, (vals, ok) in self.key_cols.items()}
+        grids.update({name: self._grid(vals[a:b], ok[a:b]) for name, (vals, ok) in self.frontier_cols.items()})
+        consumo = [c if ok else None for c, ok in zip(self.consumo[a:b].tolist(), self.consumo_ok[a:b].tolist())]
+        fronteras = []
+        for n, (k, r) in enumerate(zip(range(a, b), self.fr_res[a:b].tolist())):
+            fr = self.resolved[r]
+            mensual = [{
+                'mes': mes,
+                'tarifa_bia': grids['tarifa_bia'][n][j],
+                'tarifa_actual': grids['tarifa_actual'][n][j],
+                'consumo_kwh': consumo[n],
+                'costo_bia': grids['costo_bia'][n][j],
+                'costo_actual': grids['costo_actual'][n][j],
+                'delta_unit': grids['delta_unit'][n][j],
+                'ahorro_mensual_estimado': grids['ahorro_mensual_estimado'][n][j]
+            } for j, mes in enumerate(self.months)]
+            fronteras.append({
+                'frontier_name': self.frontier_name[k],
+                'city_calculadora': fr['city_calc_n'],
+                'city_tarifas_usada': fr['city_tarifa_n'],
+                'nivel_de_tension': fr['nivel_comp_f'] or fr['nivel_simp_f'],
+                'provider_actual_calc_norm': fr['prov_calc_n'],
+                'provider_actual_tarifas_norm': fr['prov_tarifa_n'],
+                'analisis_mensual': mensual
+            })
+        return {'oportunidad': self.oportunidad[i], 'cliente': self.cliente[i], 'fronteras': fronteras}
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [self.record(k) for k in range(*i.indices(len(self)))]
+        if i < 0:
+            i += len(self)
+        if not 0 <= i < len(self):
+            raise IndexError('AnalysisTable index out of range')
+        return self.record(i)
+
+    def __iter__(self) -> Iterator[Dict[str, Any]]:
+        for i in range(len(self)):
+            yield self.record(i)
+
+    def to_records(self) -> List[Dict[str, Any]]:
+        return list(self)
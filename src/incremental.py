@@ -0,0 +1,161 @@
+# src/incremental.py
+"""
+Caché incremental de resultados por oportunidad.
+
+Cada oportunidad se identifica por un hash de su registro anidado (fronteras con ciudad,
+nivel, provider y consumo, más la cabecera) combinado con un hash de contexto: versión del
+snapshot de tarifas preparado, rango --from/--to y mapeos. Si el hash no cambió desde la
+última corrida, su análisis por frontera (y su resumen) se toman de la tabla
+analysis_cache en lugar de recalcularse.
+
+El resumen solo se reutiliza si el archivo de análisis que lee run_summary es el mismo que
+escribió la última corrida incremental (tamaño + mtime guardados en analysis_cache_meta).
+"""
+import hashlib
+import json
+import os
+import sqlite3
+import time
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+try:
+    from src.db import init_db, DEFAULT_DB_PATH
+except Exception:
+    from db import init_db, DEFAULT_DB_PATH
+
+CACHE_VERSION = 1  # subir si cambia la lógica del análisis o del resumen
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS analysis_cache (
+    oportunidad   TEXT PRIMARY KEY,
+    input_hash    TEXT NOT NULL,
+    analisis_json TEXT NOT NULL,
+    resumen_for   TEXT,
+    resumen_json  TEXT,
+    updated_at    TEXT
+);
+CREATE TABLE IF NOT EXISTS analysis_cache_meta (
+    key   TEXT PRIMARY KEY,
+    value TEXT
+);
+"""
+
+
+def stable_hash(obj: Any) -> str:
+    data = json.dumps(obj, ensure_ascii=False, sort_keys=True, separators=(',', ':'), default=str)
+    return hashlib.sha256(data.encode('utf-8')).hexdigest()
+
+
+def context_hash(tariff_version: str, from_month: str, to_month: str,
+                 city_map: Dict[str, str], prov_map: Dict[str, str]) -> str:
+    return stable_hash({
+        'v': CACHE_VERSION,
+        'tarifas': tariff_version,
+        'rango': [from_month.strip()[:7], to_month.strip()[:7]],
+        'ciudades': city_map,
+        'providers': prov_map,
+    })
+
+
+def opportunity_hash(reg: Dict[str, Any], ctx: str) -> str:
+    return stable_hash([ctx, reg])
+
+
+def file_signature(path: str) -> Optional[str]:
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return f'{st.st_size}:{st.st_mtime_ns}'
+
+
+def cacheable_keys(opps: Sequence[Dict[str, Any]]) -> bool:
+    """Solo se puede cachear por oportunidad si todas tienen nombre de texto y no se repiten."""
+    keys = [reg.get('oportunidad') for reg in opps]
+    return all(isinstance(k, str) and k for k in keys) and len(set(keys)) == len(keys)
+
+
+class AnalysisCache:
+    """Tabla analysis_cache (en la misma base SQLite del proyecto)."""
+
+    def __init__(self, db_path: str = DEFAULT_DB_PATH):
+        self.db_path = db_path
+        self.con: sqlite3.Connection = init_db(db_path)
+        self.con.executescript(SCHEMA)
+        self.con.commit()
+
+    def close(self) -> None:
+        self.con.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    # --------- Lectura ---------
+    def fetch(self, keys: Iterable[str]) -> Dict[str, Tuple[str, str, Optional[str], Optional[str]]]:
+        """oportunidad -> (input_hash, analisis_json, resumen_for, resumen_json)."""
+        out: Dict[str, Tuple[str, str, Optional[str], Optional[str]]] = {}
+        keys = list(keys)
+        for i in range(0, len(keys), 500):
+            part = keys[i:i + 500]
+            rows = self.con.execute(
+                'SELECT oportunidad, input_hash, analisis_json, resumen_for, resumen_json FROM analysis_cache '
+                f'WHERE oportunidad IN ({", ".join("?" * len(part))})', part,
+            ).fetchall()
+            for opp, h, a, rf, r in rows:
+                out[opp] = (h, a, rf, r)
+        return out
+
+    # --------- Escritura ---------
+    def store_analysis(self, rows: List[Tuple[str, str, Dict[str, Any]]]) -> None:
+        """rows: (oportunidad, input_hash, registro de análisis). Invalida el resumen guardado."""
+        now = time.strftime('%Y-%m-%dT%H:%M:%S')
+        with self.con:
+            self.con.executemany(
+                'INSERT INTO analysis_cache (oportunidad, input_hash, analisis_json, resumen_for, resumen_json, updated_at) '
+                'VALUES (?, ?, ?, NULL, NULL, ?) '
+                'ON CONFLICT (oportunidad) DO UPDATE SET input_hash=excluded.input_hash, '
+                'analisis_json=excluded.analisis_json, resumen_for=NULL, resumen_json=NULL, updated_at=excluded.updated_at',
+                [(opp, h, json.dumps(rec, ensure_ascii=False), now) for opp, h, rec in rows],
+            )
+
+    def store_summary(self, rows: List[Tuple[str, Dict[str, Any]]]) -> None:
+        """rows: (oportunidad, registro de resumen), válido para el input_hash actual."""
+        with self.con:
+            self.con.executemany(
+                'UPDATE analysis_cache SET resumen_for = input_hash, resumen_json = ? WHERE oportunidad = ?',
+                [(json.dumps(rec, ensure_ascii=False), opp) for opp, rec in rows],
+            )
+
+    def get_meta(self, key: str) -> Optional[str]:
+        row = self.con.execute('SELECT value FROM analysis_cache_meta WHERE key = ?', (key,)).fetchone()
+        return row[0] if row else None
+
+    def set_meta(self, key: str, value: Optional[str]) -> None:
+        with self.con:
+            self.con.execute(
+                'INSERT INTO analysis_cache_meta (key, value) VALUES (?, ?) '
+                'ON CONFLICT (key) DO UPDATE SET value = excluded.value', (key, value),
+            )
+
+
+def split_cached(opps: Sequence[Dict[str, Any]], ctx: str,
+                 cache: AnalysisCache) -> Tuple[List[str], Dict[int, Dict[str, Any]], List[int]]:
+    """
+    Devuelve (hashes, cacheados {posición: registro de análisis}, posiciones a recalcular).
+    """
+    hashes = [opportunity_hash(reg, ctx) for reg in opps]
+    if not cacheable_keys(opps):
+        return hashes, {}, list(range(len(opps)))
+    found = cache.fetch(reg['oportunidad'] for reg in opps)
+    cached: Dict[int, Dict[str, Any]] = {}
+    todo: List[int] = []
+    for i, (reg, h) in enumerate(zip(opps, hashes)):
+        row = found.get(reg['oportunidad'])
+        if row is not None and row[0] == h:
+            cached[i] = json.loads(row[1])
+        else:
+            todo.append(i)
+    return hashes, cached, todo
@@ -0,0 +1,115 @@
+# src/metrics.py
+"""
+Instrumentación por etapa: tiempo de reloj, tiempo de CPU, pico de RSS, filas de entrada/salida
+y contadores (búsquedas de tarifas, cachés), escritos en outputs/run_metrics.json.
+
+Cada script escribe su propia sección ("run_opps_sql", "run_tariff_analysis", "run_summary",
+"pipeline") sin borrar la de los demás, así que una corrida de run.py deja las tres etapas
+en el mismo archivo.
+
+Con profile_dir, cada etapa deja además <etapa>.prof (cProfile; se abre con pstats o
+snakeviz) y <etapa>.tracemalloc (tracemalloc.Snapshot.load) en esa carpeta.
+"""
+import cProfile
+import json
+import os
+import sys
+import time
+import tracemalloc
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, Optional
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+RUN_METRICS_PATH = os.path.join('outputs', 'run_metrics.json')
+PROFILE_DIR = os.path.join('outputs', 'profile')
+
+
+def peak_rss_mb() -> Optional[float]:
+    """Pico de memoria residente del proceso hasta ahora (None si la plataforma no lo expone)."""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux lo reporta en KB, macOS en bytes
+    return round(peak / (1e6 if sys.platform == 'darwin' else 1e3), 1)
+
+
+class RunMetrics:
+    """Acumula las métricas de un script y las vuelca a run_metrics.json."""
+
+    def __init__(self, script: str, path: str = RUN_METRICS_PATH, profile_dir: Optional[str] = None):
+        self.script = script
+        self.path = path
+        self.profile_dir = os.path.join(profile_dir, script) if profile_dir else None
+        self.started_at = time.strftime('%Y-%m-%dT%H:%M:%S')
+        self.stages: Dict[str, Dict[str, Any]] = {}
+        self.counters: Dict[str, Any] = {}
+        self._t0 = time.perf_counter()
+        self._c0 = time.process_time()
+
+    @contextmanager
+    def stage(self, name: str) -> Iterator[Dict[str, Any]]:
+        """
+        Mide el bloque. El dict que entrega se puede completar con rows_in/rows_out u otros
+        datos de la etapa.
+        """
+        rec: Dict[str, Any] = {}
+        prof = None
+        if self.profile_dir:
+            os.makedirs(self.profile_dir, exist_ok=True)
+            prof = cProfile.Profile()
+            tracemalloc.start()
+            prof.enable()
+        t0, c0 = time.perf_counter(), time.process_time()
+        try:
+            yield rec
+        finally:
+            wall, cpu = time.perf_counter() - t0, time.process_time() - c0
+            if prof is not None:
+                prof.disable()
+                base = os.path.join(self.profile_dir, name)
+                prof.dump_stats(base + '.prof')
+                tracemalloc.take_snapshot().dump(base + '.tracemalloc')
+                rec['traced_peak_mb'] = round(tracemalloc.get_traced_memory()[1] / 1e6, 1)
+                tracemalloc.stop()
+                rec['profile'] = [base + '.prof', base + '.tracemalloc']
+            self.stages[name] = {'wall_s': round(wall, 4), 'cpu_s': round(cpu, 4),
+                                 'peak_rss_mb': peak_rss_mb(), **rec}
+
+    def count(self, group: str, values: Dict[str, Any]) -> None:
+        """Agrega contadores bajo `group` (los numéricos se suman si ya existían)."""
+        dst = self.counters.setdefault(group, {})
+        for k, v in values.items():
+            if isinstance(v, (int, float)) and not isinstance(v, bool) and isinstance(dst.get(k), (int, float)):
+                dst[k] += v
+            else:
+                dst[k] = v
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {
+            'started_at': self.started_at,
+            'wall_s': round(time.perf_counter() - self._t0, 4),
+            'cpu_s': round(time.process_time() - self._c0, 4),
+            'peak_rss_mb': peak_rss_mb(),
+            'stages': self.stages,
+            'counters': self.counters,
+        }
+
+    def write(self) -> str:
+        """Actualiza la sección de este script en run_metrics.json."""
+        data: Dict[str, Any] = {}
+        if os.path.exists(self.path):
+            try:
+                with open(self.path, 'r', encoding='utf-8') as f:
+                    data = json.load(f)
+            except (OSError, ValueError):
+                data = {}
+        data.setdefault('scripts', {})[self.script] = self.as_dict()
+        data['updated_at'] = time.strftime('%Y-%m-%dT%H:%M:%S')
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        with open(self.path, 'w', encoding='utf-8') as f:
+            json.dump(data, f, ensure_ascii=False, indent=2)
+        return self.path
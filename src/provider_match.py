@@ -0,0 +1,124 @@
+# src/provider_match.py
+"""
+Emparejamiento difuso de providers por Jaccard de tokens.
+
+Mismo criterio que best_token_match (gana el primer candidato con el mayor puntaje > 0),
+pero:
+- los tokens de cada nombre se calculan una sola vez,
+- un índice invertido token -> candidatos limita el cálculo a los que comparten tokens,
+- un LRU acotado guarda (provider, bucket) -> (match, score),
+- score_matrix() entrega todos los puntajes de una vez para aplicar cualquier umbral sin recalcular.
+"""
+from collections import OrderedDict
+from typing import Callable, Dict, FrozenSet, Iterable, List, Optional, Sequence, Set, Tuple
+
+import numpy as np
+
+Match = Tuple[Optional[str], float]
+
+
+class ProviderMatcher:
+    """Tokens precalculados + índice invertido sobre el universo de nombres vistos."""
+
+    def __init__(self, tokenizer: Callable[[str], Iterable[str]],
+                 candidates: Iterable[str] = (), cache_size: int = 65536):
+        self.tokenizer = tokenizer
+        self.cache_size = cache_size
+        self._tokens: Dict[str, FrozenSet[str]] = {}
+        self._postings: Dict[str, Set[str]] = {}
+        self._registered: Set[str] = set()  # nombres ya en _postings (no basta con tener tokens)
+        self._lru: 'OrderedDict[Tuple[str, Tuple[str, ...]], Match]' = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        for c in candidates:
+            self.register(c)
+
+    # --------- Tokens / índice ---------
+    def tokens(self, name: str) -> FrozenSet[str]:
+        toks = self._tokens.get(name)
+        if toks is None:
+            toks = self._tokens[name] = frozenset(self.tokenizer(name))
+        return toks
+
+    def register(self, name: str) -> FrozenSet[str]:
+        """Agrega `name` al índice invertido (idempotente)."""
+        toks = self.tokens(name)
+        if name not in self._registered:
+            self._registered.add(name)
+            for t in toks:
+                self._postings.setdefault(t, set()).add(name)
+        return toks
+
+    def _overlapping(self, tgt: FrozenSet[str]) -> Set[str]:
+        out: Set[str] = set()
+        for t in tgt:
+            out |= self._postings.get(t, set())
+        return out
+
+    # --------- Consulta ---------
+    def best(self, target: str, candidates: Sequence[str]) -> Match:
+        """Equivale a best_token_match(target, candidates), con memoización."""
+        key = (target, tuple(candidates))
+        hit = self._lru.get(key)
+        if hit is not None:
+            self._lru.move_to_end(key)
+            self.hits += 1
+            return hit
+        self.misses += 1
+        result = self._best(target, key[1])
+        self._lru[key] = result
+        if len(self._lru) > self.cache_size:
+            self._lru.popitem(last=False)
+        return result
+
+    def _best(self, target: str, candidates: Tuple[str, ...]) -> Match:
+        tgt = self.tokens(target)
+        if not tgt:
+            return None, 0.0
+        for c in candidates:
+            self.register(c)
+        shared = self._overlapping(tgt)
+        if not shared:
+            return None, 0.0
+        # Recorrer en el orden de `candidates` para conservar el desempate del original
+        best, best_score = None, 0.0
+        for c in dict.fromkeys(c for c in candidates if c in shared):
+            cand = self._tokens[c]
+            inter = len(tgt & cand)
+            score = inter / len(tgt | cand)
+            if score > best_score:
+                best, best_score = c, score
+        return best, best_score
+
+    def score_matrix(self, targets: Sequence[str], candidates: Sequence[str]) -> np.ndarray:
+        """Puntajes Jaccard [target, candidato]; 0.0 donde no comparten tokens."""
+        col: Dict[str, List[int]] = {}
+        for j, c in enumerate(candidates):
+            self.register(c)
+            col.setdefault(c, []).append(j)
+        allowed = set(col)
+        scores = np.zeros((len(targets), len(candidates)), dtype=np.float64)
+        for i, t in enumerate(targets):
+            tgt = self.tokens(t)
+            if not tgt:
+                continue
+            for c in self._overlapping(tgt) & allowed:
+                cand = self._tokens[c]
+                scores[i, col[c]] = len(tgt & cand) / len(tgt | cand)
+        return scores
+
+    def cache_info(self) -> Dict[str, int]:
+        return {'hits': self.hits, 'misses': self.misses, 'size': len(self._lru), 'maxsize': self.cache_size}
+
+
+def matches_from_scores(scores: np.ndarray, candidates: Sequence[str], threshold: float) -> List[Optional[str]]:
+    """
+    Mejor candidato por fila de score_matrix() con puntaje > 0 y >= threshold (None si no hay).
+    Empates: el primero en `candidates`, como best_token_match.
+    """
+    if scores.shape[1] == 0:
+        return [None] * scores.shape[0]
+    arg = scores.argmax(axis=1)
+    top = scores[np.arange(scores.shape[0]), arg]
+    ok = (top > 0) & (top >= threshold)
+    return [candidates[j] if k else None for j, k in zip(arg.tolist(), ok.tolist())]
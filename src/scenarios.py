@@ -0,0 +1,191 @@
+# src/scenarios.py
+"""
+Escenarios de precio BIA ("what-if") evaluados en una sola pasada vectorizada.
+
+Cada escenario parte de la tarifa BIA del análisis (o de una tabla de tarifas alternativa)
+y le aplica, en este orden:
+- descuento_pct: descuento sobre toda la tabla (negativo = recargo),
+- overrides: por city y/o nivel, una tarifa fija ('tarifa', solo en los meses en que la
+  llave ya tenía tarifa) o un descuento propio ('descuento_pct', que reemplaza al general
+  en esas llaves).
+
+Archivo de escenarios (JSON):
+[
+  {"nombre": "base"},
+  {"nombre": "descuento 5%", "descuento_pct": 5},
+  {"nombre": "Medellín N2 fija", "overrides": [{"city": "Medellín", "nivel": "Nivel 2", "tarifa": 640}]},
+  {"nombre": "tabla 2025", "tarifas": "data/tarifas_bia_2025.csv", "descuento_pct": 2}
+]
+
+Las tarifas de todos los escenarios se apilan en un arreglo (S, K, M) (escenario × llave de
+cruce × mes) y los costos se agregan por oportunidad y mes con el mismo redondeo y orden de
+suma que run_summary: un escenario sin cambios reproduce el resumen.
+"""
+import json
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+try:
+    from src.textnorm import norm_text, canonical_comp_from_tokens, canonical_simple
+except Exception:
+    from textnorm import norm_text, canonical_comp_from_tokens, canonical_simple
+
+SCENARIO_KEYS = {'nombre', 'descripcion', 'descuento_pct', 'overrides', 'tarifas'}
+OVERRIDE_KEYS = {'city', 'nivel', 'tarifa', 'descuento_pct'}
+CHUNK_CELLS = 1 << 22  # celdas escenario × frontera × mes por bloque
+
+
+# --------- Definición ---------
+def _number(value: Any, where: str) -> float:
+    if isinstance(value, bool) or not isinstance(value, (int, float)):
+        raise ValueError(f'{where}: se esperaba un número, no {value!r}')
+    return float(value)
+
+
+def validate_scenarios(raw: Any) -> List[Dict[str, Any]]:
+    """Revisa la lista de escenarios (nombres únicos, llaves y tipos conocidos) y la devuelve."""
+    if not isinstance(raw, list) or not raw:
+        raise ValueError('El archivo de escenarios debe ser una lista JSON no vacía.')
+    nombres = set()
+    for i, sc in enumerate(raw):
+        where = f'escenario {i + 1}'
+        if not isinstance(sc, dict) or not sc.get('nombre'):
+            raise ValueError(f'{where}: cada escenario es un objeto con "nombre".')
+        where = f"escenario '{sc['nombre']}'"
+        if sc['nombre'] in nombres:
+            raise ValueError(f'{where}: nombre repetido.')
+        nombres.add(sc['nombre'])
+        unknown = set(sc) - SCENARIO_KEYS
+        if unknown:
+            raise ValueError(f'{where}: llaves desconocidas {sorted(unknown)}.')
+        if 'descuento_pct' in sc:
+            _number(sc['descuento_pct'], where)
+        if 'tarifas' in sc and not isinstance(sc['tarifas'], str):
+            raise ValueError(f'{where}: "tarifas" es la ruta (o URL) de una tabla de tarifas.')
+        for j, ov in enumerate(sc.get('overrides') or []):
+            w = f'{where}, override {j + 1}'
+            if not isinstance(ov, dict) or set(ov) - OVERRIDE_KEYS:
+                raise ValueError(f'{w}: llaves permitidas {sorted(OVERRIDE_KEYS)}.')
+            if not (ov.get('city') or ov.get('nivel')):
+                raise ValueError(f'{w}: indica "city", "nivel" o ambos.')
+            if ('tarifa' in ov) == ('descuento_pct' in ov):
+                raise ValueError(f'{w}: indica "tarifa" o "descuento_pct" (uno de los dos).')
+            _number(ov.get('tarifa', ov.get('descuento_pct')), w)
+            if ov.get('nivel') and not (canonical_comp_from_tokens(ov['nivel']) or canonical_simple(ov['nivel'])):
+                raise ValueError(f"{w}: nivel no reconocido {ov['nivel']!r}.")
+    return raw
+
+
+def load_scenarios(path: str) -> List[Dict[str, Any]]:
+    with open(path, 'r', encoding='utf-8') as f:
+        return validate_scenarios(json.load(f))
+
+
+# --------- Tarifas por escenario ---------
+def override_mask(ov: Dict[str, Any], keys: Sequence[Tuple[Any, ...]],
+                  city_map: Dict[str, str]) -> np.ndarray:
+    """
+    Llaves (city, nivel_comp, nivel_simp, provider) afectadas por un override. La city se
+    normaliza y pasa por el mapeo como la de las fronteras; un nivel compuesto
+    ('Nivel 2 usuario') compara contra nivel_comp y uno simple ('Nivel 2') contra nivel_simp.
+    """
+    mask = np.ones(len(keys), dtype=bool)
+    if ov.get('city'):
+        city = norm_text(ov['city'])
+        city = city_map.get(city, city)
+        mask &= np.fromiter((k[0] == city for k in keys), dtype=bool, count=len(keys))
+    if ov.get('nivel'):
+        comp = canonical_comp_from_tokens(ov['nivel'])
+        if comp:
+            mask &= np.fromiter((k[1] == comp for k in keys), dtype=bool, count=len(keys))
+        else:
+            simp = canonical_simple(ov['nivel'])
+            mask &= np.fromiter((k[2] == simp for k in keys), dtype=bool, count=len(keys))
+    return mask
+
+
+def _discounted(rates: np.ndarray, pct: Optional[float]) -> np.ndarray:
+    return rates.copy() if not pct else rates * (1.0 - float(pct) / 100.0)
+
+
+def scenario_rates(scenarios: List[Dict[str, Any]], base: np.ndarray,
+                   keys: Sequence[Tuple[Any, ...]], city_map: Dict[str, str],
+                   tables: Optional[Dict[str, np.ndarray]] = None) -> np.ndarray:
+    """
+    Tarifa BIA (S, K, M) de cada escenario. `base` es la tarifa BIA del análisis (K, M) y
+    `tables` las de las tablas alternativas ya alineadas a las mismas llaves y meses.
+    """
+    tables = tables or {}
+    out = np.empty((len(scenarios),) + base.shape, dtype=np.float64)
+    for s, sc in enumerate(scenarios):
+        src = tables[sc['tarifas']] if sc.get('tarifas') else base
+        t = _discounted(src, sc.get('descuento_pct'))
+        for ov in sc.get('overrides') or []:
+            mask = override_mask(ov, keys, city_map)
+            if 'tarifa' in ov:
+                # un mes sin tarifa BIA sigue sin tarifa: el override no inventa cobertura
+                t[mask[:, None] & ~np.isnan(src)] = float(ov['tarifa'])
+            else:
+                t[mask, :] = _discounted(src[mask, :], ov['descuento_pct'])
+        out[s] = t
+    return out
+
+
+# --------- Agregación por oportunidad ---------
+def round2(values: np.ndarray) -> np.ndarray:
+    """
+    round(v, 2) de Python, vectorizado. np.round puede diferir en los casos que quedan a
+    medio centavo; esos (pocos) se redondean uno por uno con round().
+    """
+    values = np.asarray(values, dtype=np.float64)
+    with np.errstate(invalid='ignore', over='ignore'):
+        out = np.round(values, 2)
+        scaled = values * 100.0
+        frac = np.abs(scaled - np.trunc(scaled))
+        tie = np.abs(frac - 0.5) <= 1e-6 + np.abs(scaled) * 1e-14
+    idx = np.flatnonzero(tie & np.isfinite(values))
+    if len(idx):
+        flat = out.reshape(-1)
+        src = values.reshape(-1)
+        flat[idx] = [round(v, 2) for v in src[idx].tolist()]
+    return out
+
+
+def aggregate_costs(rates: np.ndarray, fr_key: np.ndarray, fr_group: np.ndarray,
+                    consumo: np.ndarray, consumo_ok: np.ndarray, n_groups: int,
+                    chunk_cells: int = CHUNK_CELLS) -> Dict[str, np.ndarray]:
+    """
+    Costos por oportunidad y mes para S tablas de tarifas a la vez.
+
+    rates (S, K, M); fr_key / fr_group / consumo / consumo_ok por frontera, en el orden del
+    análisis. Cada celda es round(consumo × tarifa, 2) (como costo_bia/costo_actual) y las
+    sumas siguen el orden de run_summary: por mes en orden de fronteras y el total en el
+    orden en que cada mes apareció con un valor. Devuelve:
+      'mensual' (S, G, M) suma por mes, 'has' (S, G, M) si el mes tuvo algún valor,
+      'total' (S, G) suma de los meses.
+    """
+    S, _, M = rates.shape
+    F = len(fr_key)
+    acc = np.zeros((S, n_groups, M), dtype=np.float64)
+    has = np.zeros((S, n_groups, M), dtype=bool)
+    first = np.full((S, n_groups, M), F, dtype=np.int64)
+    step = max(1, chunk_cells // max(1, S * M))
+    for a in range(0, F, step):
+        b = min(F, a + step)
+        T = rates[:, fr_key[a:b], :]
+        ok = consumo_ok[a:b][None, :, None] & ~np.isnan(T)
+        with np.errstate(invalid='ignore'):
+            cell = np.where(ok, round2(consumo[a:b][None, :, None] * T), 0.0)
+        g = fr_group[a:b]
+        np.add.at(acc, (slice(None), g), cell)
+        np.logical_or.at(has, (slice(None), g), ok)
+        pos = np.arange(a, b, dtype=np.int64)[None, :, None]
+        np.minimum.at(first, (slice(None), g), np.where(ok, pos, F))
+
+    order = np.argsort(first * M + np.arange(M), axis=-1, kind='stable')
+    vals = np.take_along_axis(np.where(has, acc, 0.0), order, axis=-1)
+    total = np.zeros((S, n_groups), dtype=np.float64)
+    for j in range(M):
+        total = total + vals[..., j]
+    return {'mensual': acc, 'has': has, 'total': total}
@@ -3,84 +3,559 @@
 Script para cargar datos de oportunidades desde CSV local y obtener la tabla de tarifas vía Lambda.
 Incluye vista previa preliminar de oportunidades y tarifas.
 """
+import abc
+import numpy as np
 import pandas as pd
+import io
 import os
 import sys
+import glob
+import json
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import nullcontext
+from typing import Any, Dict, Optional
+
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 
 # Configuración fija del Lambda de tarifas
 LAMBDA_URL = 'https://vdok732ielv7dwmia5lmxyd6je0frxpz.lambda-url.us-west-2.on.aws/'
 TARIFF_RESOURCE_ID = 15480
 
+# HTTP: (conexión, lectura) en segundos, reintentos con backoff exponencial ante fallos
+# de red y respuestas 429/5xx
+HTTP_TIMEOUT = (10, 120)
+HTTP_RETRIES = 3
+HTTP_BACKOFF = 0.5
+HTTP_RETRY_STATUS = (429, 500, 502, 503, 504)
+
+
+def build_http_session(retries: int = HTTP_RETRIES, backoff: float = HTTP_BACKOFF,
+                       pool_size: int = 8) -> requests.Session:
+    """
+    Sesión con pool de conexiones keep-alive, reintentos con backoff y transferencia
+    comprimida (gzip/deflate). Reutilizarla evita un handshake TLS por request.
+    """
+    retry = Retry(total=retries, connect=retries, read=retries, status=retries,
+                  backoff_factor=backoff, status_forcelist=HTTP_RETRY_STATUS,
+                  allowed_methods=frozenset({'GET', 'POST'}),  # el POST al Lambda solo resuelve una URL
+                  respect_retry_after_header=True, raise_on_status=False)
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retry)
+    session = requests.Session()
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    session.headers.update({'Accept-Encoding': 'gzip, deflate', 'Connection': 'keep-alive'})
+    return session
+
+
+_SESSION: Optional[requests.Session] = None
+_SESSION_LOCK = threading.Lock()
+
+
+def shared_session() -> requests.Session:
+    """Sesión HTTP compartida por el proceso (se crea al primer uso)."""
+    global _SESSION
+    with _SESSION_LOCK:
+        if _SESSION is None:
+            _SESSION = build_http_session()
+        return _SESSION
+
+
+# --------- Fuentes de tarifas ---------
+class TariffSource(abc.ABC):
+    """
+    Origen de la tabla de tarifas cruda (columnas mes, provider, city, nivel_de_tension, tarifa).
+
+    - HttpTariffSource:   el Lambda (o un sustituto local) que entrega la URL del CSV.
+    - FileTariffSource:   un CSV local (.csv, .csv.gz, ...).
+    - SqliteTariffSource: un snapshot guardado con --persist (tabla tariff_rates).
+
+    Solo la fuente HTTP pasa por la caché de data/tariff_cache/; las otras ya son locales.
+    """
+    kind = 'base'
+    cacheable = False
+
+    @abc.abstractmethod
+    def fetch(self) -> pd.DataFrame:
+        ...
+
+    def for_resource(self, resource_id: int) -> 'TariffSource':
+        """La misma fuente para otro resource_id (las que no distinguen recursos se devuelven tal cual)."""
+        return self
+
+    def describe(self) -> str:
+        return self.kind
+
+    def close(self) -> None:
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class HttpTariffSource(TariffSource):
+    """Lambda de tarifas sobre una sesión HTTP persistente (por defecto la compartida)."""
+    kind = 'http'
+    cacheable = True
+
+    def __init__(self, lambda_url: Optional[str] = None, resource_id: int = TARIFF_RESOURCE_ID,
+                 timeout=HTTP_TIMEOUT, session: Optional[requests.Session] = None):
+        self.lambda_url = lambda_url or LAMBDA_URL
+        self.resource_id = resource_id
+        self.timeout = timeout
+        self._session = session
+
+    @property
+    def session(self) -> requests.Session:
+        if self._session is None:
+            self._session = shared_session()
+        return self._session
+
+    def resolve_csv_url(self) -> str:
+        """Pide al Lambda la URL del CSV de tarifas para el resource_id (sin descargarlo)."""
+        payload = {'resource_id': self.resource_id}
+        headers = {'Content-Type': 'application/json', 'Cache-Control': 'no-cache'}
+
+        response = self.session.post(self.lambda_url, json=payload, headers=headers, timeout=self.timeout)
+        response.raise_for_status()
+        data = response.json()
+
+        # Extraer URL de la respuesta
+        if 'iframeUrl' in data:
+            return data['iframeUrl']
+        if 'csv_url' in data:
+            return data['csv_url']
+        if 'url' in data:
+            return data['url']
+        raise KeyError(f"No se encontró clave de URL en respuesta: {data}")
+
+    def for_resource(self, resource_id: int) -> 'HttpTariffSource':
+        return HttpTariffSource(self.lambda_url, resource_id, self.timeout, self._session)
+
+    def get_csv(self, csv_url: str, headers: Optional[Dict[str, str]] = None) -> requests.Response:
+        """GET del CSV por la misma sesión (admite cabeceras condicionales; no lanza en 304)."""
+        return self.session.get(csv_url, headers=headers or {}, timeout=self.timeout)
+
+    def fetch(self) -> pd.DataFrame:
+        response = self.get_csv(self.resolve_csv_url())
+        response.raise_for_status()
+        return pd.read_csv(io.BytesIO(response.content))
+
+    def describe(self) -> str:
+        return f'http {self.lambda_url} (resource_id={self.resource_id})'
+
+
+class FileTariffSource(TariffSource):
+    """CSV de tarifas en disco (la compresión se infiere de la extensión)."""
+    kind = 'file'
+
+    def __init__(self, path: str):
+        self.path = path
+
+    def fetch(self) -> pd.DataFrame:
+        if not os.path.exists(self.path):
+            raise FileNotFoundError(f'No existe el archivo de tarifas: {self.path}')
+        return pd.read_csv(self.path)
+
+    def describe(self) -> str:
+        return f'archivo {self.path}'
+
+
+class SqliteTariffSource(TariffSource):
+    """Snapshot de tarifas guardado en SQLite (por defecto el más reciente del resource_id)."""
+    kind = 'sqlite'
+
+    def __init__(self, db_path: str, snapshot_id: Optional[int] = None,
+                 resource_id: Optional[int] = TARIFF_RESOURCE_ID):
+        self.db_path = db_path
+        self.snapshot_id = snapshot_id
+        self.resource_id = resource_id
+
+    def fetch(self) -> pd.DataFrame:
+        try:
+            from src.db import init_db, load_tariff_snapshot
+        except Exception:
+            from db import init_db, load_tariff_snapshot
+        if not os.path.exists(self.db_path):
+            raise FileNotFoundError(f'No existe la base de tarifas: {self.db_path}')
+        con = init_db(self.db_path)
+        try:
+            return load_tariff_snapshot(con, self.snapshot_id, self.resource_id)
+        finally:
+            con.close()
+
+    def for_resource(self, resource_id: int) -> 'SqliteTariffSource':
+        if self.snapshot_id is not None:
+            return self  # un snapshot fijo ya identifica las tarifas
+        return SqliteTariffSource(self.db_path, None, resource_id)
+
+    def describe(self) -> str:
+        snap = self.snapshot_id if self.snapshot_id is not None else 'último'
+        return f'sqlite {self.db_path} (snapshot {snap})'
+
+
+SQLITE_SUFFIXES = ('.sqlite', '.sqlite3', '.db')
+
+
+def tariff_source_from_spec(spec: Optional[str] = None,
+                            resource_id: int = TARIFF_RESOURCE_ID) -> TariffSource:
+    """
+    Fuente de tarifas a partir de un texto de configuración (p. ej. --tariff-source):
+      None / '' / 'lambda'         -> HTTP contra LAMBDA_URL
+      'http(s)://host:puerto/'     -> HTTP contra esa URL (p. ej. un Lambda local de pruebas)
+      'sqlite:ruta.sqlite[#id]'    -> snapshot de SQLite (ruta.sqlite/.db también vale)
+      'ruta/tarifas.csv'           -> archivo local
+    """
+    spec = (spec or '').strip()
+    if not spec or spec == 'lambda':
+        return HttpTariffSource(None, resource_id)
+    if spec.startswith(('http://', 'https://')):
+        return HttpTariffSource(spec, resource_id)
+    if spec.startswith('sqlite:') or spec.split('#', 1)[0].lower().endswith(SQLITE_SUFFIXES):
+        path = spec[len('sqlite:'):] if spec.startswith('sqlite:') else spec
+        path, _, snap = path.partition('#')
+        return SqliteTariffSource(path, int(snap) if snap else None, resource_id)
+    return FileTariffSource(spec)
+
+
+def merge_tariff_frames(frames) -> pd.DataFrame:
+    """
+    Une las tablas de varios resource_id en una sola, en el orden dado. En llaves repetidas
+    (mes, city, nivel, provider) los índices se quedan con la última fila, así que el último
+    recurso tiene prioridad, igual que una fila repetida dentro de un mismo CSV.
+    """
+    frames = list(frames)
+    if len(frames) == 1:
+        return frames[0]
+    return pd.concat(frames, ignore_index=True, sort=False)
+
 
 def fetch_tariffs(lambda_url: str, resource_id: int) -> pd.DataFrame:
     """
     Llama al endpoint Lambda para obtener la URL del CSV de tarifas asociado al resource_id.
     Carga el CSV resultante en un DataFrame.
     """
-    payload = {'resource_id': resource_id}
-    headers = {'Content-Type': 'application/json', 'Cache-Control': 'no-cache'}
+    return HttpTariffSource(lambda_url, resource_id).fetch()
 
-    response = requests.post(lambda_url, json=payload, headers=headers)
-    response.raise_for_status()
-    data = response.json()
 
-    # Extraer URL de la respuesta
-    if 'iframeUrl' in data:
-        csv_url = data['iframeUrl']
-    elif 'csv_url' in data:
-        csv_url = data['csv_url']
-    elif 'url' in data:
-        csv_url = data['url']
-    else:
-        raise KeyError(f"No se encontró clave de URL en respuesta: {data}")
+def resolve_tariff_csv_url(lambda_url: str, resource_id: int) -> str:
+    """
+    Pide al Lambda la URL del CSV de tarifas para el resource_id (sin descargarlo).
+    """
+    return HttpTariffSource(lambda_url, resource_id).resolve_csv_url()
 
-    # Cargar CSV de tarifas
-    df_tariffs = pd.read_csv(csv_url)
-    return df_tariffs
 
+# Columnas de oportunidades
+OPPORTUNITY_REQUIRED_COLUMNS = [
+    'Oportunidad', 'Cliente',
+    'Calculadora Payback/kWh Promedio / Mes',
+    'Calculadora Payback/Region',
+    'Costo Total Opex Oportunity',
+    'Costo Total Capex Oportunity',
+    'Tarifa B',
+    'Calculadora Payback/Modem & Medidor',
+    'Calculadora Payback/Ciiu'
+]
+OPPORTUNITY_NUMERIC_COLUMNS = [
+    'Calculadora Payback/kWh Promedio / Mes',
+    'Calculadora Payback/Modem & Medidor',
+    'Costo Total Opex Oportunity',
+    'Costo Total Capex Oportunity',
+    'Tarifa B'
+]
+# Todo lo que consume el pipeline (run_opps_sql); el resto del CSV se puede omitir
+OPPORTUNITY_PIPELINE_COLUMNS = OPPORTUNITY_REQUIRED_COLUMNS + [
+    'Calculadora Payback/Número de Cuenta',
+    'Calculadora Payback/Ciudad',
+    'Calculadora Payback/Nivel Tension',
+    'Calculadora Payback/Propiedad de Equipos',
+    'Calculadora Payback/Operador de Red',
+    'Calculadora Payback/Comercializador Actual',
+]
+CSV_ENGINES = ('c', 'pyarrow')
+FFILLED_ATTR = 'ffilled_columns'  # df.attrs: columnas ya rellenadas (por archivo o por bloque)
 
-def load_opportunities(path: str) -> pd.DataFrame:
+
+def read_opportunities_header(path: str) -> list:
     """
-    Carga un archivo CSV de oportunidades en un DataFrame de pandas.
-    - Verifica existencia de columnas mínimas.
-    - Limpia y convierte columnas numéricas.
+    Lee solo el encabezado del CSV y valida las columnas obligatorias (sin parsear datos).
     """
     path = path.strip().strip('"').strip("'")
     if not os.path.exists(path):
         raise FileNotFoundError(f"El archivo de oportunidades {path} no existe.")
-
-    df = pd.read_csv(path)
-
-    expected_columns = [
-        'Oportunidad', 'Cliente',
-        'Calculadora Payback/kWh Promedio / Mes',
-        'Calculadora Payback/Region',
-        'Costo Total Opex Oportunity',
-        'Costo Total Capex Oportunity',
-        'Tarifa B',
-        'Calculadora Payback/Modem & Medidor',
-        'Calculadora Payback/Ciiu'
-    ]
-    missing = set(expected_columns) - set(df.columns)
+    header = list(pd.read_csv(path, nrows=0).columns)
+    missing = set(OPPORTUNITY_REQUIRED_COLUMNS) - set(header)
     if missing:
         raise ValueError(f"Faltan columnas obligatorias en oportunidades: {missing}")
+    return header
+
+
+def _read_options(header: list, usecols, engine: str) -> dict:
+    if engine not in CSV_ENGINES:
+        raise ValueError(f"Motor CSV inválido: {engine}. Opciones: {CSV_ENGINES}")
+    if engine == 'pyarrow':
+        try:
+            import pyarrow  # noqa: F401
+        except ImportError as e:
+            raise ImportError("El motor 'pyarrow' requiere instalar pyarrow (pip install pyarrow).") from e
+    cols = [c for c in header if usecols is None or c in set(usecols)]
+    if engine == 'pyarrow':
+        # pyarrow ya entrega columnas numéricas tipadas; las que traen comas llegan como texto
+        return {'usecols': cols, 'engine': engine}
+    # Numéricas como texto: se limpian los separadores de miles en bloque (ver _clean_numeric)
+    dtype = {c: 'str' for c in cols if c in OPPORTUNITY_NUMERIC_COLUMNS}
+    return {'usecols': cols, 'dtype': dtype, 'engine': engine}
+
+
+def _clean_numeric(df: pd.DataFrame) -> pd.DataFrame:
+    """'1,234.5' -> 1234.5; vacíos o inválidos -> 0."""
+    for col in OPPORTUNITY_NUMERIC_COLUMNS:
+        if col not in df.columns:
+            continue
+        s = df[col]
+        if not pd.api.types.is_numeric_dtype(s) or pd.api.types.is_bool_dtype(s):
+            s = pd.to_numeric(s.astype('str').str.replace(',', '', regex=False).str.strip(), errors='coerce')
+        df[col] = s.fillna(0)
+    return df
+
+
+def load_opportunities(path: str, usecols=None, engine: str = 'c') -> pd.DataFrame:
+    """
+    Carga un archivo CSV de oportunidades en un DataFrame de pandas.
+    - Verifica existencia de columnas mínimas (solo con el encabezado, antes de parsear).
+    - Limpia y convierte columnas numéricas.
+    - usecols: columnas a leer (ej. OPPORTUNITY_PIPELINE_COLUMNS); None = todas.
+    - engine: 'c' (por defecto) o 'pyarrow' (más rápido si está instalado).
+    Para exportaciones que no caben en memoria, ver iter_opportunities.
+    """
+    path = path.strip().strip('"').strip("'")
+    header = read_opportunities_header(path)
+    df = pd.read_csv(path, **_read_options(header, usecols, engine))
+    return _clean_numeric(df)
+
+
+def _full_read_dtypes(path: str, opts: dict, chunksize: int) -> dict:
+    """
+    Tipo que tendría cada columna leyendo el archivo completo: el común (como en pd.concat) de
+    los tipos de cada bloque. Un bloque sin ningún valor en la columna no cuenta, salvo que
+    obliga a admitir NaN (int pasa a float y bool a object).
+    """
+    seen: Dict[str, dict] = {}
+    empty: set = set()
+    with pd.read_csv(path, chunksize=chunksize, **opts) as reader:
+        for chunk in reader:
+            chunk = _clean_numeric(chunk)
+            for c in chunk.columns:
+                if chunk[c].isna().all():
+                    empty.add(c)
+                else:
+                    seen.setdefault(c, {})[chunk[c].dtype] = None
+    dtypes = {}
+    for c in set(seen) | empty:
+        kinds = list(seen.get(c, ())) or [np.dtype('float64')]
+        if c in empty:
+            kinds = [np.dtype('float64') if pd.api.types.is_integer_dtype(t) else
+                     np.dtype('object') if pd.api.types.is_bool_dtype(t) else t for t in kinds]
+        dtypes[c] = pd.concat([pd.Series([], dtype=t) for t in kinds]).dtype
+    return dtypes
+
+
+def iter_opportunities(path: str, chunksize: int = 100_000, usecols=None, engine: str = 'c',
+                       ffill_cols=(), key: str = 'Oportunidad'):
+    """
+    Lee el CSV por bloques de ~chunksize filas con memoria acotada (un bloque más la
+    oportunidad más larga). Cada bloque corta justo antes de una fila con `key`, así que las
+    filas de detalle de una oportunidad nunca quedan separadas de su cabecera.
+    - Los tipos son los de load_opportunities sobre el archivo completo: una primera pasada
+      por bloques los determina (el CSV se parsea dos veces).
+    - ffill_cols se rellenan hacia adelante continuando con el último valor del bloque
+      anterior (mismo resultado que rellenar el archivo completo) y quedan listadas en
+      attrs[FFILLED_ATTR].
+    Unir los bloques da lo mismo que load_opportunities más ese relleno.
+    """
+    if engine == 'pyarrow':
+        raise ValueError("La lectura por bloques no está disponible con el motor 'pyarrow'.")
+    path = path.strip().strip('"').strip("'")
+    header = read_opportunities_header(path)
+    opts = _read_options(header, usecols, engine)
+    dtypes = _full_read_dtypes(path, opts, chunksize)
+    ffill_cols = [c for c in ffill_cols if c in dtypes]
+    carry: Dict[str, Any] = {}
+    pending = None
+
+    def emit(block: pd.DataFrame) -> pd.DataFrame:
+        block = block.reset_index(drop=True)
+        for c in ffill_cols:
+            s = block[c].ffill()
+            if c in carry and s.isna().any():
+                s = s.fillna(carry[c])
+            block[c] = s
+            last = s.iloc[-1]
+            if not pd.isna(last):
+                carry[c] = last
+        block.attrs[FFILLED_ATTR] = list(ffill_cols)
+        return block
+
+    with pd.read_csv(path, chunksize=chunksize, **opts) as reader:
+        for chunk in reader:
+            chunk = _clean_numeric(chunk).astype(dtypes)
+            buf = chunk if pending is None else pd.concat([pending, chunk], ignore_index=True)
+            starts = np.flatnonzero(buf[key].notna().to_numpy()) if key in buf.columns else []
+            cut = starts[-1] if len(starts) else 0
+            if cut == 0:
+                pending = buf
+                continue
+            yield emit(buf.iloc[:cut])
+            pending = buf.iloc[cut:]
+    if pending is not None and len(pending):
+        yield emit(pending)
+
+
+def opportunity_csv_paths(spec: str) -> list:
+    """
+    CSV de oportunidades de `spec`: un archivo, una carpeta (sus *.csv) o un patrón glob
+    (p. ej. exports/region_*.csv), en orden de nombre.
+    """
+    spec = spec.strip().strip('"').strip("'")
+    if os.path.isfile(spec):
+        return [spec]
+    if os.path.isdir(spec):
+        paths = glob.glob(os.path.join(spec, '*.csv')) + glob.glob(os.path.join(spec, '*.CSV'))
+    else:
+        paths = glob.glob(spec)
+    paths = sorted(p for p in set(paths) if os.path.isfile(p))
+    if not paths:
+        raise FileNotFoundError(f"No hay CSV de oportunidades en: {spec}")
+    return paths
 
-    # Limpieza y conversión de columnas numéricas
-    numeric_cols = [
-        'Calculadora Payback/kWh Promedio / Mes',
-        'Calculadora Payback/Modem & Medidor',
-        'Costo Total Opex Oportunity',
-        'Costo Total Capex Oportunity',
-        'Tarifa B'
-    ]
-    for col in numeric_cols:
-        df[col] = df[col].astype(str).str.replace(',', '').str.strip()
-        df[col] = pd.to_numeric(df[col], errors='coerce').fillna(0)
 
+def _load_opportunity_file(task) -> pd.DataFrame:
+    path, usecols, engine, ffill_cols = task
+    df = load_opportunities(path, usecols=usecols, engine=engine)
+    for c in ffill_cols:
+        if c in df.columns:
+            df[c] = df[c].ffill()
     return df
 
 
+def load_opportunity_files(paths, usecols=None, engine: str = 'c',
+                           workers: Optional[int] = None, ffill_cols=(), key: str = 'Oportunidad',
+                           stats: Optional[Dict[str, int]] = None) -> pd.DataFrame:
+    """
+    Varios CSV de oportunidades (p. ej. uno por región o equipo) -> un solo DataFrame.
+    - Cada archivo se lee con load_opportunities en un proceso aparte (workers: por defecto
+      uno por archivo, hasta el número de CPUs).
+    - ffill_cols se rellenan hacia adelante dentro de cada archivo: nunca pasa un valor de
+      un archivo al siguiente.
+    - Las filas al inicio de un archivo (salvo el primero) sin `key` ya rellenada no
+      pertenecen a ninguna de sus oportunidades y se descartan: unidas al resto heredarían
+      la última oportunidad del archivo anterior.
+    - Una oportunidad (`key`) que aparece en varios archivos se toma solo del primero, en
+      el orden de `paths`.
+    El resultado tiene las mismas columnas que load_opportunities; attrs[FFILLED_ATTR] lista
+    las ffill_cols ya rellenadas, que no se deben volver a rellenar sobre el DataFrame unido
+    (un valor vacío al inicio de un archivo heredaría el del archivo anterior; ver
+    run_opps_sql.ffill_identity).
+    `stats` recibe {'files', 'rows', 'duplicated_opportunities', 'duplicated_rows', 'orphan_rows'}.
+    """
+    paths = list(paths)
+    tasks = [(p, usecols, engine, list(ffill_cols)) for p in paths]
+    workers = min(len(paths), workers or os.cpu_count() or 1)
+    if workers > 1:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            frames = list(pool.map(_load_opportunity_file, tasks))
+    else:
+        frames = [_load_opportunity_file(t) for t in tasks]
+
+    seen: set = set()
+    kept = []
+    dup_opps = dup_rows = orphan_rows = 0
+    for i, df in enumerate(frames):
+        if key in df.columns:
+            orphan = df[key].isna().cummin()
+            if i and orphan.any():
+                orphan_rows += int(orphan.sum())
+                df = df[~orphan]
+            keys = df[key]
+            uniq = keys.dropna().unique().tolist()
+            repeated = [k for k in uniq if k in seen]
+            if repeated:
+                dup = keys.isin(repeated)
+                dup_opps += len(repeated)
+                dup_rows += int(dup.sum())
+                df = df[~dup]
+            seen.update(uniq)
+        kept.append(df)
+    out = pd.concat(kept, ignore_index=True) if kept else pd.DataFrame()
+    out.attrs[FFILLED_ATTR] = list(ffill_cols)
+    if stats is not None:
+        stats.update(files=len(paths), rows=len(out), duplicated_opportunities=dup_opps,
+                     duplicated_rows=dup_rows, orphan_rows=orphan_rows)
+    return out
+
+
+def iter_json_array(path: str, chunk_size: int = 1 << 16):
+    """
+    Recorre una lista JSON (como las de outputs/) elemento a elemento, leyendo el archivo por
+    bloques con JSONDecoder.raw_decode: en memoria solo queda el elemento actual y el bloque.
+    `path` también puede ser un archivo de texto ya abierto (p. ej. uno descomprimido).
+    """
+    decoder = json.JSONDecoder()
+    opened = open(path, 'r', encoding='utf-8') if isinstance(path, (str, os.PathLike)) else nullcontext(path)
+    with opened as f:
+        buf, pos, eof = '', 0, False
+
+        def fill(pos):
+            nonlocal buf, eof
+            # Bloques crecientes: un elemento grande no se re-parsea O(n) veces
+            more = f.read(max(chunk_size, len(buf) - pos))
+            eof = not more
+            buf = buf[pos:] + more
+            return 0
+
+        def skip_ws(pos):
+            while True:
+                while pos < len(buf) and buf[pos] in ' \t\r\n':
+                    pos += 1
+                if pos < len(buf) or eof:
+                    return pos
+                pos = fill(pos)
+
+        pos = skip_ws(pos)
+        if pos >= len(buf) or buf[pos] != '[':
+            raise ValueError(f'{path}: se esperaba una lista JSON')
+        pos = skip_ws(pos + 1)
+        if pos < len(buf) and buf[pos] == ']':
+            return
+        while True:
+            try:
+                item, end = decoder.raw_decode(buf, pos)
+                # Un escalar al final del bloque puede estar cortado (p. ej. 12 de 123, 1.5 de 1.5e3)
+                truncated = (not eof and not isinstance(item, (dict, list))
+                             and (end >= len(buf) or buf[end] not in ' \t\r\n,]'))
+            except json.JSONDecodeError:
+                if eof:
+                    raise
+                truncated = True
+            if truncated:
+                pos = fill(pos)
+                continue
+            yield item
+            pos = skip_ws(end)
+            if pos >= len(buf):
+                raise ValueError(f'{path}: lista JSON incompleta')
+            if buf[pos] == ']':
+                return
+            if buf[pos] != ',':
+                raise ValueError(f'{path}: se esperaba "," o "]" en la posición {pos}')
+            pos = skip_ws(pos + 1)
+
+
 def get_csv_path() -> str:
     """
     Obtiene la ruta al CSV de oportunidades: argumento en línea de comandos o input.
@@ -0,0 +1,204 @@
+# src/tariff_cache.py
+"""
+Caché local de snapshots de tarifas.
+
+- Cada snapshot se guarda una sola vez, direccionado por el sha256 del CSV descargado
+  (data/tariff_cache/blobs/<sha>.pkl, DataFrame en pickle: carga en milisegundos).
+- Un manifiesto por origen (URL del Lambda) y TARIFF_RESOURCE_ID guarda, por URL de CSV
+  resuelta, el sha del contenido, ETag/Last-Modified y la hora de la última validación.
+  Un Lambda distinto del de producción (p. ej. un sustituto local) no comparte manifiesto.
+- Dentro del TTL no se toca la red. Vencido el TTL se resuelve la URL y se revalida
+  con If-None-Match / If-Modified-Since cuando el servidor entregó esas cabeceras.
+- Modo offline: solo lee la caché (último snapshot conocido del resource_id).
+- La red pasa por HttpTariffSource (sesión con pool, timeouts y reintentos).
+"""
+import hashlib
+import io
+import json
+import os
+import threading
+import time
+from typing import Any, Dict, Optional, Tuple
+
+import pandas as pd
+
+try:
+    from src.srcload import HttpTariffSource, LAMBDA_URL
+except Exception:
+    from srcload import HttpTariffSource, LAMBDA_URL
+
+TARIFF_CACHE_DIR = os.path.join('data', 'tariff_cache')
+TARIFF_CACHE_TTL = 6 * 3600  # segundos
+
+
+def _sha256(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()
+
+
+def source_id(lambda_url: Optional[str]) -> Optional[str]:
+    """Identidad del origen para el manifiesto: None para el Lambda de producción."""
+    url = (lambda_url or LAMBDA_URL).rstrip('/')
+    return None if url == LAMBDA_URL.rstrip('/') else _sha256(url.encode('utf-8'))[:12]
+
+
+def cache_key(resource_id: int, csv_url: str) -> str:
+    """Llave de una entrada del manifiesto: (TARIFF_RESOURCE_ID, URL resuelta)."""
+    return _sha256(f'{resource_id}|{csv_url}'.encode('utf-8'))[:32]
+
+
+def _tmp_path(path: str) -> str:
+    # único por proceso e hilo: varios recursos se pueden descargar a la vez
+    return f'{path}.tmp{os.getpid()}.{threading.get_ident()}'
+
+
+def _write_atomic(path: str, data: bytes) -> None:
+    tmp = _tmp_path(path)
+    with open(tmp, 'wb') as f:
+        f.write(data)
+    os.replace(tmp, path)
+
+
+class TariffCache:
+    """Snapshots de tarifas en disco, direccionados por contenido."""
+
+    def __init__(self, cache_dir: str = TARIFF_CACHE_DIR, ttl: float = TARIFF_CACHE_TTL):
+        self.cache_dir = cache_dir
+        self.ttl = float(ttl)
+        self.blobs_dir = os.path.join(cache_dir, 'blobs')
+        os.makedirs(self.blobs_dir, exist_ok=True)
+
+    # --------- Manifiesto ---------
+    def _manifest_path(self, resource_id: int, lambda_url: Optional[str] = None) -> str:
+        origin = source_id(lambda_url)
+        name = f'resource_{resource_id}.json' if origin is None else f'resource_{resource_id}_{origin}.json'
+        return os.path.join(self.cache_dir, name)
+
+    def load_manifest(self, resource_id: int, lambda_url: Optional[str] = None) -> Dict[str, Any]:
+        try:
+            with open(self._manifest_path(resource_id, lambda_url), 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except Exception:
+            return {'resource_id': resource_id, 'lambda_url': lambda_url or LAMBDA_URL, 'latest': None, 'entries': {}}
+
+    def save_manifest(self, resource_id: int, manifest: Dict[str, Any], lambda_url: Optional[str] = None) -> None:
+        data = json.dumps(manifest, ensure_ascii=False, indent=2).encode('utf-8')
+        _write_atomic(self._manifest_path(resource_id, lambda_url), data)
+
+    # --------- Blobs ---------
+    def _blob_path(self, sha: str) -> str:
+        return os.path.join(self.blobs_dir, f'{sha}.pkl')
+
+    def has_blob(self, sha: Optional[str]) -> bool:
+        return bool(sha) and os.path.exists(self._blob_path(sha))
+
+    def read_blob(self, sha: str) -> pd.DataFrame:
+        return pd.read_pickle(self._blob_path(sha))
+
+    def write_blob(self, sha: str, df: pd.DataFrame) -> None:
+        path = self._blob_path(sha)
+        if os.path.exists(path):
+            return
+        tmp = _tmp_path(path)
+        df.to_pickle(tmp)
+        os.replace(tmp, path)
+
+    # --------- Consulta ---------
+    def fetch(self, lambda_url: str, resource_id: int, offline: bool = False,
+              source: Optional[HttpTariffSource] = None) -> Tuple[pd.DataFrame, Dict[str, Any]]:
+        """
+        Devuelve (df_tarifas, info). info['status'] es uno de:
+          'hit'         -> snapshot dentro del TTL, sin red
+          'revalidated' -> el servidor confirmó que no cambió (304 o mismo contenido)
+          'miss'        -> se descargó y guardó un snapshot nuevo
+          'offline'     -> modo offline, último snapshot conocido
+        """
+        t0 = time.perf_counter()
+        now = time.time()
+        if source is not None:
+            lambda_url = source.lambda_url
+        manifest = self.load_manifest(resource_id, lambda_url)
+        latest_key = manifest.get('latest')
+        latest = manifest['entries'].get(latest_key) if latest_key else None
+
+        if offline:
+            if not latest or not self.has_blob(latest.get('sha256')):
+                raise FileNotFoundError(
+                    f'Modo offline: no hay snapshot de tarifas en caché para resource_id={resource_id} '
+                    f'desde {lambda_url or LAMBDA_URL} ({self.cache_dir}).'
+                )
+            df = self.read_blob(latest['sha256'])
+            return df, self._info('offline', latest_key, latest, now, t0)
+
+        if latest and self.has_blob(latest.get('sha256')) and now - latest.get('checked_at', 0) < self.ttl:
+            df = self.read_blob(latest['sha256'])
+            return df, self._info('hit', latest_key, latest, now, t0)
+
+        source = source or HttpTariffSource(lambda_url, resource_id)
+        csv_url = source.resolve_csv_url()
+        key = cache_key(resource_id, csv_url)
+        entry = manifest['entries'].get(key)
+
+        headers = {}
+        if entry and self.has_blob(entry.get('sha256')):
+            if entry.get('etag'):
+                headers['If-None-Match'] = entry['etag']
+            if entry.get('last_modified'):
+                headers['If-Modified-Since'] = entry['last_modified']
+
+        response = source.get_csv(csv_url, headers)
+        if response.status_code == 304 and entry:
+            status, sha = 'revalidated', entry['sha256']
+            df = self.read_blob(sha)
+        else:
+            response.raise_for_status()
+            content = response.content
+            sha = _sha256(content)
+            if self.has_blob(sha):
+                status = 'revalidated'
+                df = self.read_blob(sha)
+            else:
+                status = 'miss'
+                df = pd.read_csv(io.BytesIO(content))
+                self.write_blob(sha, df)
+            entry = {
+                'csv_url': csv_url,
+                'sha256': sha,
+                'etag': response.headers.get('ETag'),
+                'last_modified': response.headers.get('Last-Modified'),
+                'rows': int(len(df)),
+                'fetched_at': now,
+            }
+
+        entry['checked_at'] = now
+        manifest['entries'][key] = entry
+        manifest['latest'] = key
+        self.save_manifest(resource_id, manifest, lambda_url)
+        return df, self._info(status, key, entry, now, t0)
+
+    def _info(self, status: str, key: str, entry: Dict[str, Any], now: float, t0: float) -> Dict[str, Any]:
+        return {
+            'status': status,
+            'key': key,
+            'sha256': entry.get('sha256'),
+            'rows': entry.get('rows'),
+            'age_s': round(now - entry.get('fetched_at', now), 1),
+            'elapsed_ms': round((time.perf_counter() - t0) * 1000, 1),
+        }
+
+
+def fetch_tariffs_cached(lambda_url: str, resource_id: int,
+                         cache_dir: str = TARIFF_CACHE_DIR,
+                         ttl: float = TARIFF_CACHE_TTL,
+                         offline: bool = False,
+                         source: Optional[HttpTariffSource] = None) -> Tuple[pd.DataFrame, Dict[str, Any]]:
+    """Atajo: TariffCache(cache_dir, ttl).fetch(...)."""
+    return TariffCache(cache_dir, ttl).fetch(lambda_url, resource_id, offline=offline, source=source)
+
+
+def describe_cache_info(info: Dict[str, Any]) -> str:
+    if info['status'] == 'source':
+        return f"tarifas desde {info.get('source')} (sin caché) — {info.get('rows')} filas, {info.get('elapsed_ms')} ms"
+    labels = {'hit': 'HIT', 'revalidated': 'HIT (revalidado)', 'miss': 'MISS', 'offline': 'OFFLINE'}
+    return (f"caché de tarifas {labels.get(info['status'], info['status'])} — "
+            f"{info.get('rows')} filas, snapshot {str(info.get('sha256'))[:12]}, "
+            f"edad {info.get('age_s')} s, {info.get('elapsed_ms')} ms")
@@ -0,0 +1,152 @@
+# src/tariff_index.py
+"""
+Índice denso de tarifas sobre NumPy.
+
+Codifica mes, ciudad, nivel y provider como enteros (vocabularios ordenados) y guarda
+las tarifas en un arreglo float64 [mes, ciudad, nivel, provider] con NaN donde no hay
+tarifa. El eje de nivel contiene tanto niveles compuestos (nivel_1_user) como simples
+(NIVEL 1), de modo que una sola estructura reemplaza a build_index_comp,
+build_index_simple y build_bucket.
+
+Se guarda como carpeta con rates.npy + vocab.json y se abre con np.load(mmap_mode='r'),
+así varias corridas o procesos comparten el mismo índice sin reconstruirlo.
+"""
+import hashlib
+import json
+import os
+from typing import Dict, Iterable, List, Optional, Sequence
+
+import numpy as np
+import pandas as pd
+
+_AXES = ('months', 'cities', 'levels', 'providers')
+
+
+def frame_fingerprint(df: pd.DataFrame) -> str:
+    """
+    Huella del DataFrame de tarifas preparado (para saber si un índice guardado sigue vigente):
+    sha256 de los hashes de fila en orden, más los nombres de columna. Depende del orden de
+    las filas, que importa (en llaves repetidas el índice se queda con la última).
+    """
+    h = pd.util.hash_pandas_object(df.reset_index(drop=True), index=False).to_numpy()
+    digest = hashlib.sha256(json.dumps([str(c) for c in df.columns]).encode('utf-8'))
+    digest.update(h.tobytes())
+    return f'{len(df)}-{digest.hexdigest()}'
+
+
+class TariffIndex:
+    """Tarifas en un tensor denso [mes, ciudad, nivel, provider] con búsquedas vectorizadas."""
+
+    def __init__(self, months: Sequence[str], cities: Sequence[str], levels: Sequence[str],
+                 providers: Sequence[str], rates: np.ndarray, fingerprint: Optional[str] = None):
+        self.months = list(months)
+        self.cities = list(cities)
+        self.levels = list(levels)
+        self.providers = list(providers)
+        self.rates = rates
+        self.fingerprint = fingerprint
+        self._codes = {
+            axis: {v: i for i, v in enumerate(getattr(self, axis))}
+            for axis in _AXES
+        }
+
+    # --------- Construcción ---------
+    @classmethod
+    def from_frame(cls, df: pd.DataFrame) -> 'TariffIndex':
+        """
+        df: salida de prep_tariffs (mes_key, city_n, provider_n, tarifa, nivel_comp, nivel_simp).
+        Con llaves repetidas gana la última fila, igual que en los índices dict.
+        """
+        parts = []
+        for level_col in ('nivel_comp', 'nivel_simp'):
+            sub = df.dropna(subset=[level_col])
+            sub = sub[['mes_key', 'city_n', level_col, 'provider_n', 'tarifa']].rename(columns={level_col: 'nivel'})
+            parts.append(sub.drop_duplicates(subset=['mes_key', 'city_n', 'nivel', 'provider_n'], keep='last'))
+        flat = pd.concat(parts, ignore_index=True)
+
+        vocab = {
+            'months': sorted(df['mes_key'].unique()),
+            'cities': sorted(flat['city_n'].unique()),
+            'levels': sorted(flat['nivel'].unique()),
+            'providers': sorted(flat['provider_n'].unique()),
+        }
+        shape = tuple(len(vocab[a]) for a in _AXES)
+        rates = np.full(shape, np.nan, dtype=np.float64)
+
+        codes = [
+            pd.Categorical(flat[col], categories=vocab[axis]).codes
+            for col, axis in zip(('mes_key', 'city_n', 'nivel', 'provider_n'), _AXES)
+        ]
+        rates[tuple(codes)] = flat['tarifa'].to_numpy(dtype=np.float64)
+        return cls(rates=rates, fingerprint=frame_fingerprint(df), **vocab)
+
+    # --------- Persistencia ---------
+    def save(self, path: str) -> None:
+        os.makedirs(path, exist_ok=True)
+        tmp = os.path.join(path, f'rates.npy.tmp{os.getpid()}')
+        with open(tmp, 'wb') as f:
+            np.save(f, np.ascontiguousarray(self.rates))
+        os.replace(tmp, os.path.join(path, 'rates.npy'))
+        meta = {axis: getattr(self, axis) for axis in _AXES}
+        meta['fingerprint'] = self.fingerprint
+        with open(os.path.join(path, 'vocab.json'), 'w', encoding='utf-8') as f:
+            json.dump(meta, f, ensure_ascii=False)
+
+    @classmethod
+    def load(cls, path: str, mmap: bool = True) -> 'TariffIndex':
+        with open(os.path.join(path, 'vocab.json'), 'r', encoding='utf-8') as f:
+            meta = json.load(f)
+        rates = np.load(os.path.join(path, 'rates.npy'), mmap_mode='r' if mmap else None)
+        return cls(meta['months'], meta['cities'], meta['levels'], meta['providers'], rates,
+                   fingerprint=meta.get('fingerprint'))
+
+    @classmethod
+    def load_or_build(cls, df: pd.DataFrame, path: Optional[str]) -> 'TariffIndex':
+        """Reutiliza el índice guardado en `path` si corresponde a `df`; si no, lo construye y guarda."""
+        if path and os.path.exists(os.path.join(path, 'vocab.json')):
+            idx = cls.load(path)
+            if idx.fingerprint == frame_fingerprint(df):
+                return idx
+        idx = cls.from_frame(df)
+        if path:
+            idx.save(path)
+        return idx
+
+    # --------- Búsquedas ---------
+    def encode(self, axis: str, values: Iterable) -> np.ndarray:
+        """Códigos enteros para `values` en el eje dado (-1 si no existe o es None)."""
+        codes = self._codes[axis]
+        return np.fromiter((codes.get(v, -1) for v in values), dtype=np.int64)
+
+    def code(self, axis: str, value) -> int:
+        return self._codes[axis].get(value, -1)
+
+    def gather(self, m: np.ndarray, c: np.ndarray, l: np.ndarray, p: np.ndarray) -> np.ndarray:
+        """Tarifas para arreglos de códigos (se difunden entre sí); NaN si algún código es -1."""
+        m, c, l, p = np.broadcast_arrays(*(np.asarray(x, dtype=np.int64) for x in (m, c, l, p)))
+        ok = (m >= 0) & (c >= 0) & (l >= 0) & (p >= 0)
+        out = np.full(m.shape, np.nan, dtype=np.float64)
+        out[ok] = self.rates[m[ok], c[ok], l[ok], p[ok]]
+        return out
+
+    def lookup(self, mes: str, city: str, nivel: Optional[str], provider: str) -> Optional[float]:
+        """Equivalente escalar de index.get((mes, city, nivel, provider))."""
+        m, c, l, p = (self.code(a, v) for a, v in zip(_AXES, (mes, city, nivel, provider)))
+        if min(m, c, l, p) < 0:
+            return None
+        t = self.rates[m, c, l, p]
+        return None if np.isnan(t) else float(t)
+
+    def providers_at(self, mes: str, city: str, nivel: Optional[str]) -> List[str]:
+        """Providers con tarifa en (mes, city, nivel), ordenados (equivale a build_bucket)."""
+        m, c, l = (self.code(a, v) for a, v in zip(_AXES[:3], (mes, city, nivel)))
+        if min(m, c, l) < 0:
+            return []
+        return [self.providers[i] for i in np.flatnonzero(~np.isnan(self.rates[m, c, l]))]
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            'shape': list(self.rates.shape),
+            'entries': int(np.count_nonzero(~np.isnan(self.rates))),
+            'bytes': int(self.rates.nbytes),
+        }
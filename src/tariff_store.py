@@ -0,0 +1,197 @@
+# src/tariff_store.py
+"""
+Almacén de tarifas ya preparadas (salida de prep_tariffs), particionado por mes_key.
+
+- Cada mes es un archivo propio: data/tariff_store/<firma>/mes=YYYY-MM/<hash>.pkl
+  (DataFrame en pickle, como los snapshots de tariff_cache). <hash> es la huella de las
+  filas crudas de ese mes: si el mes no cambió entre snapshots, su partición se reutiliza.
+- Una consulta --from/--to abre solo las particiones del rango; los meses nuevos (o los
+  que cambiaron) se preparan y agregan como particiones nuevas, sin reescribir las demás.
+- La firma identifica cómo se prepararon (providers objetivo del mapeo, umbral de
+  coincidencia, versión): otro mapeo usa otra carpeta.
+- El manifiesto recuerda, por sha256 del snapshot (tariff_cache), sus meses y las huellas
+  ya verificadas: con un snapshot conocido ni siquiera se recorren las tarifas crudas.
+- sync() trabaja con el manifiesto bloqueado (archivo manifest.lock): dos corridas a la vez
+  sobre la misma carpeta se turnan y ninguna pisa las particiones que agregó la otra.
+"""
+import contextlib
+import hashlib
+import json
+import os
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional, Sequence
+
+import pandas as pd
+
+TARIFF_STORE_DIR = os.path.join('data', 'tariff_store')
+STORE_VERSION = 1
+LOCK_TIMEOUT = 300.0  # segundos esperando el manifiesto antes de fallar
+LOCK_STALE = 3600.0   # un lock más viejo que esto se considera abandonado
+RAW_COLUMNS = ['mes', 'provider', 'city', 'nivel_de_tension', 'tarifa']
+
+
+def store_signature(*parts: Any) -> str:
+    """
+    Firma de la preparación (p. ej. providers objetivo y umbral) -> carpeta del almacén.
+    Las listas se toman en el orden dado: si el orden cambia el resultado, cambia la firma.
+    """
+    payload = json.dumps([STORE_VERSION, *parts], sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()[:16]
+
+
+def month_keys(df_raw: pd.DataFrame) -> pd.Series:
+    """mes_key de cada fila cruda, igual que prep_tariffs."""
+    return df_raw['mes'].astype(str).str[:7]
+
+
+def raw_fingerprint(df_raw: pd.DataFrame) -> str:
+    """Huella (dependiente del orden) de las filas crudas de una partición."""
+    cols = [c for c in RAW_COLUMNS if c in df_raw.columns]
+    h = pd.util.hash_pandas_object(df_raw[cols], index=False).to_numpy()
+    return hashlib.sha256(h.tobytes()).hexdigest()[:20]
+
+
+def _tmp_path(path: str) -> str:
+    return f'{path}.tmp{os.getpid()}.{threading.get_ident()}'
+
+
+class TariffStore:
+    """Tarifas preparadas, una partición por mes."""
+
+    def __init__(self, root: str = TARIFF_STORE_DIR, signature: str = 'default'):
+        self.root = os.path.join(root, signature)
+        self.manifest_path = os.path.join(self.root, 'manifest.json')
+        self.lock_path = os.path.join(self.root, 'manifest.lock')
+        os.makedirs(self.root, exist_ok=True)
+        self.manifest = self._load_manifest()
+
+    # --------- Manifiesto ---------
+    def _load_manifest(self) -> Dict[str, Any]:
+        try:
+            with open(self.manifest_path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            data = {}
+        data.setdefault('version', STORE_VERSION)
+        data.setdefault('months', {})
+        data.setdefault('snapshots', {})
+        return data
+
+    @contextlib.contextmanager
+    def _locked(self, timeout: float = LOCK_TIMEOUT):
+        """Bloqueo entre procesos del manifiesto (creación exclusiva de manifest.lock)."""
+        deadline = time.monotonic() + timeout
+        while True:
+            try:
+                fd = os.open(self.lock_path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+                break
+            except FileExistsError:
+                try:
+                    if time.time() - os.path.getmtime(self.lock_path) > LOCK_STALE:
+                        os.remove(self.lock_path)
+                        continue
+                except FileNotFoundError:
+                    continue
+                if time.monotonic() > deadline:
+                    raise TimeoutError(f'El almacén de tarifas está bloqueado por otra corrida: {self.lock_path}')
+                time.sleep(0.05)
+        try:
+            os.write(fd, str(os.getpid()).encode('ascii'))
+            os.close(fd)
+            self.manifest = self._load_manifest()  # lo que hayan guardado otras corridas
+            yield
+        finally:
+            try:
+                os.remove(self.lock_path)
+            except FileNotFoundError:
+                pass
+
+    def _save_manifest(self) -> None:
+        tmp = _tmp_path(self.manifest_path)
+        with open(tmp, 'w', encoding='utf-8') as f:
+            json.dump(self.manifest, f, indent=2, sort_keys=True)
+        os.replace(tmp, self.manifest_path)
+
+    def months(self) -> List[str]:
+        return sorted(self.manifest['months'])
+
+    def _has_partition(self, month: str, fingerprint: Optional[str]) -> bool:
+        entry = self.manifest['months'].get(month)
+        return (entry is not None and entry['raw_hash'] == fingerprint
+                and os.path.exists(os.path.join(self.root, entry['file'])))
+
+    # --------- Escritura ---------
+    def _write_partition(self, month: str, fingerprint: str, df: pd.DataFrame) -> None:
+        rel = os.path.join(f'mes={month}', f'{fingerprint}.pkl')
+        path = os.path.join(self.root, rel)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp = _tmp_path(path)
+        df.to_pickle(tmp)
+        os.replace(tmp, path)
+        old = self.manifest['months'].get(month)
+        self.manifest['months'][month] = {'file': rel, 'raw_hash': fingerprint, 'rows': int(len(df)),
+                                          'written_at': time.time()}
+        if old and old['file'] != rel:
+            try:
+                os.remove(os.path.join(self.root, old['file']))
+            except FileNotFoundError:
+                pass
+
+    def sync(self, df_raw: pd.DataFrame, prepare: Callable[[pd.DataFrame], pd.DataFrame],
+             from_month: str, to_month: str, snapshot: Optional[str] = None) -> Dict[str, Any]:
+        """
+        Deja al día las particiones de [from_month, to_month] para estas tarifas crudas: los
+        meses sin partición o con filas distintas se preparan con `prepare` (solo sus filas)
+        y se guardan; el resto no se toca. `snapshot` (sha256 del snapshot de tariff_cache)
+        permite saltarse la lectura de df_raw si ya se verificó ese rango.
+        Devuelve {'months', 'reused', 'written', 'skipped_scan'}.
+        """
+        with self._locked():
+            return self._sync(df_raw, prepare, from_month, to_month, snapshot)
+
+    def _sync(self, df_raw: pd.DataFrame, prepare: Callable[[pd.DataFrame], pd.DataFrame],
+              from_month: str, to_month: str, snapshot: Optional[str]) -> Dict[str, Any]:
+        start, end = from_month.strip()[:7], to_month.strip()[:7]
+        snap = self.manifest['snapshots'].get(snapshot) if snapshot else None
+        if snap is not None:
+            wanted = [m for m in snap['months'] if start <= m <= end]
+            if all(self._has_partition(m, snap['hashes'].get(m)) for m in wanted):
+                return {'months': wanted, 'reused': len(wanted), 'written': 0, 'skipped_scan': True}
+
+        keys = month_keys(df_raw)
+        positions = keys.groupby(keys, sort=True).indices
+        wanted = [m for m in positions if start <= m <= end]
+        written = 0
+        hashes: Dict[str, str] = {}
+        for m in wanted:
+            part = df_raw.iloc[positions[m]]
+            fp = raw_fingerprint(part)
+            hashes[m] = fp
+            if not self._has_partition(m, fp):
+                self._write_partition(m, fp, prepare(part))
+                written += 1
+        if snapshot:
+            snap = self.manifest['snapshots'].setdefault(snapshot, {'months': sorted(positions), 'hashes': {}})
+            snap['hashes'].update(hashes)
+        if written or snapshot:
+            self._save_manifest()
+        return {'months': wanted, 'reused': len(wanted) - written, 'written': written, 'skipped_scan': False}
+
+    # --------- Lectura ---------
+    def read_months(self, months: Sequence[str], columns: Optional[Sequence[str]] = None) -> pd.DataFrame:
+        """
+        Une solo las particiones pedidas, en orden de mes y, dentro de cada mes, en el orden de
+        las tarifas crudas (el mismo de preparar todo y filtrar si vienen ordenadas por mes).
+        """
+        frames = [pd.read_pickle(os.path.join(self.root, self.manifest['months'][m]['file']))
+                  for m in sorted(months)]
+        if not frames:
+            return pd.DataFrame(columns=list(columns) if columns else None)
+        df = pd.concat(frames) if len(frames) > 1 else frames[0]
+        return df[list(columns)] if columns else df
+
+    def query(self, from_month: str, to_month: str, columns: Optional[Sequence[str]] = None) -> pd.DataFrame:
+        """Tarifas preparadas de [from_month, to_month] (solo lo que ya está en el almacén)."""
+        start, end = from_month.strip()[:7], to_month.strip()[:7]
+        return self.read_months([m for m in self.months() if start <= m <= end], columns)
@@ -0,0 +1,166 @@
+# src/textnorm.py
+"""
+Canonicalización de texto compartida por todas las etapas (mapeos, tarifas y oportunidades).
+
+- norm_text: MAYÚSCULAS, sin tildes (NFKD sin marcas combinantes) y espacios colapsados.
+- clean_space: solo colapsa espacios.
+- canonical_simple / canonical_comp_from_tokens / nivel_compuesto: nivel de tensión
+  ('NIVEL 2', 'nivel_2_user', ...).
+- provider_tokens: tokens de un provider sin sufijos societarios (S.A. E.S.P., ...).
+
+Las funciones de texto se memorizan por valor (las columnas de ciudad, provider y nivel
+tienen pocas decenas de valores distintos) y usan tablas de traducción precompiladas.
+map_distinct aplica una de ellas una vez por valor distinto de una columna y difunde el
+resultado con los códigos de factorize.
+"""
+import unicodedata
+from functools import lru_cache
+from typing import Any, Callable, List, Optional
+
+import numpy as np
+import pandas as pd
+
+NORM_CACHE_SIZE = 1 << 16
+
+# Marcas combinantes del plano básico (tildes, diéresis, ...), para str.translate tras NFKD
+_COMBINING_TABLE = dict.fromkeys(cp for cp in range(0x300, 0x10000) if unicodedata.combining(chr(cp)))
+# Separadores que se leen como espacio al tokenizar niveles y providers
+_LEVEL_SEPARATORS = str.maketrans({'-': ' ', '/': ' ', '.': ' ', '_': ' '})
+_PROVIDER_SEPARATORS = str.maketrans({'.': ' ', '/': ' ', '-': ' '})
+PROVIDER_STOPWORDS = frozenset({'S', 'A', 'SA', 'SAS', 'ESP', 'E', 'P', 'ES', 'EP'})
+
+
+@lru_cache(maxsize=NORM_CACHE_SIZE)
+def _norm_str(s: str) -> str:
+    s = s.strip().upper()
+    if not s.isascii():
+        s = unicodedata.normalize('NFKD', s).translate(_COMBINING_TABLE)
+        if not s.isascii() and any(ord(c) > 0xFFFF for c in s):
+            s = ''.join(c for c in s if not unicodedata.combining(c))
+    return ' '.join(s.split())
+
+
+def norm_text(s: Any) -> str:
+    if s is None:
+        return ''
+    return _norm_str(s if isinstance(s, str) else str(s))
+
+
+def clean_space(s: Any) -> str:
+    return ' '.join(str(s or '').split())
+
+
+def clean_str(x: Any) -> str:
+    s = str(x) if x is not None else ''
+    return ' '.join(s.split())
+
+
+# --------- Nivel de tensión ---------
+@lru_cache(maxsize=NORM_CACHE_SIZE)
+def _simple_from_norm(nrm: str) -> Optional[str]:
+    if '1' in nrm: return 'NIVEL 1'
+    if '2' in nrm: return 'NIVEL 2'
+    if '3' in nrm: return 'NIVEL 3'
+    return None
+
+
+def canonical_simple(n: Any) -> Optional[str]:
+    """Devuelve 'NIVEL 1/2/3' si encuentra dígito, si no None."""
+    return _simple_from_norm(norm_text(n))
+
+
+@lru_cache(maxsize=NORM_CACHE_SIZE)
+def _comp_from_norm(nrm: str) -> Optional[str]:
+    toks = nrm.translate(_LEVEL_SEPARATORS).split()
+    # detectar dígito
+    dig = None
+    for d in ('1', '2', '3'):
+        if d in toks or f'NIVEL{d}' in toks or f'BT{d}' in toks or d in ''.join(toks):
+            dig = d
+            break
+    if not dig:
+        # también si viene como 'NIVEL 1 USER' -> buscar 'NIVEL' y el token siguiente numérico
+        for i, w in enumerate(toks[:-1]):
+            if 'NIVEL' in w and toks[i + 1] in ('1', '2', '3'):
+                dig = toks[i + 1]
+                break
+    if not dig:
+        return None
+
+    # detectar tipo
+    kind = None
+    joined = ' '.join(toks)
+    if 'OPERADOR' in joined or 'OPERATOR' in joined:
+        kind = 'operator'
+    elif 'USUARIO' in joined or 'USER' in joined:
+        kind = 'user'
+    elif 'COMPARTID' in joined or 'SHARED' in joined:
+        kind = 'shared'
+
+    return f"nivel_{dig}_{kind}" if kind else None
+
+
+def canonical_comp_from_tokens(txt: Any) -> Optional[str]:
+    """
+    Intenta construir nivel_{d}_{kind} a partir de texto (tarifas o calculadora).
+    Acepta variantes: NIVEL 1 OPERADOR, NIVEL_1_USER, BT1 USUARIO, etc.
+    """
+    return _comp_from_norm(norm_text(txt))
+
+
+def nivel_compuesto(propiedad_raw: Any, nivel_raw: Any) -> Optional[str]:
+    """
+    Nivel de una frontera de la calculadora a partir de la propiedad de equipos y el nivel:
+    nivel_{1|2|3}_{operator|user|shared}, o None si falta alguno de los dos.
+    """
+    n = canonical_simple(nivel_raw)  # -> 'NIVEL X' o None
+    if not n:
+        return None
+    p = norm_text(propiedad_raw)
+    # tipo por propiedad
+    if 'USUARIO' in p:
+        kind = 'user'
+    elif 'OPERADOR' in p:
+        kind = 'operator'
+    elif 'COMPARTID' in p or 'SHARED' in p:
+        kind = 'shared'
+    else:
+        return None
+    return f'nivel_{n[-1]}_{kind}'
+
+
+def nivel_frontera(propiedad_raw: Any, nivel_raw: Any) -> Optional[str]:
+    """nivel_compuesto, con respaldo al simple en minúsculas (nivel_2) si no se pudo componer."""
+    nivel_cmp = nivel_compuesto(propiedad_raw, nivel_raw)
+    if nivel_cmp is None:
+        ns = canonical_simple(nivel_raw)
+        nivel_cmp = ns.lower().replace(' ', '_') if ns else None
+    return nivel_cmp
+
+
+# --------- Providers ---------
+def provider_tokens(name: Any) -> List[str]:
+    s = norm_text(name).translate(_PROVIDER_SEPARATORS)
+    return [t for t in s.split() if t and t not in PROVIDER_STOPWORDS]
+
+
+# --------- Columnas ---------
+def map_distinct(values: pd.Series, fn: Callable[[Any], Any]) -> np.ndarray:
+    """
+    Igual que values.map(fn) (como arreglo de objetos), pero fn se aplica una vez por valor
+    distinto y el resultado se difunde con los códigos de factorize. Los nulos se resuelven
+    por tipo (None, NaN, pd.NA, ...) porque fn puede distinguir None de NaN.
+    """
+    codes, uniques = pd.factorize(values)
+    mapped = np.empty(len(uniques) + 1, dtype=object)
+    mapped[:-1] = [fn(u) for u in uniques]
+    out = mapped[codes]  # código -1 (nulo) -> última casilla, se completa abajo
+    na = np.flatnonzero(codes < 0)
+    if len(na):
+        raw = values.to_numpy(dtype=object)[na]
+        by_type = {}
+        for v in raw:
+            if type(v) not in by_type:
+                by_type[type(v)] = fn(v)
+        out[na] = [by_type[type(v)] for v in raw] if len(by_type) > 1 else by_type.popitem()[1]
+    return out
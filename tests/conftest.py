@@ -0,0 +1,44 @@
+# tests/conftest.py
+"""Raíz del repo en sys.path (los scripts run_*.py se importan como módulos)."""
+import os
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+import pandas as pd
+import pytest
+
+SYNTH_FRONTIERS = 3000
+SYNTH_MONTHS = 6
+
+
+@pytest.fixture(scope='session')
+def synth(tmp_path_factory):
+    """Datos sintéticos de benchmarks/synth.py ya preparados: oportunidades anidadas y tarifas."""
+    from benchmarks.synth import generate_dataset
+    import run_opps_sql
+    import run_tariff_analysis as rta
+    from src.srcload import load_opportunities, OPPORTUNITY_PIPELINE_COLUMNS
+
+    cwd = os.getcwd()
+    os.chdir(ROOT)  # synth y load_mapping_json buscan mappings/ relativo
+    try:
+        info = generate_dataset(str(tmp_path_factory.mktemp('synth')), SYNTH_FRONTIERS, SYNTH_MONTHS)
+        city_map = rta.load_mapping_json(None, 'cities_mapping.json')
+        prov_map = rta.load_mapping_json(None, 'providers_mapping.json')
+    finally:
+        os.chdir(cwd)
+    df_opp = load_opportunities(info['opportunities_csv'], usecols=OPPORTUNITY_PIPELINE_COLUMNS)
+    to_month = f'2023-{SYNTH_MONTHS:02d}'
+    return {
+        'info': info,
+        'df_opp': df_opp,
+        'opps': run_opps_sql.build_nested_columnar(df_opp),
+        'df_tar': rta.prepare_tariffs(pd.read_csv(info['tariffs_csv']), prov_map, '2023-01', to_month),
+        'city_map': city_map,
+        'prov_map': prov_map,
+        'from_month': '2023-01',
+        'to_month': to_month,
+    }
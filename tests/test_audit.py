@@ -0,0 +1,52 @@
+# tests/test_audit.py
+import json
+import os
+import sqlite3
+
+import pytest
+
+from src.audit import AuditSink, open_audit_sink
+
+ROW = {'oportunidad': 'A', 'frontier_name': 'F1', 'mes': '2023-01', 'encontro_bia': 1, 'encontro_actual': 0}
+
+
+def test_sink_without_write_is_abstract():
+    class Incomplete(AuditSink):
+        pass
+
+    with pytest.raises(TypeError):
+        Incomplete()
+
+
+@pytest.mark.parametrize('fmt', ['json', 'jsonl'])
+def test_default_path_goes_to_out_dir(tmp_path, fmt):
+    with open_audit_sink(fmt, out_dir=str(tmp_path)) as sink:
+        sink.write(ROW)
+    assert sink.path == os.path.join(str(tmp_path), f'debug_tariff_lookup.{fmt}')
+    assert os.listdir(tmp_path) == [f'debug_tariff_lookup.{fmt}']
+
+
+def test_failed_run_keeps_previous_file(tmp_path):
+    path = str(tmp_path / 'debug.json')
+    with open_audit_sink('json', path=path) as sink:
+        sink.write(ROW)
+    with pytest.raises(RuntimeError):
+        with open_audit_sink('json', path=path) as sink:
+            sink.write(dict(ROW, oportunidad='B'))
+            raise RuntimeError('falla a mitad de corrida')
+    with open(path, encoding='utf-8') as f:
+        assert json.load(f) == [ROW]
+    assert os.listdir(tmp_path) == ['debug.json']
+
+
+def test_failed_run_keeps_previous_sqlite_rows(tmp_path):
+    path = str(tmp_path / 'audit.sqlite')
+    with open_audit_sink('sqlite', path=path) as sink:
+        sink.write(ROW)
+    with pytest.raises(RuntimeError):
+        with open_audit_sink('sqlite', path=path) as sink:
+            sink.write(dict(ROW, oportunidad='B'))
+            raise RuntimeError('falla a mitad de corrida')
+    con = sqlite3.connect(path)
+    assert con.execute('SELECT oportunidad FROM tariff_lookup_audit').fetchall() == [('A',)]
+    con.close()
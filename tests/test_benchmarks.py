@@ -0,0 +1,51 @@
+# tests/test_benchmarks.py
+import os
+
+import pandas as pd
+
+import run_opps_sql
+from benchmarks.bench import compare, run_benchmarks
+from benchmarks.synth import generate_dataset
+from src.srcload import load_opportunities, OPPORTUNITY_PIPELINE_COLUMNS
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def _read(path):
+    with open(path, 'rb') as f:
+        return f.read()
+
+
+def test_dataset_has_pipeline_schema_and_scale(synth, tmp_path, monkeypatch):
+    info = synth['info']
+    df = load_opportunities(info['opportunities_csv'], usecols=OPPORTUNITY_PIPELINE_COLUMNS)
+    assert list(df.columns) == OPPORTUNITY_PIPELINE_COLUMNS
+    assert len(df) == info['frontiers']
+    assert len(run_opps_sql.build_nested(df)) == info['opportunities']
+
+    tar = pd.read_csv(info['tariffs_csv'])
+    assert list(tar.columns) == ['mes', 'provider', 'city', 'nivel_de_tension', 'tarifa']
+    assert len(tar) == info['tariff_rows']
+    assert tar['mes'].nunique() == info['months']
+
+    # Misma semilla -> mismos archivos
+    monkeypatch.chdir(ROOT)
+    again = generate_dataset(str(tmp_path), info['frontiers'], info['months'], info['seed'])
+    assert _read(again['opportunities_csv']) == _read(info['opportunities_csv'])
+    assert _read(again['tariffs_csv']) == _read(info['tariffs_csv'])
+
+
+def test_run_benchmarks_measures_requested_stages(tmp_path, monkeypatch):
+    monkeypatch.chdir(ROOT)
+    stages = ['tariff_prep', 'analysis_vector', 'summary']
+    res = run_benchmarks(200, 3, repeat=1, stages=stages, data_dir=str(tmp_path))
+    assert list(res['results']) == stages
+    assert all(r['seconds'] >= 0 and r['peak_mb'] >= 0 for r in res['results'].values())
+    assert res['config']['frontiers'] == 200 and res['config']['months'] == 3
+    assert os.path.exists(tmp_path / 'f200_m3_s1' / 'dataset.json')
+
+    slower = {'machine': res['machine'],
+              'results': {k: {**r, 'seconds': r['seconds'] * 2 + 1} for k, r in res['results'].items()}}
+    assert compare(res, res, 0.25)
+    assert not compare(slower, res, 0.25)
+    assert compare(res, slower, 0.25)
@@ -0,0 +1,20 @@
+# tests/test_columnar.py
+import pytest
+
+pytest.importorskip('pyarrow')
+
+from src.columnar import read_opportunities, write_opportunities  # noqa: E402
+
+
+def test_non_string_opportunity_keys(tmp_path):
+    frontera = {'frontier_name': 'F1', 'consumo': 10.0, 'renting': 0.0, 'city': 'BOGOTA', 'ciudad': '',
+                'nivel_de_tension': 'nivel_1_user', 'operador_de_red': '', 'provider_actual': 'EPM',
+                'provider': 'EPM'}
+    opps = [{'oportunidad': 'A', 'fronteras': [frontera]},
+            {'oportunidad': float('nan'), 'fronteras': [frontera]},
+            {'oportunidad': 1234, 'fronteras': []},
+            {'oportunidad': None, 'fronteras': []}]
+    write_opportunities(opps, str(tmp_path))
+    back = read_opportunities(str(tmp_path), opp_columns=['oportunidad'])
+    assert [r['oportunidad'] for r in back] == ['A', None, '1234', None]
+    assert [len(r['fronteras']) for r in back] == [1, 1, 0, 0]
@@ -0,0 +1,30 @@
+# tests/test_compact.py
+import pytest
+
+import run_tariff_analysis as rta
+from src.export import write_records
+from src.frontiers import Portfolio
+
+
+@pytest.fixture
+def nested(synth):
+    return synth['opps'][:50]
+
+
+def test_compact_round_trip(tmp_path, nested):
+    path = write_records(nested, str(tmp_path / 'nested.json'))
+    opps = rta.load_opps_compact(path)
+    assert isinstance(opps, Portfolio)
+    assert opps.to_records() == nested
+
+
+def test_other_shape_falls_back_to_list(tmp_path, nested):
+    otros = [dict(reg, extra=1) for reg in nested]
+    path = write_records(otros, str(tmp_path / 'nested.ndjson'), 'ndjson')
+    assert rta.load_opps_compact(path) == otros
+
+
+def test_mixed_file_fails_loudly(tmp_path, nested):
+    path = write_records(nested[:1] + [dict(nested[1], extra=1)], str(tmp_path / 'nested.json'))
+    with pytest.raises(ValueError):
+        rta.load_opps_compact(path)
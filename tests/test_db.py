@@ -0,0 +1,79 @@
+# tests/test_db.py
+import sqlite3
+
+import pandas as pd
+
+from src.db import persist_tables
+
+CUENTA = 'Calculadora Payback/Número de Cuenta'
+
+
+def _frontiers(con):
+    return con.execute('SELECT oportunidad, frontier_key FROM opportunity_frontiers '
+                       'ORDER BY oportunidad, frontier_key').fetchall()
+
+
+def test_persist_tables_creates_schema_and_drops_removed_frontiers(tmp_path):
+    con = sqlite3.connect(str(tmp_path / 'x.sqlite'))  # sin init_db
+    persist_tables(con, pd.DataFrame({'Oportunidad': ['A', None, 'B'], CUENTA: ['1', '2', '3']}))
+    assert _frontiers(con) == [('A', '1'), ('A', '2'), ('B', '3')]
+
+    persist_tables(con, pd.DataFrame({'Oportunidad': ['A'], CUENTA: ['2']}))
+    assert _frontiers(con) == [('A', '2'), ('B', '3')]  # B no se reimportó: queda igual
+    con.close()
+
+
+def _tariffs(provider, tarifa):
+    return pd.DataFrame({'mes': ['2023-01'], 'provider': [provider], 'city': ['BOGOTA'],
+                         'nivel_de_tension': ['nivel_1'], 'tarifa': [tarifa]})
+
+
+def test_tariffs_by_resource_round_trip(tmp_path):
+    import run_tariff_analysis as rta
+    from src.db import init_db, save_tariff_snapshot
+    from src.srcload import SqliteTariffSource
+
+    origen, copia = str(tmp_path / 'origen.sqlite'), str(tmp_path / 'copia.sqlite')
+    con = init_db(origen)
+    save_tariff_snapshot(con, _tariffs('EPM', 800.0), resource_id=1)
+    save_tariff_snapshot(con, _tariffs('BIA', 700.0), resource_id=2)
+    con.close()
+
+    by_resource = {}
+    merged = rta.load_tariffs(source=SqliteTariffSource(origen, None, 1), resource_ids=[1, 2],
+                              by_resource=by_resource)
+    assert sorted(by_resource) == [1, 2]
+
+    con = init_db(copia)
+    for rid, df in by_resource.items():
+        save_tariff_snapshot(con, df, resource_id=rid)
+    con.close()
+    again = rta.load_tariffs(source=SqliteTariffSource(copia, None, 1), resource_ids=[1, 2])
+    pd.testing.assert_frame_equal(again, merged)
+
+
+def test_same_table_for_two_resources_gets_two_snapshots(tmp_path):
+    from src.db import init_db, latest_tariff_snapshot, save_tariff_snapshot
+
+    con = init_db(str(tmp_path / 'x.sqlite'))
+    a = save_tariff_snapshot(con, _tariffs('EPM', 800.0), resource_id=1)
+    b = save_tariff_snapshot(con, _tariffs('EPM', 800.0), resource_id=2)
+    assert a != b
+    assert save_tariff_snapshot(con, _tariffs('EPM', 800.0), resource_id=1) == a
+    assert (latest_tariff_snapshot(con, 1), latest_tariff_snapshot(con, 2)) == (a, b)
+    con.close()
+
+
+def test_repeated_account_in_opportunity_is_not_merged(tmp_path):
+    from src.db import init_db, upsert_opportunities
+
+    con = init_db(str(tmp_path / 'x.sqlite'))
+    df = pd.DataFrame({'Oportunidad': ['A', None, None, 'B'], CUENTA: ['1', '1', '1', '1'],
+                       'Calculadora Payback/kWh Promedio / Mes': [10.0, 20.0, 30.0, 40.0]})
+    assert upsert_opportunities(con, df) == 4
+    assert _frontiers(con) == [('A', '1'), ('A', '1#2'), ('A', '1#3'), ('B', '1')]
+    assert con.execute('SELECT SUM(kwh_mes) FROM opportunity_frontiers').fetchone()[0] == 100.0
+
+    assert upsert_opportunities(con, df) == 4  # reimportar no duplica
+    assert len(_frontiers(con)) == 4
+    con.close()
@@ -0,0 +1,65 @@
+# tests/test_engines.py
+import pandas as pd
+import pytest
+
+import run_tariff_analysis as rta
+from src.audit import ListSink
+
+# Tarifas ya preparadas (salida de prepare_tariffs)
+TARIFFS = pd.DataFrame([
+    ['2023-01', 'BOGOTA', 'EPM', 150.0, 'nivel_1_user', 'NIVEL 1'],
+    ['2023-01', 'BOGOTA', 'BIA ENERGY', 100.0, 'nivel_1_user', 'NIVEL 1'],
+    ['2023-01', 'BOGOTA', 'EPM', 140.0, None, 'NIVEL 2'],
+    ['2023-01', 'BOGOTA', 'BIA ENERGY', 90.0, None, 'NIVEL 2'],
+    ['2023-01', 'BOGOTA', 'ENEL COLOMBIA', 170.0, 'nivel_1_user', 'NIVEL 1'],
+    ['2023-02', 'BOGOTA', 'EPM', 155.0, 'nivel_1_user', 'NIVEL 1'],
+], columns=['mes_key', 'city_n', 'provider_n', 'tarifa', 'nivel_comp', 'nivel_simp'])
+
+OPPS = [{'oportunidad': 'A', 'cliente': 'C', 'fronteras': [
+    {'frontier_name': 'compuesto', 'city': 'Bogotá', 'nivel_de_tension': 'nivel_1_user',
+     'provider_actual': 'EPM', 'consumo': 10},
+    {'frontier_name': 'simple', 'city': 'Bogotá', 'nivel_de_tension': 'nivel_2_user',
+     'provider_actual': 'EPM', 'consumo': 10},
+    {'frontier_name': 'difuso', 'city': 'Bogotá', 'nivel_de_tension': 'nivel_1_user',
+     'provider_actual': 'Enel Colombia SA ESP', 'consumo': 10},
+    {'frontier_name': 'sin tarifa', 'city': 'Cali', 'nivel_de_tension': 'nivel_1_user',
+     'provider_actual': 'EPM', 'consumo': None},
+]}]
+
+
+def _run(engine, opps=OPPS, df_tar=TARIFFS, city_map=None, prov_map=None):
+    sink, stats = ListSink(), {}
+    salida, _ = rta.analizar(opps, df_tar, city_map or {}, prov_map or {}, engine=engine, audit=sink, stats=stats)
+    return salida, sink.rows, stats
+
+
+def test_fallback_chain():
+    salida, rows, _ = _run('vector')
+    enero = {r['frontier_name']: r for r in rows if r['mes'] == '2023-01'}
+    assert enero['compuesto']['nivel_variant_usado'] == 'compuesto'
+    assert enero['simple']['nivel_variant_usado'] == 'simple'
+    assert enero['difuso']['fallback_usado'] and enero['difuso']['provider_usado_para_actual'] == 'ENEL COLOMBIA'
+    assert not enero['sin tarifa']['encontro_actual'] and not enero['sin tarifa']['encontro_bia']
+
+    costos = [[m['costo_actual'] for m in f['analisis_mensual']] for f in salida[0]['fronteras']]
+    assert costos == [[1500.0, 1550.0], [1400.0, None], [1700.0, None], [None, None]]
+    primero = salida[0]['fronteras'][0]['analisis_mensual'][0]
+    assert (primero['costo_bia'], primero['delta_unit'], primero['ahorro_mensual_estimado']) == (1000.0, 50.0, 500.0)
+
+
+def _assert_engines_agree(**kwargs):
+    loop, loop_rows, loop_stats = _run('loop', **kwargs)
+    vector, vector_rows, vector_stats = _run('vector', **kwargs)
+    assert vector == loop
+    assert vector_rows == loop_rows
+    counters = ('cells', 'bia_hits', 'actual_hits', 'provider_fallbacks')
+    assert {k: vector_stats[k] for k in counters} == {k: loop_stats[k] for k in counters}
+
+
+def test_vector_equals_loop():
+    _assert_engines_agree()
+
+
+def test_vector_equals_loop_on_synth(synth):
+    _assert_engines_agree(opps=synth['opps'][:300], df_tar=synth['df_tar'],
+                          city_map=synth['city_map'], prov_map=synth['prov_map'])
@@ -0,0 +1,44 @@
+# tests/test_export.py
+import json
+import os
+
+import pytest
+
+from src.export import load_json, iter_records, resolve_input, write_records, output_path
+from src.audit import JsonlSink
+
+RECORDS = [{'oportunidad': 'Ñandú', 'fronteras': [{'consumo': 1.5}]}, {'oportunidad': 'B', 'fronteras': []}]
+
+
+@pytest.mark.parametrize('fmt,compression', [('json', None), ('compact', 'gzip'), ('ndjson', None), ('ndjson', 'gzip')])
+def test_round_trip(tmp_path, fmt, compression):
+    path = write_records(RECORDS, output_path(str(tmp_path / 'x.json'), fmt, compression), fmt, compression)
+    assert load_json(path) == RECORDS
+    assert list(iter_records(path)) == RECORDS
+
+
+def test_load_json_dispatches_on_extension(tmp_path):
+    path = tmp_path / 'x.json'
+    path.write_text('{"a": 1}\n{"a": 2}\n', encoding='utf-8')
+    with pytest.raises(json.JSONDecodeError):
+        load_json(str(path))  # un .json con varias líneas es un error, no un NDJSON
+    ndjson = tmp_path / 'x.ndjson'
+    ndjson.write_text('{"a": 1}\n{"a": 2}\n', encoding='utf-8')
+    assert load_json(str(ndjson)) == [{'a': 1}, {'a': 2}]
+
+
+def test_jsonl_audit_rows_keep_default_separators(tmp_path):
+    path = str(tmp_path / 'audit.jsonl')
+    sink = JsonlSink(path)
+    sink._write({'mes': '2023-01', 'tarifa': 1.0})
+    sink.close()
+    with open(path, encoding='utf-8') as f:
+        assert f.read() == json.dumps({'mes': '2023-01', 'tarifa': 1.0}, ensure_ascii=False) + '\n'
+
+
+def test_resolve_input_honors_explicit_paths(tmp_path):
+    default = str(tmp_path / 'x.json')
+    newer = write_records(RECORDS, str(tmp_path / 'x.ndjson'), 'ndjson')
+    assert resolve_input(None, default) == newer
+    assert resolve_input(default, default) == default
+    assert not os.path.exists(default)
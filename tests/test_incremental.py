@@ -0,0 +1,80 @@
+# tests/test_incremental.py
+import json
+
+import pandas as pd
+import pytest
+
+import run_summary
+import run_tariff_analysis as rta
+from src.incremental import AnalysisCache
+
+
+@pytest.fixture
+def opps(synth):
+    return json.loads(json.dumps(synth['opps'][:60]))
+
+
+@pytest.fixture
+def cache(tmp_path):
+    with AnalysisCache(str(tmp_path / 'analisis.sqlite')) as c:
+        yield c
+
+
+def _incremental(synth, opps, cache, df_tar=None, to_month=None):
+    return rta.analizar_incremental(opps, synth['df_tar'] if df_tar is None else df_tar, synth['city_map'],
+                                    synth['prov_map'], synth['from_month'], to_month or synth['to_month'], cache)
+
+
+def _full(synth, opps, df_tar=None):
+    salida, _ = rta.analizar(opps, synth['df_tar'] if df_tar is None else df_tar, synth['city_map'], synth['prov_map'])
+    return salida
+
+
+def test_second_run_reuses_everything(synth, opps, cache):
+    salida, stats = _incremental(synth, opps, cache)
+    assert stats == {'total': 60, 'reutilizadas': 0, 'recalculadas': 60}
+    again, stats = _incremental(synth, opps, cache)
+    assert stats == {'total': 60, 'reutilizadas': 60, 'recalculadas': 0}
+    assert again == salida == json.loads(json.dumps(_full(synth, opps)))
+
+
+def test_changed_opportunity_is_recomputed(synth, opps, cache):
+    _incremental(synth, opps, cache)
+    opps[7]['fronteras'][0]['consumo'] += 1000.0
+    salida, stats = _incremental(synth, opps, cache)
+    assert stats == {'total': 60, 'reutilizadas': 59, 'recalculadas': 1}
+    assert salida == json.loads(json.dumps(_full(synth, opps)))
+
+
+def test_tariffs_or_range_invalidate_everything(synth, opps, cache):
+    _incremental(synth, opps, cache)
+
+    raw = pd.read_csv(synth['info']['tariffs_csv'])
+    raw['tarifa'] = raw['tarifa'] * 1.1
+    df_tar = rta.prepare_tariffs(raw, synth['prov_map'], synth['from_month'], synth['to_month'])
+    salida, stats = _incremental(synth, opps, cache, df_tar=df_tar)
+    assert stats['recalculadas'] == 60
+    assert salida == json.loads(json.dumps(_full(synth, opps, df_tar)))
+
+    df_tar = rta.prepare_tariffs(pd.read_csv(synth['info']['tariffs_csv']), synth['prov_map'],
+                                 synth['from_month'], '2023-05')
+    _, stats = _incremental(synth, opps, cache, df_tar=df_tar, to_month='2023-05')
+    assert stats['recalculadas'] == 60
+
+
+def test_summary_reuses_only_unchanged(synth, opps, cache):
+    salida, _ = _incremental(synth, opps, cache)
+    resumen, stats = run_summary.build_summary_incremental(opps, lambda: salida, cache)
+    assert stats['recalculadas'] == 60
+    assert resumen == run_summary.build_summary(opps, salida)
+
+    def no_load():
+        raise AssertionError('no debería leer el análisis')
+    again, stats = run_summary.build_summary_incremental(opps, no_load, cache)
+    assert stats['reutilizadas'] == 60 and again == resumen
+
+    opps[3]['fronteras'][0]['consumo'] += 1000.0
+    salida, _ = _incremental(synth, opps, cache)
+    resumen, stats = run_summary.build_summary_incremental(opps, lambda: salida, cache)
+    assert (stats['reutilizadas'], stats['recalculadas']) == (59, 1)
+    assert resumen == run_summary.build_summary(opps, salida)
@@ -0,0 +1,68 @@
+# tests/test_metrics.py
+import json
+import os
+import pstats
+import tracemalloc
+
+import run_summary
+import run_tariff_analysis as rta
+from src.export import write_records
+from src.metrics import RunMetrics
+
+
+def _load(path):
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def test_stages_counters_and_sections(tmp_path):
+    path = str(tmp_path / 'run_metrics.json')
+    m = RunMetrics('etapa_a', path)
+    with m.stage('leer') as st:
+        st.update(rows_in=10, rows_out=7)
+    m.count('cache', {'hits': 2, 'misses': 1, 'status': 'miss'})
+    m.count('cache', {'hits': 3, 'status': 'hit'})
+    m.write()
+    RunMetrics('etapa_b', path).write()
+
+    data = _load(path)
+    assert set(data['scripts']) == {'etapa_a', 'etapa_b'}
+    a = data['scripts']['etapa_a']
+    st = a['stages']['leer']
+    assert (st['rows_in'], st['rows_out']) == (10, 7)
+    assert st['wall_s'] >= 0 and st['cpu_s'] >= 0 and 'peak_rss_mb' in st
+    assert a['counters']['cache'] == {'hits': 5, 'misses': 1, 'status': 'hit'}
+
+
+def test_stage_recorded_when_block_fails(tmp_path):
+    m = RunMetrics('x', str(tmp_path / 'm.json'))
+    try:
+        with m.stage('falla'):
+            raise ValueError('boom')
+    except ValueError:
+        pass
+    assert 'wall_s' in m.stages['falla']
+
+
+def test_profile_dumps_are_loadable(tmp_path):
+    m = RunMetrics('perfil', str(tmp_path / 'm.json'), profile_dir=str(tmp_path / 'profile'))
+    with m.stage('trabajo'):
+        sorted(str(i) for i in range(10000))
+    prof, snap = m.stages['trabajo']['profile']
+    assert prof == os.path.join(str(tmp_path / 'profile'), 'perfil', 'trabajo.prof')
+    assert pstats.Stats(prof).total_calls > 0
+    assert tracemalloc.Snapshot.load(snap).traces is not None
+    assert m.stages['trabajo']['traced_peak_mb'] >= 0
+    assert not tracemalloc.is_tracing()
+
+
+def test_run_summary_writes_its_section(synth, tmp_path):
+    opps = synth['opps'][:50]
+    salida, _ = rta.analizar(opps, synth['df_tar'], synth['city_map'], synth['prov_map'])
+    metrics_path = str(tmp_path / 'run_metrics.json')
+    run_summary.main(write_records(opps, str(tmp_path / 'opps.json')),
+                     write_records(salida, str(tmp_path / 'analisis.json')),
+                     str(tmp_path / 'resumen.json'), metrics_path=metrics_path)
+    stages = _load(metrics_path)['scripts']['run_summary']['stages']
+    assert {'load_inputs', 'summary', 'write_outputs'} <= set(stages)
+    assert stages['summary']['rows_out'] == 50
@@ -0,0 +1,70 @@
+# tests/test_opps_sql.py
+import pandas as pd
+import pytest
+
+import run_opps_sql
+from src.srcload import OPPORTUNITY_PIPELINE_COLUMNS
+
+
+@pytest.mark.parametrize('builder', [run_opps_sql.build_nested, run_opps_sql.build_portfolio])
+def test_missing_columns_are_listed(builder):
+    df = pd.DataFrame({c: ['x'] for c in run_opps_sql.BUILD_REQUIRED_COLS
+                       if c not in ('Tarifa B', 'Calculadora Payback/Número de Cuenta')})
+    with pytest.raises(ValueError) as e:
+        builder(df)
+    assert 'Tarifa B' in str(e.value) and 'Calculadora Payback/Número de Cuenta' in str(e.value)
+
+
+def test_builders_agree(synth):
+    assert run_opps_sql.build_nested_columnar(synth['df_opp']) == run_opps_sql.build_nested(synth['df_opp'])
+
+
+def _write_opps(path, rows):
+    cols = ['Oportunidad', 'Cliente', 'Calculadora Payback/Número de Cuenta',
+            'Calculadora Payback/Comercializador Actual', 'Calculadora Payback/kWh Promedio / Mes']
+    df = pd.DataFrame(rows, columns=cols)
+    for c in OPPORTUNITY_PIPELINE_COLUMNS:
+        if c not in df.columns:
+            df[c] = 1
+    df.to_csv(path, index=False)
+
+
+def test_identity_does_not_cross_files(tmp_path):
+    _write_opps(tmp_path / 'a.csv', [['OPP A', 'Cliente 2', '100', 'EPM', 10],
+                                     [None, None, '101', None, 20]])
+    # Primera fila de b.csv: oportunidad nueva sin cliente ni comercializador
+    _write_opps(tmp_path / 'b.csv', [['OPP NEW', None, '200', None, 30],
+                                     [None, None, '201', None, 40]])
+    df = run_opps_sql.load_opportunity_input(str(tmp_path))
+
+    filled = run_opps_sql.ffill_identity(df)
+    new = filled[filled['Oportunidad'] == 'OPP NEW']
+    assert len(new) == 2
+    assert new['Cliente'].isna().all()
+    assert new['Calculadora Payback/Comercializador Actual'].isna().all()
+
+    for builder in (run_opps_sql.build_nested, run_opps_sql.build_nested_columnar):
+        reg = next(r for r in builder(df) if r['oportunidad'] == 'OPP NEW')
+        assert reg['cliente'] != 'Cliente 2'
+        assert len(reg['fronteras']) == 2
+
+
+@pytest.mark.parametrize('engine', ['loop', 'compact'])
+def test_stream_matches_whole_file(synth, tmp_path, engine):
+    path = synth['info']['opportunities_csv']
+    whole = run_opps_sql.write_nested(run_opps_sql.BUILDERS[engine](synth['df_opp']), str(tmp_path / 'whole.json'))
+    stats = {}
+    stream = run_opps_sql.write_nested_stream(path, engine, chunksize=211, out_path=str(tmp_path / 'stream.json'),
+                                              stats=stats)
+    assert stats['chunks'] > 1
+    with open(whole, 'rb') as a, open(stream, 'rb') as b:
+        assert a.read() == b.read()
+
+
+def test_stream_rejects_split_opportunity(tmp_path):
+    _write_opps(tmp_path / 'a.csv', [['OPP A', 'C1', '100', 'EPM', 10],
+                                     ['OPP B', 'C2', '200', 'EPM', 20],
+                                     ['OPP A', 'C1', '101', 'EPM', 30]])
+    out = tmp_path / 'stream.json'
+    assert run_opps_sql.write_nested_stream(str(tmp_path / 'a.csv'), chunksize=1, out_path=str(out)) is None
+    assert not out.exists()
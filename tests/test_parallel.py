@@ -0,0 +1,29 @@
+# tests/test_parallel.py
+import pytest
+
+import run_tariff_analysis as rta
+from src.audit import ListSink
+
+
+@pytest.mark.parametrize('engine', ['loop', 'vector'])
+def test_parallel_equals_serial(synth, engine):
+    args = (synth['opps'], synth['df_tar'], synth['city_map'], synth['prov_map'])
+    serial_audit, parallel_audit = ListSink(), ListSink()
+    serial, _ = rta.analizar(*args, engine=engine, workers=1, audit=serial_audit)
+    parallel, _ = rta.analizar(*args, engine=engine, workers=3, audit=parallel_audit)
+    assert parallel == serial
+    assert parallel_audit.rows == serial_audit.rows
+
+
+def test_engines_agree(synth):
+    args = (synth['opps'], synth['df_tar'], synth['city_map'], synth['prov_map'])
+    loop, _ = rta.analizar(*args, engine='loop')
+    vector, _ = rta.analizar(*args, engine='vector')
+    assert vector == loop
+
+
+def test_loop_index_is_reused(synth):
+    index = rta.build_loop_index(synth['df_tar'])
+    opps = synth['opps'][:20]
+    args = (synth['city_map'], synth['prov_map'])
+    assert rta.analizar_loop(opps, None, *args, index=index)[0] == rta.analizar_loop(opps, synth['df_tar'], *args)[0]
@@ -0,0 +1,55 @@
+# tests/test_pipeline.py
+import json
+import os
+import subprocess
+import sys
+
+import pytest
+
+from benchmarks.lambda_stub import LocalTariffLambda
+from pipeline import run_pipeline
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+OUTPUTS = ('opportunities_curated_nested.json', 'analisis_tarifas_por_frontera.json',
+           'resumen_oportunidades.json', 'debug_tariff_lookup.json')
+
+
+def _script(cwd, script, args):
+    subprocess.run([sys.executable, os.path.join(ROOT, script)] + args, cwd=cwd, check=True,
+                   stdout=subprocess.DEVNULL)
+
+
+def _read(path):
+    with open(path, 'rb') as f:
+        return f.read()
+
+
+@pytest.fixture
+def lambda_url(synth):
+    with LocalTariffLambda(synth['info']['tariffs_csv']) as stub:
+        yield stub.url
+
+
+def test_in_process_matches_scripts(synth, lambda_url, tmp_path, monkeypatch):
+    cities = os.path.join(ROOT, 'mappings', 'cities_mapping.json')
+    providers = os.path.join(ROOT, 'mappings', 'providers_mapping.json')
+    rango = ['--from', synth['from_month'], '--to', synth['to_month']]
+    csv_path = synth['info']['opportunities_csv']
+
+    # Misma carpeta de trabajo: la caché de tarifas (data/tariff_cache) es compartida
+    monkeypatch.chdir(tmp_path)
+    res = run_pipeline(csv_path, synth['from_month'], synth['to_month'], cities, providers,
+                       out_dir='pipeline', write_intermediates=True, tariff_source=lambda_url,
+                       metrics_path=str(tmp_path / 'metrics.json'))
+    assert res['metrics']['counters']['tariff_cache']['status'] == 'miss'
+
+    _script(tmp_path, 'run_opps_sql.py', [csv_path])
+    _script(tmp_path, 'run_tariff_analysis.py',
+            [os.path.join('outputs', OUTPUTS[0]), cities, providers, '--tariff-source', lambda_url] + rango)
+    _script(tmp_path, 'run_summary.py', rango)
+
+    metrics = json.loads(_read(tmp_path / 'outputs' / 'run_metrics.json'))
+    assert metrics['scripts']['run_tariff_analysis']['counters']['tariff_cache']['status'] == 'hit'
+    for name in OUTPUTS:
+        assert _read(tmp_path / 'pipeline' / name) == _read(tmp_path / 'outputs' / name), name
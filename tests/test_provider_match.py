@@ -0,0 +1,25 @@
+# tests/test_provider_match.py
+from src.provider_match import ProviderMatcher
+from src.textnorm import provider_tokens
+
+import run_tariff_analysis as rta
+
+
+def test_seen_as_target_then_as_candidate():
+    m = ProviderMatcher(provider_tokens)
+    assert m.best('PEESA', ['OTRO']) == (None, 0.0)
+    assert m.best('PEESA SA ESP', ['PEESA', 'OTRO']) == ProviderMatcher(provider_tokens).best(
+        'PEESA SA ESP', ['PEESA', 'OTRO'])
+    assert m.best('PEESA SA ESP', ['PEESA', 'OTRO'])[0] == 'PEESA'
+
+
+def test_order_independent_and_equal_to_best_token_match():
+    names = ['ENEL', 'ENEL COLOMBIA', 'AIR E', 'AIR-E SAS', 'VATIA', 'EMPRESA DE ENERGIA']
+    pairs = [(t, names[:k]) for t in names for k in range(1, len(names) + 1)]
+    warm = ProviderMatcher(provider_tokens)
+    for t, cands in reversed(pairs):
+        warm.best(t, cands[::-1])
+    for t, cands in pairs:
+        expected = rta.best_token_match(t, cands)
+        assert ProviderMatcher(provider_tokens).best(t, cands) == expected
+        assert warm.best(t, cands) == expected
@@ -0,0 +1,94 @@
+# tests/test_quote_server.py
+import json
+import shutil
+import threading
+import urllib.error
+import urllib.request
+
+import pandas as pd
+import pytest
+
+import run_summary
+import run_tariff_analysis as rta
+from run_quote_server import QuoteService, make_server
+from src.compute import DEFAULT_DISCOUNT_RATE
+
+
+@pytest.fixture
+def server(synth, tmp_path):
+    """Cotizador sobre una copia del CSV de tarifas sintéticas, en un puerto libre."""
+    tariffs_csv = str(tmp_path / 'tarifas.csv')
+    shutil.copy(synth['info']['tariffs_csv'], tariffs_csv)
+    service = QuoteService(synth['city_map'], synth['prov_map'], synth['from_month'], synth['to_month'],
+                           tariff_source=tariffs_csv, reload_interval=0).start()
+    httpd = make_server(service, port=0)
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    try:
+        yield {'url': f'http://127.0.0.1:{httpd.server_address[1]}', 'service': service, 'tariffs_csv': tariffs_csv}
+    finally:
+        httpd.shutdown()
+        httpd.server_close()
+
+
+def _post(url: str, body=None, raw: bytes = None):
+    data = raw if raw is not None else json.dumps(body).encode('utf-8')
+    req = urllib.request.Request(url, data=data, method='POST', headers={'Content-Type': 'application/json'})
+    try:
+        with urllib.request.urlopen(req) as resp:
+            return resp.status, json.loads(resp.read())
+    except urllib.error.HTTPError as e:
+        return e.code, json.loads(e.read())
+
+
+def test_quote_matches_run_summary(synth, server):
+    opps = json.loads(json.dumps(synth['opps'][:5]))
+    salida, _ = rta.analizar(opps, synth['df_tar'], synth['city_map'], synth['prov_map'], engine='vector')
+    resumen = run_summary.add_financials(run_summary.build_summary(opps, salida), DEFAULT_DISCOUNT_RATE)
+
+    status, out = _post(server['url'] + '/quote', {'oportunidades': opps})
+    assert status == 200
+    assert out['resumen'] == json.loads(json.dumps(resumen))
+    assert out['rango'] == {'from': synth['from_month'], 'to': synth['to_month']}
+    assert 'analisis' not in out
+
+    status, out = _post(server['url'] + '/quote?detalle=1', opps[0])
+    assert status == 200
+    assert [r['oportunidad'] for r in out['resumen']] == [opps[0]['oportunidad']]
+    assert len(out['analisis'][0]['fronteras']) == len(opps[0]['fronteras'])
+
+
+def test_reload_picks_up_new_snapshot(server):
+    status, out = _post(server['url'] + '/reload')
+    assert status == 200 and out['changed'] is False
+    before = out['snapshot']
+
+    df = pd.read_csv(server['tariffs_csv'])
+    df['tarifa'] = df['tarifa'] * 1.1
+    df.to_csv(server['tariffs_csv'], index=False)
+
+    status, out = _post(server['url'] + '/reload')
+    assert status == 200 and out['changed'] is True
+    assert out['snapshot'] != before
+    assert server['service'].state['snapshot'] == out['snapshot']
+
+
+@pytest.mark.parametrize('path, raw, status', [
+    ('/quote', b'{no es json', 400),
+    ('/quote', b'[]', 400),
+    ('/quote', b'{"fronteras": 3}', 400),
+    ('/quote/frontier', b'"frontera"', 400),
+    ('/otra', b'{}', 404),
+])
+def test_error_responses(server, path, raw, status):
+    code, out = _post(server['url'] + path, raw=raw)
+    assert code == status
+    assert out['error']
+
+
+def test_reload_error_keeps_index(server):
+    shutil.move(server['tariffs_csv'], server['tariffs_csv'] + '.bak')
+    before = server['service'].state['snapshot']
+    code, out = _post(server['url'] + '/reload')
+    assert code == 500 and out['error']
+    assert server['service'].state['snapshot'] == before
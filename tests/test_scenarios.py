@@ -0,0 +1,39 @@
+# tests/test_scenarios.py
+import numpy as np
+
+import run_summary
+import run_tariff_analysis as rta
+from run_scenarios import evaluate_scenarios
+from src.compute import DEFAULT_DISCOUNT_RATE
+from src.scenarios import scenario_rates
+
+# (city, nivel_comp, nivel_simp, provider) como en frontier_table
+KEYS = [('BOGOTA', 'nivel_2_user', 'NIVEL 2', 'EPM'), ('CALI', 'nivel_1_user', 'NIVEL 1', 'EPM')]
+BASE = np.array([[100.0, np.nan, 120.0],
+                 [200.0, 210.0, np.nan]])
+
+
+def test_fixed_override_keeps_missing_months():
+    rates = scenario_rates([{'nombre': 'fija', 'overrides': [{'city': 'Bogotá', 'tarifa': 90}]}], BASE, KEYS, {})
+    np.testing.assert_array_equal(rates[0], [[90.0, np.nan, 90.0], [200.0, 210.0, np.nan]])
+
+
+def test_discounts():
+    scenarios = [
+        {'nombre': 'base'},
+        {'nombre': 'general', 'descuento_pct': 10},
+        {'nombre': 'por nivel', 'descuento_pct': 10, 'overrides': [{'nivel': 'Nivel 1', 'descuento_pct': 50}]},
+    ]
+    rates = scenario_rates(scenarios, BASE, KEYS, {})
+    np.testing.assert_array_equal(rates[0], BASE)
+    np.testing.assert_allclose(rates[1], BASE * 0.9)
+    np.testing.assert_allclose(rates[2], [BASE[0] * 0.9, BASE[1] * 0.5])
+
+
+def test_base_scenario_equals_run_summary(synth):
+    opps, df_tar, city_map, prov_map = synth['opps'], synth['df_tar'], synth['city_map'], synth['prov_map']
+    salida, _ = rta.analizar(opps, df_tar, city_map, prov_map, engine='vector')
+    resumen = run_summary.add_financials(run_summary.build_summary(opps, salida), DEFAULT_DISCOUNT_RATE)
+    resultado = evaluate_scenarios(opps, df_tar, city_map, prov_map, [{'nombre': 'base'}],
+                                   synth['from_month'], synth['to_month'])
+    assert resultado[0]['oportunidades'] == resumen
@@ -0,0 +1,90 @@
+# tests/test_srcload.py
+import json
+
+import pandas as pd
+import pytest
+
+from src.srcload import (OPPORTUNITY_PIPELINE_COLUMNS, OPPORTUNITY_REQUIRED_COLUMNS, TariffSource, iter_json_array,
+                         iter_opportunities, load_opportunities, load_opportunity_files)
+
+KWH = 'Calculadora Payback/kWh Promedio / Mes'
+
+
+def test_tariff_source_requires_fetch():
+    class Incomplete(TariffSource):
+        kind = 'incompleta'
+
+    with pytest.raises(TypeError):
+        Incomplete()
+
+
+def _write_csv(path, rows):
+    df = pd.DataFrame(rows, columns=['Oportunidad', 'Cliente', KWH])
+    for c in OPPORTUNITY_REQUIRED_COLUMNS:
+        if c not in df.columns:
+            df[c] = 0
+    df.to_csv(path, index=False)
+    return str(path)
+
+
+def test_opportunity_files_first_file_wins(tmp_path):
+    a = _write_csv(tmp_path / 'a.csv', [['OP-1', 'A', 1], [None, None, 2], ['OP-2', 'B', 3]])
+    b = _write_csv(tmp_path / 'b.csv', [['OP-2', 'B2', 30], [None, None, 31], ['OP-3', 'C', 4]])
+    stats = {}
+    df = load_opportunity_files([a, b], ffill_cols=['Oportunidad', 'Cliente'], workers=1, stats=stats)
+
+    assert set(df.columns) == set(pd.read_csv(a, nrows=0).columns)
+    assert df['Oportunidad'].tolist() == ['OP-1', 'OP-1', 'OP-2', 'OP-3']
+    assert df.loc[df['Oportunidad'] == 'OP-2', 'Cliente'].tolist() == ['B']
+    assert stats == {'files': 2, 'rows': 4, 'duplicated_opportunities': 1, 'duplicated_rows': 2,
+                     'orphan_rows': 0}
+
+
+def test_opportunity_files_ffill_stays_in_file(tmp_path):
+    a = _write_csv(tmp_path / 'a.csv', [['OP-1', 'A', 1], [None, None, 2]])
+    b = _write_csv(tmp_path / 'b.csv', [[None, None, 9], ['OP-2', 'B', 3], [None, None, 4]])
+    stats = {}
+    df = load_opportunity_files([a, b], ffill_cols=['Oportunidad', 'Cliente'], workers=2, stats=stats)
+
+    assert df['Oportunidad'].tolist() == ['OP-1', 'OP-1', 'OP-2', 'OP-2']
+    assert df['Cliente'].tolist() == ['A', 'A', 'B', 'B']
+    assert df[KWH].tolist() == [1, 2, 3, 4]
+    assert stats['orphan_rows'] == 1
+    # Un ffill posterior (run_opps_sql.ffill_identity) ya no cambia nada
+    assert df['Oportunidad'].ffill().tolist() == df['Oportunidad'].tolist()
+
+
+@pytest.mark.parametrize('chunksize', [97, 10_000])
+def test_chunked_read_equals_whole_file(synth, chunksize):
+    path = synth['info']['opportunities_csv']
+    cols = ['Oportunidad', 'Cliente', 'Calculadora Payback/Ciudad']
+    whole = load_opportunities(path, usecols=OPPORTUNITY_PIPELINE_COLUMNS)
+    for c in cols:
+        whole[c] = whole[c].ffill()
+    chunks = list(iter_opportunities(path, chunksize, usecols=OPPORTUNITY_PIPELINE_COLUMNS, ffill_cols=cols))
+
+    # Cada bloque empieza en la cabecera de una oportunidad
+    assert all(pd.notna(df['Oportunidad'].iloc[0]) for df in chunks[1:])
+    pd.testing.assert_frame_equal(pd.concat(chunks, ignore_index=True), whole)
+
+
+def test_chunked_read_keeps_full_file_dtypes(tmp_path):
+    # Número de Cuenta: entero en el primer bloque, con vacíos en el segundo -> float en todo el archivo
+    a = _write_csv(tmp_path / 'a.csv', [['OP-1', 'A', 1], ['OP-2', None, 2], [None, None, 3]])
+    df = pd.read_csv(a)
+    df['Calculadora Payback/Número de Cuenta'] = [10, 11, None]
+    df.to_csv(a, index=False)
+    whole = load_opportunities(a)
+    chunks = list(iter_opportunities(a, 1))
+    assert [len(c) for c in chunks] == [1, 2]
+    pd.testing.assert_frame_equal(pd.concat(chunks, ignore_index=True), whole)
+
+
+@pytest.mark.parametrize('chunk_size', [1, 7, 1 << 16])
+def test_iter_json_array_equals_json_load(tmp_path, chunk_size):
+    records = [{'oportunidad': 'Año "1"', 'v': [1.5, None, {'ñ': 'é\\n'}]}, [], 0, 'x', {'s': ' ' * 40}]
+    path = tmp_path / 'lista.json'
+    path.write_text(json.dumps(records, ensure_ascii=False, indent=2), encoding='utf-8')
+    assert list(iter_json_array(str(path), chunk_size=chunk_size)) == records
+    path.write_text('[]', encoding='utf-8')
+    assert list(iter_json_array(str(path), chunk_size=chunk_size)) == []
@@ -0,0 +1,96 @@
+# tests/test_summary.py
+import json
+
+import numpy as np
+import pytest
+
+import run_summary
+import run_tariff_analysis as rta
+from src.compute import irr_monthly, monthly_rate
+from src.export import output_path, write_records
+
+
+def _record(actual, bia, inversion):
+    return {"oportunidad": "A", "inversion_cliente": inversion,
+            "Costo actual total por mes": actual, "Costo Bia total por mes": bia}
+
+
+def test_gap_month_counts_for_payback_and_discounting():
+    rec = _record({"2023-01": 300.0, "2023-03": 300.0}, {"2023-01": 200.0, "2023-03": 200.0}, 150.0)
+    run_summary.add_financials([rec], 0.12)
+    r = monthly_rate(0.12)
+    assert rec["Ahorro acumulado por mes"] == {"2023-01": 100.0, "2023-03": 200.0}
+    assert rec["Payback meses"] == 3
+    assert rec["Mes de payback"] == "2023-03"
+    assert rec["VPN ahorro"] == pytest.approx(round(100 / (1 + r) + 100 / (1 + r) ** 3 - 150, 2))
+
+
+def test_consecutive_months_unchanged():
+    rec = _record({"2023-01": 300.0, "2023-02": 300.0}, {"2023-01": 200.0, "2023-02": 200.0}, 150.0)
+    run_summary.add_financials([rec], 0.12)
+    assert (rec["Payback meses"], rec["Mes de payback"]) == (2, "2023-02")
+
+
+def test_month_offsets():
+    assert run_summary.month_offsets(["2022-12", "2023-02", "2023-01"]) == [0, 2, 1]
+    assert run_summary.month_offsets(["x", "2023-02"]) == [0, 1]
+
+
+def test_financials_independent_of_batch(synth):
+    salida, _ = rta.analizar(synth['opps'], synth['df_tar'], synth['city_map'], synth['prov_map'], engine='vector')
+    juntos = run_summary.add_financials(run_summary.build_summary(synth['opps'], salida), 0.12)
+    uno_a_uno = [run_summary.add_financials([rec], 0.12)[0]
+                 for rec in run_summary.build_summary(synth['opps'], salida)]
+    assert any(rec["TIR anual"] is not None for rec in juntos)
+    assert uno_a_uno == juntos
+
+
+def test_irr_independent_of_batch():
+    rng = np.random.default_rng(7)
+    flows = rng.uniform(-50, 400, size=(300, 24))
+    inv = rng.uniform(500, 5000, size=300)
+    batch = irr_monthly(inv, flows)
+    single = np.array([irr_monthly(inv[i:i + 1], flows[i:i + 1])[0] for i in range(len(inv))])
+    np.testing.assert_array_equal(batch, single)
+
+
+@pytest.mark.parametrize('fmt', ['json', 'ndjson'])
+def test_stream_matches_memory(synth, tmp_path, fmt):
+    salida, _ = rta.analizar(synth['opps'], synth['df_tar'], synth['city_map'], synth['prov_map'], engine='vector')
+    opps_path = write_records(synth['opps'], str(tmp_path / 'opps.json'))
+    analisis_path = write_records(salida, str(tmp_path / 'analisis.json'))
+    paths = {}
+    for stream in (False, True):
+        out = str(tmp_path / f'resumen_{stream}.json')
+        run_summary.main(opps_path, analisis_path, out, stream=stream, output_format=fmt,
+                         metrics_path=str(tmp_path / 'metrics.json'))
+        paths[stream] = output_path(out, fmt, None)
+    with open(paths[False], 'rb') as a, open(paths[True], 'rb') as b:
+        assert a.read() == b.read()
+
+
+def _month(mes, actual, bia):
+    return {'mes': mes, 'costo_actual': actual, 'costo_bia': bia}
+
+
+def test_stream_keeps_none_apart_from_zero(tmp_path):
+    opps = [{'oportunidad': 'B', 'fronteras': []}, {'oportunidad': 'A', 'fronteras': []}]
+    analisis = [
+        {'oportunidad': 'B', 'fronteras': [{'analisis_mensual': [_month('2023-01', 0.0, None)]}]},
+        {'oportunidad': 'A', 'fronteras': [
+            {'analisis_mensual': [_month('2023-01', 10.0, 0.0), _month('2023-02', None, None)]},
+            {'analisis_mensual': [_month('2023-02', 5.0, 'sin tarifa')]},
+        ]},
+    ]
+    opps_path = write_records(opps, str(tmp_path / 'opps.json'))
+    analisis_path = write_records(analisis, str(tmp_path / 'analisis.json'))
+    out = str(tmp_path / 'resumen.json')
+    assert run_summary.write_summary_stream(opps_path, analisis_path, out) == 2
+    got = json.loads((tmp_path / 'resumen.json').read_text(encoding='utf-8'))
+    assert got == json.loads(json.dumps(run_summary.build_summary(opps, analisis)))
+    assert got[0]['Costo Bia total por mes'] == {'2023-01': 0.0, '2023-02': None}
+    assert got[1]['Costo Bia total por mes'] == {'2023-01': None}
+
+    write_records(analisis[::-1], analisis_path)
+    assert run_summary.write_summary_stream(opps_path, analisis_path, str(tmp_path / 'otro.json')) is None
+    assert not (tmp_path / 'otro.json').exists()
@@ -0,0 +1,34 @@
+# tests/test_tariff_cache.py
+import os
+
+import pandas as pd
+import pytest
+
+from benchmarks.lambda_stub import LocalTariffLambda
+from src.srcload import LAMBDA_URL
+from src.tariff_cache import TariffCache
+
+RESOURCE_ID = 7
+
+
+@pytest.fixture
+def tariffs_csv(tmp_path):
+    path = tmp_path / 'tarifas.csv'
+    pd.DataFrame({'mes': ['2023-01'], 'provider': ['EPM'], 'city': ['Bogotá'],
+                  'nivel_de_tension': ['nivel_1'], 'tarifa': [800.0]}).to_csv(path, index=False)
+    return str(path)
+
+
+def test_local_lambda_does_not_share_the_production_manifest(tmp_path, tariffs_csv):
+    cache = TariffCache(str(tmp_path / 'cache'))
+    with LocalTariffLambda(tariffs_csv) as stub:
+        df, info = cache.fetch(stub.url, RESOURCE_ID)
+        assert info['status'] == 'miss' and len(df) == 1
+        assert cache.fetch(stub.url, RESOURCE_ID)[1]['status'] == 'hit'
+
+    assert not os.path.exists(cache._manifest_path(RESOURCE_ID, LAMBDA_URL))
+    assert os.path.exists(cache._manifest_path(RESOURCE_ID, stub.url))
+    assert cache._manifest_path(RESOURCE_ID, None) == cache._manifest_path(RESOURCE_ID, LAMBDA_URL)
+    with pytest.raises(FileNotFoundError):
+        cache.fetch(LAMBDA_URL, RESOURCE_ID, offline=True)
+    assert cache.fetch(stub.url, RESOURCE_ID, offline=True)[1]['status'] == 'offline'
@@ -0,0 +1,57 @@
+# tests/test_tariff_index.py
+import numpy as np
+import pandas as pd
+
+import run_tariff_analysis as rta
+from src.tariff_index import TariffIndex, frame_fingerprint
+
+
+def _rates(rows):
+    return pd.DataFrame(rows, columns=['mes_key', 'city_n', 'nivel_comp', 'nivel_simp', 'provider_n', 'tarifa'])
+
+
+def test_fingerprint_depends_on_row_order(tmp_path):
+    # Llave repetida: el índice se queda con la última fila, así que el orden cambia el resultado
+    df = _rates([['2023-01', 'BOGOTA', 'nivel_1', 'NIVEL 1', 'EPM', 100.0],
+                 ['2023-01', 'BOGOTA', 'nivel_1', 'NIVEL 1', 'EPM', 200.0]])
+    swapped = df.iloc[::-1].reset_index(drop=True)
+    assert frame_fingerprint(df) != frame_fingerprint(swapped)
+    assert frame_fingerprint(df) == frame_fingerprint(df.copy())
+
+    path = str(tmp_path / 'idx')
+    TariffIndex.load_or_build(df, path)
+    idx = TariffIndex.load_or_build(swapped, path)  # el guardado ya no corresponde: se reconstruye
+    assert idx.lookup('2023-01', 'BOGOTA', 'nivel_1', 'EPM') == 100.0
+
+
+def test_lookup_matches_dict_indexes(synth):
+    df = synth['df_tar']
+    idx = TariffIndex.from_frame(df)
+    comp, simple = rta.build_index_comp(df), rta.build_index_simple(df)
+    for index in (comp, simple):
+        for (mes, city, nivel, provider), tarifa in index.items():
+            assert idx.lookup(mes, city, nivel, provider) == tarifa
+    assert idx.lookup('1999-01', 'BOGOTA', 'NIVEL 1', 'EPM') is None
+
+    bucket = rta.build_bucket(df, 'nivel_comp')
+    for (mes, city, nivel), providers in list(bucket.items())[:200]:
+        assert idx.providers_at(mes, city, nivel) == providers
+
+    keys = list(comp)[:500]
+    codes = [idx.encode(axis, [k[i] for k in keys]) for i, axis in enumerate(('months', 'cities', 'levels', 'providers'))]
+    np.testing.assert_array_equal(idx.gather(*codes), [comp[k] for k in keys])
+
+
+def test_save_and_mmap_load_round_trip(synth, tmp_path):
+    df = synth['df_tar']
+    path = str(tmp_path / 'idx')
+    built = TariffIndex.load_or_build(df, path)
+    loaded = TariffIndex.load(path)
+    assert isinstance(loaded.rates, np.memmap)
+    assert loaded.fingerprint == built.fingerprint == frame_fingerprint(df)
+    assert [getattr(loaded, a) for a in ('months', 'cities', 'levels', 'providers')] == \
+        [getattr(built, a) for a in ('months', 'cities', 'levels', 'providers')]
+    np.testing.assert_array_equal(loaded.rates, built.rates)
+
+    reused = TariffIndex.load_or_build(df, path)  # misma huella: no se reconstruye
+    assert isinstance(reused.rates, np.memmap)
@@ -0,0 +1,36 @@
+# tests/test_tariff_store.py
+import os
+
+import pandas as pd
+import pytest
+
+from src.tariff_store import TariffStore, store_signature
+
+RAW = pd.DataFrame({'mes': ['2023-01-01', '2023-02-01'], 'provider': ['EPM', 'EPM'], 'city': ['Bogotá'] * 2,
+                    'nivel_de_tension': ['nivel_1'] * 2, 'tarifa': [800.0, 810.0]})
+
+
+def _prepare(raw):
+    return raw.assign(mes_key=raw['mes'].str[:7])
+
+
+def test_signature_depends_on_target_order():
+    assert store_signature(['a', 'b'], 0.5) != store_signature(['b', 'a'], 0.5)
+    assert store_signature(['a', 'b'], 0.5) == store_signature(['a', 'b'], 0.5)
+
+
+def test_concurrent_stores_do_not_drop_each_others_months(tmp_path):
+    first = TariffStore(str(tmp_path), 'sig')
+    second = TariffStore(str(tmp_path), 'sig')  # abierto antes de que `first` guarde nada
+    first.sync(RAW, _prepare, '2023-01', '2023-01')
+    second.sync(RAW, _prepare, '2023-02', '2023-02')
+    assert TariffStore(str(tmp_path), 'sig').months() == ['2023-01', '2023-02']
+    assert not os.path.exists(first.lock_path)
+
+
+def test_lock_times_out_while_held(tmp_path):
+    store = TariffStore(str(tmp_path), 'sig')
+    with store._locked():
+        with pytest.raises(TimeoutError):
+            with TariffStore(str(tmp_path), 'sig')._locked(timeout=0.1):
+                pass
@@ -0,0 +1,76 @@
+# tests/test_textnorm.py
+import unicodedata
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from src import textnorm
+from src.textnorm import (canonical_comp_from_tokens, canonical_simple, map_distinct, nivel_frontera,
+                          norm_text, provider_tokens)
+
+VALUES = [
+    None, '', '   ', 'Bogotá D.C.', '  medellín ', 'BOGOTA  D.C.', 'Ñuñoa', 'São Paulo', 'Enel Colombia S.A. E.S.P.',
+    'enel-colombia/sa esp', 'CELSIA S.A.S.', 'Nivel 1 Operador', 'nivel_2_user', 'BT3 Compartido',
+    'NIVEL-2 / USUARIO', 'nivel 4', 'N1', 'Ａｂｃ', 'ﬁ ligadura', 'x́\U0001D400', 12, 2.0, 'Ｎｉｖｅｌ ２',
+]
+
+
+def _old_norm_text(s):
+    """norm_text antes de src/textnorm.py (sin caché ni atajos)."""
+    if s is None:
+        return ''
+    s = str(s).strip().upper()
+    s = ''.join(c for c in unicodedata.normalize('NFKD', s) if not unicodedata.combining(c))
+    return ' '.join(s.split())
+
+
+def _old_canonical_simple(n):
+    nrm = _old_norm_text(n)
+    for d in '123':
+        if d in nrm:
+            return f'NIVEL {d}'
+    return None
+
+
+def _old_provider_tokens(name):
+    s = _old_norm_text(name).replace('.', ' ').replace('/', ' ').replace('-', ' ')
+    return [t for t in s.split() if t and t not in {'S', 'A', 'SA', 'SAS', 'ESP', 'E', 'P', 'ES', 'EP'}]
+
+
+@pytest.mark.parametrize('value', VALUES)
+def test_matches_unmemoized_functions(value):
+    assert norm_text(value) == _old_norm_text(value)
+    assert canonical_simple(value) == _old_canonical_simple(value)
+    assert provider_tokens(value) == _old_provider_tokens(value)
+
+
+def test_level_parsing():
+    assert canonical_comp_from_tokens('NIVEL 1 OPERADOR') == 'nivel_1_operator'
+    assert canonical_comp_from_tokens('nivel_2_user') == 'nivel_2_user'
+    assert canonical_comp_from_tokens('BT3 Compartido') == 'nivel_3_shared'
+    assert canonical_comp_from_tokens('Nivel 2') is None
+    assert nivel_frontera('Propiedad del usuario', 'Nivel 2') == 'nivel_2_user'
+    assert nivel_frontera('Desconocida', 'Nivel 2') == 'nivel_2'
+    assert nivel_frontera('Operador', None) is None
+
+
+def test_norm_text_is_memoized():
+    textnorm._norm_str.cache_clear()
+    for _ in range(3):
+        norm_text('Bogotá D.C.')
+    info = textnorm._norm_str.cache_info()
+    assert (info.misses, info.hits) == (1, 2)
+
+
+@pytest.mark.parametrize('fn', [norm_text, canonical_simple, lambda v: v is None])
+def test_map_distinct_equals_per_value_map(fn):
+    values = pd.Series(VALUES[:12] * 5 + [np.nan, None, pd.NA, np.nan], dtype=object)
+    calls = []
+
+    def counted(v):
+        calls.append(v)
+        return fn(v)
+    got = map_distinct(values, counted)
+    assert len(calls) < len(values)
+    assert list(got) == [fn(v) for v in values]